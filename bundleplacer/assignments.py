@@ -0,0 +1,348 @@
+# Copyright 2016 Canonical, Ltd.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+""" Indexed assignment store
+
+Placement state maps machines to the services assigned (or deployed) to
+them per assignment type. The placement editor asks in both directions
+on every update, so both are kept:
+
+    machine id -> {atype: [service]}
+    service -> {machine id: Counter(atype)}
+
+A service may be assigned to the same machine more than once, eg. several
+LXD units on the Juju default placeholder.
+
+Stores nest as transactions: begin() returns a store layered over this
+one which reads through to it and copies an entry into itself only when
+first changing it. commit() writes those entries back and rollback()
+drops them, both in time proportional to the entries changed.
+"""
+
+from collections import Counter, OrderedDict, defaultdict
+
+
+def _copy_machine(ad):
+    return OrderedDict((atype, list(services))
+                       for atype, services in ad.items())
+
+
+def _copy_service(held):
+    return OrderedDict((iid, Counter(atypes)) for iid, atypes in held.items())
+
+
+class AssignmentStore:
+    """ Assignments of services to machines, indexed both ways
+
+    Reads like the {instance_id: {atype: [service]}} dict it replaces,
+    but the dicts handed out are copies, change it through add(),
+    remove() and friends only.
+
+    Arguments:
+    assignments: optional {instance_id: {atype: [service]}} to start from
+    parent: store this one is a transaction over, see begin()
+    """
+
+    def __init__(self, assignments=None, parent=None):
+        self.parent = parent
+        # entries changed in this layer, None where removed
+        self._machines = OrderedDict()
+        self._services = OrderedDict()
+        # bumped whenever a key is set or dropped in this layer
+        self._writes = 0
+        # index -> (writes of every layer, merged view), see _visible()
+        self._merged = {}
+        if assignments:
+            self.update(assignments)
+
+    def _lookup(self, index, key):
+        store = self
+        while store is not None:
+            entries = getattr(store, index)
+            if key in entries:
+                return entries[key]
+            store = store.parent
+        return None
+
+    def _stamp(self):
+        stamp = []
+        store = self
+        while store is not None:
+            stamp.append(store._writes)
+            store = store.parent
+        return tuple(stamp)
+
+    def _visible(self, index):
+        """ OrderedDict of the non-empty entries of index seen through
+        every layer, not to be changed
+
+        The merged view is kept until a key is set or dropped in any
+        layer, so reading a transaction does not merge on every call.
+        """
+        if self.parent is None:
+            return getattr(self, index)
+        stamp = self._stamp()
+        cached = self._merged.get(index, None)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+        merged = OrderedDict(self.parent._visible(index))
+        for key, entry in getattr(self, index).items():
+            if entry:
+                merged[key] = entry
+            else:
+                merged.pop(key, None)
+        self._merged[index] = (stamp, merged)
+        return merged
+
+    def _own(self, index, key, copy_entry):
+        """ Entry for key in this layer, copied up from the parents the
+        first time it is changed
+        """
+        entries = getattr(self, index)
+        entry = entries.get(key, None)
+        if entry is None:
+            if key in entries or self.parent is None:
+                base = None
+            else:
+                base = self.parent._lookup(index, key)
+            entry = copy_entry(base) if base else OrderedDict()
+            entries[key] = entry
+            self._writes += 1
+        return entry
+
+    def _drop(self, index, key):
+        entries = getattr(self, index)
+        if self.parent is None:
+            entries.pop(key, None)
+        else:
+            entries[key] = None
+        self._writes += 1
+
+    def update(self, assignments):
+        """ Adds every assignment of a {instance_id: {atype: [service]}}
+        """
+        for iid, ad in assignments.items():
+            for atype, services in ad.items():
+                for service in services:
+                    self.add(iid, atype, service)
+
+    def add(self, iid, atype, service):
+        ad = self._own('_machines', iid, _copy_machine)
+        ad.setdefault(atype, []).append(service)
+        held = self._own('_services', service, _copy_service)
+        held.setdefault(iid, Counter())[atype] += 1
+
+    def remove(self, iid, service, atype=None):
+        """ Removes one assignment of service to iid
+
+        Arguments:
+        atype: assignment type to remove, defaults to the first one
+               holding service
+
+        Returns:
+        True if an assignment was removed
+        """
+        atypes = (self._lookup('_services', service) or {}).get(iid, None)
+        if not atypes:
+            return False
+        if atype is None:
+            atype = next(at for at in self._lookup('_machines', iid)
+                         if atypes[at] > 0)
+        elif atypes[atype] == 0:
+            return False
+
+        ad = self._own('_machines', iid, _copy_machine)
+        ad[atype].remove(service)
+        if not ad[atype]:
+            del ad[atype]
+            if not ad:
+                self._drop('_machines', iid)
+
+        held = self._own('_services', service, _copy_service)
+        held[iid][atype] -= 1
+        if held[iid][atype] == 0:
+            del held[iid][atype]
+            if not held[iid]:
+                del held[iid]
+                if not held:
+                    self._drop('_services', service)
+        return True
+
+    def discard(self, service):
+        """ Removes every assignment of service
+        """
+        for iid in list(self._lookup('_services', service) or {}):
+            ad = self._own('_machines', iid, _copy_machine)
+            for atype in list(ad):
+                ad[atype] = [s for s in ad[atype] if s != service]
+                if not ad[atype]:
+                    del ad[atype]
+            if not ad:
+                self._drop('_machines', iid)
+        self._drop('_services', service)
+
+    def clear_machine(self, iid):
+        """ Removes every assignment to iid
+        """
+        ad = self._lookup('_machines', iid)
+        if not ad:
+            return
+        for service in set(s for services in ad.values() for s in services):
+            held = self._own('_services', service, _copy_service)
+            held.pop(iid, None)
+            if not held:
+                self._drop('_services', service)
+        self._drop('_machines', iid)
+
+    def set_machine(self, iid, ad):
+        """ Replaces the assignments of iid with {atype: [service]}
+        """
+        self.clear_machine(iid)
+        self.update({iid: ad})
+
+    def clear(self):
+        if self.parent is None:
+            self._machines = OrderedDict()
+            self._services = OrderedDict()
+        else:
+            for iid in list(self._visible('_machines')):
+                self._machines[iid] = None
+            for service in list(self._visible('_services')):
+                self._services[service] = None
+        self._writes += 1
+
+    def begin(self):
+        """ Starts a transaction over this store
+
+        Returns:
+        a store showing this one plus its own changes, which reach this
+        one on commit()
+        """
+        return AssignmentStore(parent=self)
+
+    def commit(self):
+        """ Writes the changes of this transaction to the store it was
+        begun on, over any made there since
+
+        Returns:
+        that store
+        """
+        if self.parent is None:
+            raise ValueError("commit() of a store that is no transaction")
+        parent = self.parent
+        for index in ('_machines', '_services'):
+            entries = getattr(parent, index)
+            for key, entry in getattr(self, index).items():
+                if entry:
+                    entries[key] = entry
+                else:
+                    parent._drop(index, key)
+        parent._writes += 1
+        self.rollback()
+        return parent
+
+    def rollback(self):
+        """ Drops the changes of this transaction
+
+        Returns:
+        the store it was begun on
+        """
+        if self.parent is None:
+            raise ValueError("rollback() of a store that is no transaction")
+        self._machines = OrderedDict()
+        self._services = OrderedDict()
+        self._writes += 1
+        return self.parent
+
+    def changes(self):
+        """ Number of machine and service entries changed in this layer
+        """
+        return len(self._machines) + len(self._services)
+
+    def for_machine(self, iid):
+        """ Returns {atype: [service]} assigned to iid
+        """
+        d = defaultdict(list)
+        for atype, services in (self._lookup('_machines', iid) or
+                                {}).items():
+            d[atype] = list(services)
+        return d
+
+    def for_service(self, service):
+        """ Returns [(instance_id, atype, count)] service is assigned to
+        """
+        return [(iid, atype, n)
+                for iid, held in (self._lookup('_services', service) or
+                                  {}).items()
+                for atype, n in held.items()]
+
+    def machine_ids(self, service):
+        """ Returns the instance ids service is assigned to
+        """
+        return list(self._lookup('_services', service) or {})
+
+    def holds(self, iid, service):
+        """ True if service is assigned to iid
+        """
+        return iid in (self._lookup('_services', service) or {})
+
+    def count(self, iid):
+        """ Number of assignments to iid
+        """
+        return sum(len(services)
+                   for services in (self._lookup('_machines', iid) or
+                                    {}).values())
+
+    def services(self):
+        """ Set of services with at least one assignment
+        """
+        return set(self._visible('_services'))
+
+    def copy(self):
+        """ Returns a standalone store with the same assignments
+        """
+        new = AssignmentStore()
+        for iid, ad in self._visible('_machines').items():
+            new._machines[iid] = _copy_machine(ad)
+        for service, held in self._visible('_services').items():
+            new._services[service] = _copy_service(held)
+        return new
+
+    def keys(self):
+        return list(self._visible('_machines'))
+
+    def items(self):
+        return [(iid, self.for_machine(iid))
+                for iid in self._visible('_machines')]
+
+    def values(self):
+        return [self.for_machine(iid) for iid in self._visible('_machines')]
+
+    def __getitem__(self, iid):
+        return self.for_machine(iid)
+
+    def __contains__(self, iid):
+        return bool(self._lookup('_machines', iid))
+
+    def __iter__(self):
+        return iter(list(self._visible('_machines')))
+
+    def __len__(self):
+        return len(self._visible('_machines'))
+
+    def __repr__(self):
+        return "<AssignmentStore {} machines, {} services{}>".format(
+            len(self), len(self._visible('_services')),
+            ", {} changed".format(self.changes()) if self.parent else '')
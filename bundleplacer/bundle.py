@@ -13,6 +13,8 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+from collections import OrderedDict, defaultdict
+import copy
 import logging
 import os
 import yaml
@@ -29,6 +31,11 @@ class keydict(dict):
         return key
 
 
+def relation_service(endpoint):
+    """Service name of a relation endpoint, 'mysql:db' or 'mysql'"""
+    return endpoint.split(':')[0]
+
+
 def create_service(servicename, service_dict, servicemeta, relations):
 
     # a little cleaning to normalize a dict from the charmstore v4 api:
@@ -51,7 +58,7 @@ def create_service(servicename, service_dict, servicemeta, relations):
 
     myrelations = []
     for src, dst in relations:
-        if src.startswith(servicename) or dst.startswith(servicename):
+        if servicename in (relation_service(src), relation_service(dst)):
             myrelations.append((src, dst))
 
     service = Service(service_name=servicename,
@@ -118,7 +125,67 @@ class Bundle:
         if 'services' not in self._bundle.keys():
             raise Exception("Invalid Bundle.")
 
+        # built on first use and dropped by anything changing services
+        # or relations, see _index()
+        self._services = None
+        self._relations = None
+        # True while _bundle is shared with a copy(), see _write()
+        self._shared = False
+
+    def copy(self):
+        """Returns a Bundle that can be changed without changing this one.
+
+        Both read the same data until either is changed, the first
+        change copies the services, machines and relations of the one
+        being changed. The Service objects are shared until then too.
+        """
+        other = copy.copy(self)
+        self._shared = other._shared = True
+        return other
+
+    def _write(self):
+        """Called before changing _bundle, unshares it from copies"""
+        if not self._shared:
+            return
+        b = dict(self._bundle)
+        b['services'] = {name: dict(sd)
+                         for name, sd in b['services'].items()}
+        if 'machines' in b:
+            b['machines'] = {name: dict(md)
+                             for name, md in b['machines'].items()}
+        if 'relations' in b:
+            b['relations'] = [list(r) for r in b['relations']]
+        self._bundle = b
+        self._shared = False
+
+    def _invalidate(self):
+        self._services = None
+        self._relations = None
+
+    def _index(self):
+        """Builds the service map and the per-service relation index.
+
+        Service objects are kept until the bundle changes, so the same
+        objects are handed out on every call to services.
+        """
+        if self._services is not None:
+            return
+        relations = defaultdict(list)
+        for r in self._bundle.get('relations', []):
+            names = set(relation_service(e) for e in r)
+            for name in names:
+                relations[name].append(r)
+        metadata = self._metadata.get('services', {})
+        services = OrderedDict()
+        for servicename, sd in self._bundle.get('services', {}).items():
+            sm = metadata.get(servicename, {})
+            services[servicename] = create_service(
+                servicename, sd, sm, relations.get(servicename, []))
+        self._relations = relations
+        self._services = services
+
     def add_new_service(self, charm_name, charm_dict, service_name=None):
+        self._write()
         if service_name is None:
             i = 1
             service_name = charm_name
@@ -129,25 +196,31 @@ class Bundle:
         new_dict = {'charm': charm_dict['Id'],
                     'num_units': 1}
         self._bundle['services'][service_name] = new_dict
+        self._invalidate()
 
     def remove_service(self, service_name):
+        self._write()
         if service_name in self._bundle['services']:
             del self._bundle['services'][service_name]
 
-        for r1, r2 in self._bundle['relations']:
-            s1 = r1.split(':')[0]
-            s2 = r2.split(':')[0]
-            if s1 == service_name or s2 == service_name:
-                self._bundle['relations'].remove([r1, r2])
+        self._bundle['relations'][:] = [
+            r for r in self._bundle['relations']
+            if service_name not in (relation_service(r[0]),
+                                    relation_service(r[1]))]
+        self._invalidate()
 
     def add_relation(self, s1_name, s1_rel, s2_name, s2_rel):
         r = ["{}:{}".format(s1_name, s1_rel),
              "{}:{}".format(s2_name, s2_rel)]
+        self._write()
         self._bundle['relations'].append(r)
+        self._invalidate()
 
     def remove_relation(self, s1_name, s1_rel, s2_name, s2_rel):
         r = self.find_relation(s1_name, s1_rel, s2_name, s2_rel)
+        self._write()
         self._bundle['relations'].remove(r)
+        self._invalidate()
 
     def is_related(self, s1_name, s1_rel, s2_name, s2_rel):
         """Checks if a relation exists. If the relation in the bundle does not
@@ -159,23 +232,26 @@ class Bundle:
     def find_relation(self, s1_name, s1_rel, s2_name, s2_rel):
         a = "{}:{}".format(s1_name, s1_rel)
         b = "{}:{}".format(s2_name, s2_rel)
-        rels = self._bundle['relations']
+        rels = self.relations_for(s1_name)
         for x in [[a, b], [b, a], [s1_name, s2_name], [s2_name, s1_name]]:
             if x in rels:
                 return x
         return None
 
+    def relations_for(self, service_name):
+        """Returns the relations with service_name on either end"""
+        self._index()
+        return list(self._relations.get(service_name, []))
+
+    def service(self, service_name):
+        """Returns the Service named service_name or None"""
+        self._index()
+        return self._services.get(service_name, None)
+
     @property
     def services(self):
-        services = []
-        metadata = self._metadata.get('services', {})
-        bundle_services = self._bundle.get('services', {})
-        relations = self._bundle.get('relations', [])
-        for servicename, sd in bundle_services.items():
-            sm = metadata.get(servicename, {})
-            services.append(create_service(servicename, sd,
-                                           sm, relations))
-        return services
+        self._index()
+        return list(self._services.values())
 
     @property
     def machines(self):
@@ -186,6 +262,7 @@ class Bundle:
         return self._bundle.get('series', DEFAULT_SERIES)
 
     def clear_machines_and_placement(self):
+        self._write()
         self._bundle['machines'] = {}
         for sname, sd in self._bundle['services'].items():
             if 'to' in sd:
@@ -227,6 +304,7 @@ class Bundle:
                                        other_bundle._bundle[k]))
                 raise BundleMergeException(m)
 
+        self._write()
         service_renames = keydict()
         for sname, sd in other_bundle._bundle['services'].items():
             if sname in self._bundle['services']:
@@ -280,7 +358,7 @@ class Bundle:
             if 'to' in sd:
                 new_assignments[service_renames[sname]] = new_sd['to']
 
-        new_services = [s for s in self.services
-                        if s.service_name in new_service_names]
+        self._invalidate()
+        new_services = [self.service(name) for name in new_service_names]
 
         return new_machines, new_services, new_assignments
@@ -17,10 +17,10 @@ from collections import defaultdict
 from concurrent.futures import Future
 from functools import partial
 import json
-import requests
 from threading import RLock
 
-from bundleplacer.async import submit
+from bundleplacer.async import submit, then, completed
+from bundleplacer.charmstore_backend import get_backend
 from bundleplacer.consts import DEFAULT_SERIES
 from bundleplacer.relationtype import RelationType
 
@@ -135,18 +135,9 @@ class MetadataController:
                                           self.handle_search_error)
 
     def _do_load(self, charm_names_or_sources):
-        ids = []
-        for n in charm_names_or_sources:
-            csid = CharmStoreID(n)
-            ids.append("id={}".format(csid.as_str_without_rev()))
-        ids_str = "&".join(ids)
-        url = 'https://api.jujucharms.com/v4/meta/any?include=charm-metadata&'
-        url += ids_str
-        r = requests.get(url)
-        if not r.ok:
-            raise Exception("metadata loading failed: charms={} url={}".format(
-                charm_names_or_sources, url))
-        metas = r.json()
+        ids = [CharmStoreID(n).as_str_without_rev()
+               for n in charm_names_or_sources]
+        metas = get_backend().meta_any(ids)
         for charm_name, charm_dict in metas.items():
             md = charm_dict["Meta"]["charm-metadata"]
             csid = CharmStoreID(charm_dict['Id'])
@@ -231,15 +222,11 @@ class CharmStoreAPI:
     _cachelock = RLock()
 
     def __init__(self, series):
-        self.baseurl = 'https://api.jujucharms.com/v4'
         self.series = series
 
     def _do_remote_lookup(self, charm_name, metakey):
-        url = (self.baseurl + '/meta/' +
-               'any?include=charm-metadata&id={}/{}'.format(self.series,
-                                                            charm_name))
-        r = requests.get(url)
-        rj = r.json()
+        charm_id = 'cs:{}/{}'.format(self.series, charm_name)
+        rj = get_backend().meta_any([charm_id])
         if len(rj.items()) != 1:
             raise Exception("Got wrong number of results from charm store")
         entity = list(rj.values())[0]
@@ -247,43 +234,41 @@ class CharmStoreAPI:
             CharmStoreAPI._cache[charm_name] = entity
         return entity
 
-    def _wait_for_pending_lookup(self, f, charm_name, metakey):
-        try:
-            entity = f.result()
-        except:
-            return None
+    def _forget_failed(self, charm_name, f):
+        """ Drops a failed lookup from the cache so it is tried again
+        """
+        if f.cancelled() or f.exception() is not None:
+            with CharmStoreAPI._cachelock:
+                if CharmStoreAPI._cache.get(charm_name, None) is f:
+                    del CharmStoreAPI._cache[charm_name]
 
+    def _select(self, metakey, entity):
         if metakey is None:
             return entity
         return entity['Meta']['charm-metadata'][metakey]
 
     def _lookup(self, charm_name, metakey, exc_cb):
         with CharmStoreAPI._cachelock:
-            if charm_name in CharmStoreAPI._cache:
-                val = CharmStoreAPI._cache[charm_name]
-                if isinstance(val, Future):
-                    f = submit(partial(self._wait_for_pending_lookup,
-                                       val, charm_name, metakey),
-                               exc_cb)
-                else:
-                    if metakey is None:
-                        d = val
-                    else:
-                        d = val['Meta']['charm-metadata'][metakey]
-                    f = submit(lambda: d, exc_cb)
-            else:
-                whole_entity_f = submit(partial(self._do_remote_lookup,
-                                                charm_name,
-                                                metakey),
-                                        exc_cb)
-                CharmStoreAPI._cache[charm_name] = whole_entity_f
-
-                f = submit(partial(self._wait_for_pending_lookup,
-                                   whole_entity_f, charm_name,
-                                   metakey),
-                           exc_cb)
-
-        return f
+            val = CharmStoreAPI._cache.get(charm_name, None)
+            if val is None:
+                # errors reach exc_cb through then() below, like those of
+                # every later caller chaining onto this lookup
+                val = submit(partial(self._do_remote_lookup,
+                                     charm_name,
+                                     metakey),
+                             lambda _: None)
+                if val is None:
+                    # shutting down
+                    return None
+                CharmStoreAPI._cache[charm_name] = val
+                val.add_done_callback(partial(self._forget_failed,
+                                              charm_name))
+
+        if not isinstance(val, Future):
+            return completed(self._select(metakey, val))
+        # chain onto the pending lookup instead of parking a worker
+        # thread on its result
+        return then(val, partial(self._select, metakey), exc_cb)
 
     def get_summary(self, charm_name, exc_cb):
         return self._lookup(charm_name, 'Summary', exc_cb)
@@ -293,16 +278,7 @@ class CharmStoreAPI:
 
     def get_matches(self, substring, exc_cb):
         def _do_search():
-            url = (self.baseurl +
-                   "/search?text={}&autocomplete=1".format(substring) +
-                   "&limit=20&include=charm-metadata&include=bundle-metadata")
-            charm_url = url + "&type=charm&series={}".format(self.series)
-            bundle_url = url + "&type=bundle"
-            cr = requests.get(charm_url)
-            crj = cr.json()
-            br = requests.get(bundle_url)
-            brj = br.json()
-            return brj['Results'], crj['Results']
+            return get_backend().search(substring, self.series)
 
         f = submit(_do_search, exc_cb)
         return f
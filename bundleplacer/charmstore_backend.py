@@ -0,0 +1,195 @@
+# Copyright 2016 Canonical, Ltd.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+""" Charm store backends
+
+All charm store access (bundle archives, meta/any and search) goes
+through the backend returned by get_backend(). It is picked with the
+CONJURE_CHARMSTORE environment variable:
+
+    unset               https://api.jujucharms.com/v4
+    http(s)://...       a charm store v4 compatible server
+    /path/to/mirror     a local mirror tree, see LocalCharmStore
+
+tools/snapshot-charmstore.py populates a mirror tree with what a spell
+needs and can serve it over HTTP with the same v4 url layout.
+"""
+
+from abc import ABC, abstractmethod
+from urllib.parse import quote
+import json
+import os
+import requests
+
+from bundleplacer.charmstore_cache import MetadataCache
+
+DEFAULT_URL = 'https://api.jujucharms.com/v4'
+ENV_VAR = 'CONJURE_CHARMSTORE'
+
+
+class CharmStoreBackendException(Exception):
+    """ Problem talking to the charm store backend """
+
+
+def entity_path(charm_id):
+    """ Url path of an entity, 'cs:xenial/mysql' -> 'xenial/mysql'
+    """
+    if charm_id.startswith('cs:'):
+        charm_id = charm_id[3:]
+    return charm_id.strip('/')
+
+
+class CharmStoreBackend(ABC):
+    """ Interface of a charm store backend
+    """
+
+    @abstractmethod
+    def bundle_yaml(self, bundle):
+        """ Returns the bundle.yaml text of a bundle id
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def meta_any(self, charm_ids):
+        """ Returns {charm_id: entity} as meta/any with charm-metadata
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def search(self, text, series, limit=20):
+        """ Returns (bundle_results, charm_results) for text
+        """
+        raise NotImplementedError
+
+
+class RemoteCharmStore(CharmStoreBackend):
+    """ Charm store v4 api over http, metadata goes through the on-disk
+    MetadataCache
+    """
+
+    def __init__(self, base_url=DEFAULT_URL, cache=None):
+        self.base_url = base_url.rstrip('/')
+        self.cache = cache or MetadataCache(
+            base_url=self.base_url + '/meta/any?include=charm-metadata')
+
+    def bundle_yaml(self, bundle):
+        url = "{}/{}/archive/bundle.yaml".format(self.base_url,
+                                                 entity_path(bundle))
+        req = requests.get(url)
+        if not req.ok:
+            raise CharmStoreBackendException(
+                "Problem getting bundle: {}".format(req))
+        return req.text
+
+    def meta_any(self, charm_ids):
+        return self.cache.fetch(charm_ids)
+
+    def search(self, text, series, limit=20):
+        url = (self.base_url +
+               "/search?text={}&autocomplete=1".format(quote(text)) +
+               "&limit={}&include=charm-metadata"
+               "&include=bundle-metadata".format(limit))
+        cr = requests.get(url + "&type=charm&series={}".format(series))
+        br = requests.get(url + "&type=bundle")
+        return br.json()['Results'], cr.json()['Results']
+
+
+class LocalCharmStore(CharmStoreBackend):
+    """ Serves a mirror directory laid out like the v4 url space:
+
+        <root>/<entity>/meta.json                entity as in meta/any
+        <root>/<entity>/archive/bundle.yaml      bundle archive file
+
+    where <entity> is the id without 'cs:', eg. 'xenial/mysql' or
+    '~landscape/landscape-dense-maas'.
+    """
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        self._entities = None
+
+    def _file(self, charm_id, *parts):
+        path = os.path.normpath(os.path.join(self.root,
+                                             entity_path(charm_id), *parts))
+        if not path.startswith(self.root + os.sep):
+            raise CharmStoreBackendException(
+                "Invalid entity id: {}".format(charm_id))
+        return path
+
+    def archive_file(self, charm_id, name):
+        return self._file(charm_id, 'archive', name)
+
+    def entity(self, charm_id):
+        try:
+            with open(self._file(charm_id, 'meta.json')) as fp:
+                return json.load(fp)
+        except (OSError, ValueError):
+            return None
+
+    def bundle_yaml(self, bundle):
+        try:
+            with open(self.archive_file(bundle, 'bundle.yaml')) as fp:
+                return fp.read()
+        except OSError as e:
+            raise CharmStoreBackendException(
+                "Problem getting bundle {} from mirror: {}".format(bundle, e))
+
+    def meta_any(self, charm_ids):
+        found = {}
+        for charm_id in charm_ids:
+            entity = self.entity(charm_id)
+            if entity is not None:
+                found[charm_id] = entity
+        return found
+
+    def entities(self):
+        """ All entities in the mirror, loaded once
+        """
+        if self._entities is None:
+            self._entities = []
+            for dirpath, _, filenames in os.walk(self.root):
+                if 'meta.json' in filenames:
+                    with open(os.path.join(dirpath, 'meta.json')) as fp:
+                        self._entities.append(json.load(fp))
+        return self._entities
+
+    def search(self, text, series, limit=20):
+        bundles, charms = [], []
+        for entity in self.entities():
+            meta = entity.get('Meta', {})
+            if text not in entity['Id']:
+                continue
+            if 'bundle-metadata' in meta:
+                bundles.append(entity)
+            elif '/{}/'.format(series) in entity['Id'] or \
+                 entity['Id'].startswith('cs:{}/'.format(series)):
+                charms.append(entity)
+        return bundles[:limit], charms[:limit]
+
+
+_backend = None
+
+
+def get_backend():
+    """ Returns the configured backend, see module docstring
+    """
+    global _backend
+    if _backend is None:
+        location = os.environ.get(ENV_VAR, DEFAULT_URL)
+        if location.startswith(('http://', 'https://')):
+            _backend = RemoteCharmStore(location)
+        else:
+            _backend = LocalCharmStore(location)
+    return _backend
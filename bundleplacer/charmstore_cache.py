@@ -0,0 +1,232 @@
+# Copyright 2016 Canonical, Ltd.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+""" Persistent charm store metadata cache
+
+Entities returned by the charm store meta/any endpoint are stored as
+content addressed blobs under $XDG_CACHE_HOME/conjure-up/charmstore, with
+an index mapping the requested charm id and the resolved id+revision to
+the blob. Entries younger than max_age are served without touching the
+network, pinned revisions never expire, and stale entries are
+revalidated with If-None-Match/If-Modified-Since in URL length safe
+batches that are fetched concurrently.
+
+fetch() runs on the interactive lane workers, so the batches go to a
+small private thread pool rather than the scheduler's fetch lane: a
+lane worker must not block on futures queued behind another lane.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import sha256
+from threading import RLock
+import json
+import logging
+import os
+import requests
+import tempfile
+import time
+
+from bundleplacer import utils
+
+log = logging.getLogger('bundleplacer')
+
+META_URL = 'https://api.jujucharms.com/v4/meta/any?include=charm-metadata'
+MAX_URL_LENGTH = 2000
+MAX_AGE = 6 * 60 * 60
+MAX_FETCH_WORKERS = 4
+
+
+def cache_dir():
+    return utils.cache_dir('conjure-up', 'charmstore')
+
+
+def has_revision(charm_id):
+    """ True if charm_id is pinned to a revision, eg. cs:xenial/mysql-5
+    """
+    _, _, rev = charm_id.rpartition('-')
+    return rev.isdecimal()
+
+
+def batches(charm_ids, base_url=META_URL, max_length=MAX_URL_LENGTH):
+    """ Splits charm_ids into meta/any urls no longer than max_length
+
+    Returns:
+    list of (url, [charm_ids])
+    """
+    out = []
+    url, ids = base_url, []
+    for charm_id in sorted(set(charm_ids)):
+        param = "&id={}".format(charm_id)
+        if ids and len(url) + len(param) > max_length:
+            out.append((url, ids))
+            url, ids = base_url, []
+        url += param
+        ids.append(charm_id)
+    if ids:
+        out.append((url, ids))
+    return out
+
+
+def _write_atomic(path, data):
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, 'w') as fp:
+            fp.write(data)
+        os.replace(tmp, path)
+    except Exception:
+        os.unlink(tmp)
+        raise
+
+
+class MetadataCache:
+    """ On-disk cache of charm store entities
+
+    Arguments:
+    path: cache directory, defaults to cache_dir()
+    max_age: seconds an entry is served without revalidation
+    base_url: meta/any endpoint ids are appended to
+    """
+
+    def __init__(self, path=None, max_age=MAX_AGE, base_url=META_URL):
+        self.path = path or cache_dir()
+        self.max_age = max_age
+        self.base_url = base_url
+        self.lock = RLock()
+        self.requests = 0
+        self._index = None
+
+    @property
+    def index_path(self):
+        return os.path.join(self.path, 'index.json')
+
+    def _blob_path(self, digest):
+        return os.path.join(self.path, 'objects', digest[:2], digest)
+
+    @property
+    def index(self):
+        with self.lock:
+            if self._index is None:
+                try:
+                    with open(self.index_path) as fp:
+                        self._index = json.load(fp)
+                except (OSError, ValueError):
+                    self._index = {}
+                self._index.setdefault('ids', {})
+                self._index.setdefault('batches', {})
+            return self._index
+
+    def _save_index(self):
+        with self.lock:
+            os.makedirs(self.path, exist_ok=True)
+            _write_atomic(self.index_path, json.dumps(self.index))
+
+    def _read_blob(self, digest):
+        try:
+            with open(self._blob_path(digest)) as fp:
+                return json.load(fp)
+        except (OSError, ValueError):
+            return None
+
+    def _store(self, charm_id, entity, now):
+        data = json.dumps(entity, sort_keys=True)
+        digest = sha256(data.encode('utf-8')).hexdigest()
+        path = self._blob_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            _write_atomic(path, data)
+        entry = {'blob': digest, 'fetched': now}
+        with self.lock:
+            self.index['ids'][charm_id] = entry
+            resolved = entity.get('Id', None)
+            if resolved:
+                self.index['ids'][resolved] = entry
+        return digest
+
+    def cached(self, charm_id, fresh_only=True):
+        """ Returns the cached entity for charm_id or None
+        """
+        entry = self.index['ids'].get(charm_id, None)
+        if entry is None:
+            return None
+        if fresh_only and not has_revision(charm_id) and \
+           time.time() - entry['fetched'] > self.max_age:
+            return None
+        return self._read_blob(entry['blob'])
+
+    def _fetch_batch(self, url, charm_ids):
+        with self.lock:
+            validators = dict(self.index['batches'].get(url, {}))
+        headers = {}
+        if validators.get('etag'):
+            headers['If-None-Match'] = validators['etag']
+        if validators.get('last-modified'):
+            headers['If-Modified-Since'] = validators['last-modified']
+        with self.lock:
+            self.requests += 1
+        r = requests.get(url, headers=headers)
+        now = time.time()
+        if r.status_code == 304:
+            log.debug("charmstore cache: {} ids not modified".format(
+                len(charm_ids)))
+            found = {}
+            for charm_id in charm_ids:
+                entity = self.cached(charm_id, fresh_only=False)
+                if entity is None:
+                    # blob went missing, drop validators and refetch
+                    with self.lock:
+                        self.index['batches'].pop(url, None)
+                    return self._fetch_batch(url, charm_ids)
+                with self.lock:
+                    self.index['ids'][charm_id]['fetched'] = now
+                found[charm_id] = entity
+            return found
+        if not r.ok:
+            raise Exception("metadata loading failed: charms={} url={}".format(
+                charm_ids, url))
+        found = r.json()
+        for charm_id, entity in found.items():
+            self._store(charm_id, entity, now)
+        with self.lock:
+            self.index['batches'][url] = {
+                'etag': r.headers.get('ETag', None),
+                'last-modified': r.headers.get('Last-Modified', None)}
+        return found
+
+    def fetch(self, charm_ids):
+        """ Returns {charm_id: entity} for charm_ids
+
+        Fresh entries come from disk, the rest is requested from the
+        charm store in concurrent batches.
+        """
+        found = {}
+        stale = []
+        for charm_id in charm_ids:
+            entity = self.cached(charm_id)
+            if entity is None:
+                stale.append(charm_id)
+            else:
+                found[charm_id] = entity
+        if not stale:
+            return found
+
+        todo = batches(stale, self.base_url)
+        workers = min(len(todo), MAX_FETCH_WORKERS)
+        with ThreadPoolExecutor(workers) as pool:
+            futures = [pool.submit(self._fetch_batch, url, ids)
+                       for url, ids in todo]
+            for f in futures:
+                found.update(f.result())
+        self._save_index()
+        return found
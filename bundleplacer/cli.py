@@ -27,6 +27,7 @@ from bundleplacer.config import Config
 from bundleplacer.controller import BundleWriter, PlacementController
 from bundleplacer.log import setup_logger
 from bundleplacer.placerview import PlacerView
+from bundleplacer.solver import DEFAULT_STRATEGY, STRATEGIES
 from bundleplacer.fixtures.maas import FakeMaasState
 from ubuntui.ev import EventLoop
 from ubuntui.palette import STYLES
@@ -56,6 +57,10 @@ def parse_options(argv, test_args):
     parser.add_argument("--maas-ip", dest="maas_ip", default=None)
     parser.add_argument("--maas-cred", dest="maas_cred", default=None)
     parser.add_argument("-o", dest="out_filename", default=None)
+    parser.add_argument("--placement-strategy", dest="placement_strategy",
+                        choices=list(STRATEGIES), default=DEFAULT_STRATEGY,
+                        help="How machines are picked when placing "
+                        "services automatically")
     return parser.parse_args(argv)
 
 
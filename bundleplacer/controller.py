@@ -19,12 +19,14 @@ import logging
 import yaml
 from multiprocessing import cpu_count
 
-from bundleplacer.maas import (satisfies, MaasMachineStatus)
+from bundleplacer.maas import MaasMachineStatus
 from bundleplacer.state import ServiceState
 
+from bundleplacer.assignments import AssignmentStore
 from bundleplacer.assignmenttype import AssignmentType, label_to_atype
 from bundleplacer.bundle import Bundle
 from bundleplacer.charmstore_api import CharmStoreID
+from bundleplacer.solver import DEFAULT_STRATEGY, get_solver
 
 
 log = logging.getLogger('bundleplacer')
@@ -125,9 +127,14 @@ class PlacementController:
                                                   'Subordinate Charms')
         self.def_placeholder = PlaceholderMachine('_default',
                                                   'Juju Default')
-        # assignments is {id: {atype: [service]}}
-        self.assignments = defaultdict(lambda: defaultdict(list))
-        self.deployments = defaultdict(lambda: defaultdict(list))
+        # assignments is {id: {atype: [service]}}, see AssignmentStore
+        self.assignments = AssignmentStore()
+        self.deployments = AssignmentStore()
+        # ((list ids, sizes), {instance_id: machine}), see _machines_by_id
+        self._machine_index = None
+        # (bundle, bundle placeholders) to return to on rollback(), one
+        # per begin()
+        self._saved_bundles = []
         self.autosave_filename = None
         mf = config.getopt('metadata_filename')
         self.bundle = Bundle(filename=config.getopt('bundle_filename'),
@@ -143,31 +150,77 @@ class PlacementController:
         assignments temporarily, e.g. for supporting cancellable
         assignments in a dialog box.
 
+        The copy shares the machines with this controller, works on a
+        copy-on-write copy of the bundle and tracks its assignments as a
+        transaction over ours, so making it neither reads the bundle
+        again nor copies the assignments.
+
         Pairs with update_from_controller() to 'commit' those temporary
         assignments to the 'main' controller.
         """
-        newpc = PlacementController(maas_state=self.maas_state,
-                                    config=self.config)
-        newpc.assignments = copy.copy(self.assignments)
-        newpc.deployments = copy.copy(self.deployments)
-        newpc._machines = self._machines
-        newpc.reset_assigned_deployed()
+        newpc = copy.copy(self)
+        newpc.autosave_filename = None
+        newpc._saved_bundles = []
+        newpc.bundle = self.bundle.copy()
+        newpc._bundle_placeholders = list(self._bundle_placeholders)
+        newpc.assignments = self.assignments.begin()
+        newpc.deployments = self.deployments.begin()
         return newpc
 
     def update_from_controller(self, other):
         """Updates internal structures based on other's.
         For integrating temporarily tracked updates."""
 
-        self.assignments = other.assignments
-        self.deployments = other.deployments
+        if other.assignments.parent is self.assignments and \
+           other.deployments.parent is self.deployments:
+            other.assignments.commit()
+            other.deployments.commit()
+        else:
+            self.assignments = other.assignments
+            self.deployments = other.deployments
+        self.bundle = other.bundle
+        self._bundle_placeholders = other._bundle_placeholders
+        self.reset_assigned_deployed()
+
+    def begin(self):
+        """Starts a transaction: assignment changes from here on can be
+        undone as a whole with rollback(), or kept with commit().
+
+        Changes to the bundle are undone by rollback() as well.
+        Transactions nest, autosaving waits for the outermost commit.
+        """
+        self._saved_bundles.append((self.bundle,
+                                    self._bundle_placeholders))
+        self.bundle = self.bundle.copy()
+        self._bundle_placeholders = list(self._bundle_placeholders)
+        self.assignments = self.assignments.begin()
+        self.deployments = self.deployments.begin()
+
+    def commit(self):
+        """Keeps the changes made since the matching begin()"""
+        self._saved_bundles.pop()
+        self.assignments = self.assignments.commit()
+        self.deployments = self.deployments.commit()
+        self.update_and_save()
+
+    def rollback(self):
+        """Undoes the changes made since the matching begin()"""
+        self.bundle, self._bundle_placeholders = self._saved_bundles.pop()
+        self.assignments = self.assignments.rollback()
+        self.deployments = self.deployments.rollback()
         self.reset_assigned_deployed()
 
+    def in_transaction(self):
+        return self.assignments.parent is not None
+
     def set_assignments_from_deployments(self):
         """Reset deployment state of all services. Useful after reading a file
         from a previous install.
         """
-        self.assignments = self.deployments
-        self.deployments = defaultdict(lambda: defaultdict(list))
+        deployments = dict(self.deployments.items())
+        self.assignments.clear()
+        self.assignments.update(deployments)
+        self.deployments.clear()
         self.reset_assigned_deployed()
 
     def __repr__(self):
@@ -177,7 +230,7 @@ class PlacementController:
         self.autosave_filename = filename
 
     def do_autosave(self):
-        if not self.autosave_filename:
+        if not self.autosave_filename or self.in_transaction():
             return
         with open(self.autosave_filename, 'w') as af:
             self.save(af)
@@ -203,11 +256,11 @@ class PlacementController:
                 flat_dd[atype.name] = flat_dl
             flat_assignments[iid]['deployments'] = flat_dd
 
+        machines = self._machines_by_id()
         for iid in flat_assignments.keys():
             constraints = {}
             if self.maas_state is None:
-                machine = next((m for m in self.machines() if
-                                m.instance_id == iid), None)
+                machine = machines.get(iid, None)
                 if machine:
                     constraints = machine.constraints
                     flat_assignments[iid]['constraints'] = constraints
@@ -219,9 +272,9 @@ class PlacementController:
         replaces current assignments.
         """
         def find_service(name):
-            for s in self.services():
-                if s.service_name == name:
-                    return s
+            service = self.bundle.service(name)
+            if service is not None:
+                return service
             log.warning("Could not find service "
                         "matching saved service name {}".format(name))
             return None
@@ -285,6 +338,22 @@ class PlacementController:
         else:
             return ms
 
+    def _machines_by_id(self):
+        """Returns {instance_id: machine} for machines().
+
+        Without MAAS machines are only ever appended, so the index is
+        kept until the machine lists change. MAAS machines can come and
+        go at any time and are indexed on every call.
+        """
+        if self.maas_state:
+            return {m.instance_id: m for m in self.machines()}
+        key = (id(self._machines), len(self._machines),
+               id(self._bundle_placeholders), len(self._bundle_placeholders))
+        if self._machine_index is None or self._machine_index[0] != key:
+            self._machine_index = (key, {m.instance_id: m
+                                         for m in self.machines()})
+        return self._machine_index[1]
+
     def machines_pending(self, include_placeholders=False):
         """Returns a list of machines that have services assigned to them
         which are not yet deployed.
@@ -293,14 +362,9 @@ class PlacementController:
         to e.g. get the number of real machines to wait for.
 
         """
-        ms = []
-        for m in self.machines(include_placeholders=include_placeholders):
-            if m.instance_id in self.assignments:
-                n = sum(len(cl) for _, cl in
-                        self.assignments[m.instance_id].items())
-                if n > 0:
-                    ms.append(m)
-        return ms
+        return [m for m in
+                self.machines(include_placeholders=include_placeholders)
+                if self.assignments.count(m.instance_id) > 0]
 
     def add_new_service(self, charm_name, charm_dict, service_name=None):
         """adds a service with the default name of 'charm_name' or
@@ -332,8 +396,7 @@ class PlacementController:
 
     def add_bundle_assignments(self, new_as):
         for sname, tostrs in new_as.items():
-            service = next((s for s in self.bundle.services
-                            if s.service_name == sname), None)
+            service = self.bundle.service(sname)
             if service is None:
                 continue
             for tostr in tostrs:
@@ -343,17 +406,17 @@ class PlacementController:
                     atype = label_to_atype([atype])[0]
                 else:
                     atype, mid = AssignmentType.DEFAULT, parts[0]
-                machine = next((m for m in self.machines() if
-                                m.instance_id == mid), None)
+                machine = self._machines_by_id().get(mid, None)
                 if machine:
                     self.assign(machine, service, atype)
 
     def add_subordinates(self, all_services):
         """looks through all_services and assigns any subordinates to the
         subordinate placeholder."""
-        d = self.assignments[self.sub_placeholder.instance_id]
-        al = d[AssignmentType.DEFAULT]
-        al += [s for s in all_services if s.subordinate]
+        for s in all_services:
+            if s.subordinate:
+                self.assignments.add(self.sub_placeholder.instance_id,
+                                     AssignmentType.DEFAULT, s)
 
     def remove_service(self, service_name):
         self.bundle.remove_service(service_name)
@@ -405,35 +468,28 @@ class PlacementController:
 
     def assign(self, machine, service, atype):
         if not service.allow_multi_units:
-            for m, d in self.assignments.items():
-                for at, l in d.items():
-                    if service in l:
-                        l.remove(service)
+            self.assignments.discard(service)
 
-        self.assignments[machine.instance_id][atype].append(service)
+        self.assignments.add(machine.instance_id, atype, service)
         self.update_and_save()
 
     def mark_deployed(self, machine, service, atype):
-        self.deployments[machine.instance_id][atype].append(service)
-        self.assignments[machine.instance_id][atype].remove(service)
+        self.deployments.add(machine.instance_id, atype, service)
+        self.assignments.remove(machine.instance_id, service, atype)
         self.update_and_save()
 
-    def _get_machines_by_atype(self, a_dict, service):
+    def _get_machines_by_atype(self, store, service, machines=None):
         "Helper for get_assignments and get_deployments"
-        all_machines = self.machines()
+        if machines is None:
+            machines = self._machines_by_id()
 
         machines_by_atype = defaultdict(list)
-        for m_id, d in a_dict.items():
-            m = next((m for m in all_machines
-                      if m.instance_id == m_id), None)
+        for m_id, atype, count in store.for_service(service):
+            m = machines.get(m_id, None)
             if not m:
                 log.debug("can't find machine for m_id '{}'".format(m_id))
                 continue
-
-            for atype, assignment_list in d.items():
-                for c in assignment_list:
-                    if c == service:
-                        machines_by_atype[atype].append(m)
+            machines_by_atype[atype] += [m] * count
 
         return machines_by_atype
 
@@ -454,7 +510,7 @@ class PlacementController:
                                            service)
 
     def clear_all_assignments(self):
-        self.assignments = defaultdict(lambda: defaultdict(list))
+        self.assignments.clear()
         self.update_and_save()
 
     def clear_assignments(self, m):
@@ -464,15 +520,11 @@ class PlacementController:
         if m.instance_id not in self.assignments:
             return
 
-        del self.assignments[m.instance_id]
+        self.assignments.clear_machine(m.instance_id)
         self.update_and_save()
 
     def remove_one_assignment(self, m, cc):
-        ad = self.assignments[m.instance_id]
-        for atype, assignment_list in ad.items():
-            if cc in assignment_list:
-                assignment_list.remove(cc)
-                break
+        self.assignments.remove(m.instance_id, cc)
         self.update_and_save()
 
     def assignments_for_machine(self, m):
@@ -480,51 +532,38 @@ class PlacementController:
 
         {assignment_type: [service]}
         """
-        return self.assignments[m.instance_id]
+        return self.assignments.for_machine(m.instance_id)
 
     def deployments_for_machine(self, m):
         """Returns deployments
         {atype: [service]}
         """
-        return self.deployments[m.instance_id]
+        return self.deployments.for_machine(m.instance_id)
 
     def is_assigned_to(self, service, machine):
-        assignment_dict = self.assignments[machine.instance_id]
-        for atype, services in assignment_dict.items():
-            if service in services:
-                return True
-        return False
+        return self.assignments.holds(machine.instance_id, service)
 
     def is_deployed_to(self, service, machine):
-        dd = self.deployments[machine.instance_id]
-        for atype, services in dd.items():
-            if service in services:
-                return True
-        return False
+        return self.deployments.holds(machine.instance_id, service)
 
     def set_all_assignments(self, assignments):
-        self.assignments = assignments
+        """Replaces all assignments with a {id: {atype: [service]}}
+        dict, eg. from gen_defaults()
+        """
+        self.assignments.clear()
+        self.assignments.update(assignments)
         self.update_and_save()
 
     def reset_assigned_deployed(self):
-        self._assigned_services = set()
-        self._deployed_services = set()
-        for cc in self.services():
-            ad = self.get_assignments(cc)
-            is_assigned = False
-            for atype, al in ad.items():
-                if len(al) > 0:
-                    is_assigned = True
-            if is_assigned:
-                self._assigned_services.add(cc)
+        machines = self._machines_by_id()
+        services = set(self.services())
 
-            dd = self.get_deployments(cc)
-            is_deployed = False
-            for atype, dl in dd.items():
-                if len(dl) > 0:
-                    is_deployed = True
-            if is_deployed:
-                self._deployed_services.add(cc)
+        def placed(store):
+            return {cc for cc in store.services() if cc in services and
+                    any(iid in machines for iid in store.machine_ids(cc))}
+
+        self._assigned_services = placed(self.assignments)
+        self._deployed_services = placed(self.deployments)
 
     def is_assigned(self, service):
         return service in self._assigned_services
@@ -638,14 +677,14 @@ class PlacementController:
         """
 
         empty_machines = [m for m in self.machines(include_placeholders=False)
-                          if len(self.assignments[m.instance_id]) == 0]
+                          if self.assignments.count(m.instance_id) == 0]
 
         unassigned_services = list(self.unassigned_undeployed_services())
         unassigned_defaults = self.gen_defaults(unassigned_services,
                                                 empty_machines)
 
         for mid, services in unassigned_defaults.items():
-            self.assignments[mid] = services
+            self.assignments.set_machine(mid, services)
 
         self.update_and_save()
 
@@ -667,10 +706,9 @@ class PlacementController:
         placeholder.
         """
         for s in self.unassigned_undeployed_services():
-            d = self.assignments[self.def_placeholder.instance_id]
-            al = d[DEFAULT_SHARED_ASSIGNMENT_TYPE]
             for i in range(s.num_units):
-                al.append(s)
+                self.assignments.add(self.def_placeholder.instance_id,
+                                     DEFAULT_SHARED_ASSIGNMENT_TYPE, s)
         self.update_and_save()
 
     def gen_defaults(self, services=None, maas_machines=None):
@@ -697,14 +735,6 @@ class PlacementController:
                 MaasMachineStatus.READY,
                 constraints=self.config.getopt('constraints'))
 
-        def satisfying_machine(constraints):
-            for machine in maas_machines:
-                if satisfies(machine, constraints)[0]:
-                    maas_machines.remove(machine)
-                    return machine
-
-            return None
-
         isolated_services, controller_services = [], []
         subordinate_services = []
 
@@ -721,17 +751,17 @@ class PlacementController:
             else:
                 controller_services.append(service)
 
-        for service in isolated_services:
-            for n in range(service.required_num_units()):
-                m = satisfying_machine(service.constraints)
-                if m:
-                    l = assignments[m.instance_id][AssignmentType.BareMetal]
-                    l.append(service)
-
-        controller_machine = satisfying_machine({})
-        if controller_machine:
-            for service in controller_services:
-                ad = assignments[controller_machine.instance_id]
+        strategy = self.config.getopt('placement_strategy') or \
+            DEFAULT_STRATEGY
+        solution = get_solver(strategy, maas_machines).solve(
+            isolated_services, controller_services)
+        for m, service in solution.units:
+            l = assignments[m.instance_id][AssignmentType.BareMetal]
+            l.append(service)
+
+        if solution.shared_machine:
+            for service in solution.shared:
+                ad = assignments[solution.shared_machine.instance_id]
                 l = ad[DEFAULT_SHARED_ASSIGNMENT_TYPE]
                 l.append(service)
 
@@ -25,11 +25,21 @@ log = logging.getLogger('bundleplacer')
 class FakeMaasState:
     """ A fake MAAS fixture for quickly testing bundle placement
     against a set of machines
+
+    Arguments:
+    nodes: MAAS node dicts to serve, defaults to those in
+           share/maas-machines.json
     """
 
     server_hostname = "fake.maas"
 
+    def __init__(self, nodes=None):
+        self.nodes = nodes
+
     def machines(self, state=None, constraints=None):
+        if self.nodes is not None:
+            return [MaasMachine(-1, m) for m in self.nodes
+                    if state is None or m['status'] == state.value]
         fakepath = '/usr/share/bundle-placer/share'
         fn = os.path.join(fakepath, "maas-machines.json")
         if not os.path.exists(fn):
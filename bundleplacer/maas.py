@@ -29,7 +29,7 @@ from maasclient import MaasClient
 
 from bundleplacer.async import submit
 from bundleplacer.machine import Machine
-from bundleplacer.utils import human_to_mb
+from bundleplacer.nodeindex import Constraints, NodeIndex
 
 
 log = logging.getLogger('bundleplacer')
@@ -48,38 +48,20 @@ def satisfies(machine, constraints):
 
     If successful the return will be (True, [])
 
+    Checking many machines against the same constraints, pass them
+    compiled with Constraints.from_dict() once, or select() them from a
+    NodeIndex.
+
     :rtype: tuple
     :returns: (bool, [list-of-failed constraint keys])
 
     """
-    kmap = dict(mem='memory',
-                arch='architecture',
-                storage='storage',
-                cpu_cores='cpu_count')
-    kmap['root-disk'] = 'storage'
-
-    cons_checks = []
-
     if constraints is None:
         return (True, [])
 
-    for k, v in constraints.items():
-        if k == 'arch':
-            mval = machine.machine[kmap[k]]
-            if mval != '*' and mval != v:
-                cons_checks.append(k)
-        else:
-            mval = machine.machine[kmap[k]]
-
-            if mval == '*':
-                # '*' always satisfies.
-                continue
-
-            if not str(v).isdecimal():
-                v = human_to_mb(v)
-
-            if mval < v:
-                cons_checks.append(k)
+    if not isinstance(constraints, Constraints):
+        constraints = Constraints.from_dict(constraints)
+    cons_checks = constraints.failed(machine.machine)
 
     rval = (len(cons_checks) == 0), cons_checks
     return rval
@@ -305,6 +287,9 @@ class MaasState:
         self.maas_client = maas_client
         self._maas_client_nodes = []
         self._filtered_nodes = []
+        # (nodes, size, NodeIndex) of the last nodes filtered
+        self._node_index = None
+        self._compiled = {}
         self._nodes_lock = RLock()
         self._nodes_future = None
         self._start_time = 0
@@ -344,30 +329,31 @@ class MaasState:
 
     def nodes_uncached(self, constraints=None):
         if constraints:
-            return self._filter_nodes(self.maas_client.nodes)
+            return self._filter_nodes(self.maas_client.nodes, constraints)
         else:
             return self.maas_client.nodes
 
     def _filter_nodes(self, nodes, constraints):
+        """ Nodes matching the arch and tags of a juju constraints string
+
+        Other keys are not checked. arch is compared with the part of a
+        node's architecture before '/', nodes with architecture '*' do
+        not match any arch.
+        """
         assert constraints is not None
 
-        cd = dict(x.split('=') for x in constraints.split(' '))
-        arch = cd.get('arch', None)
-        tagstr = cd.get('tags', None)
-        satisfying_nodes = []
-        for n in self._maas_client_nodes:
-            if arch:
-                n_arch = n['architecture'].split('/')[0]
-                if n_arch != arch:
-                    continue
-            if tagstr:
-                c_tags = set(cd['tags'].split(','))
-                n_tags = set(n['tag_names'])
-                if not c_tags.issubset(n_tags):
-                    continue
-            satisfying_nodes.append(n)
-
-        return satisfying_nodes
+        compiled = self._compiled.get(constraints, None)
+        if compiled is None:
+            parsed = Constraints.from_string(constraints)
+            compiled = Constraints(arch=parsed.arch, arch_prefix=True,
+                                   tags=parsed.tags, wildcard_arch=False)
+            self._compiled[constraints] = compiled
+
+        cached = self._node_index
+        if cached is None or cached[0] is not nodes or \
+           cached[1] != len(nodes):
+            cached = self._node_index = (nodes, len(nodes), NodeIndex(nodes))
+        return [nodes[row] for row in cached[2].select(compiled)]
 
     def invalidate_nodes_cache(self):
         """Force reload on next access"""
@@ -0,0 +1,240 @@
+# Copyright 2016 Canonical, Ltd.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+""" Columnar index of MAAS nodes
+
+Filtering machines used to evaluate every constraint of a dict or
+string against every node, converting '4G' to megabytes and rebuilding
+tag sets each time. Instead constraints are compiled once into a
+Constraints, and a NodeIndex keeps the numeric hardware of the nodes in
+arrays and their architectures, tags and zones in inverted indexes, so
+a filter is a few set lookups followed by bulk comparisons over the
+columns.
+
+    index = NodeIndex(maas_client.nodes)
+    rows = index.select(Constraints.from_string('arch=amd64 mem=4G'))
+    nodes = [maas_client.nodes[i] for i in rows]
+"""
+
+from array import array
+from itertools import compress, repeat
+from operator import ge
+
+from bundleplacer.utils import human_to_mb
+
+WILDCARD = float('inf')
+
+# hardware columns and the node keys they are read from
+COLUMNS = [('memory', 'memory'), ('cpu_count', 'cpu_count'),
+           ('storage', 'storage')]
+
+# satisfies() constraint keys and the columns they limit
+DICT_KEYS = {'mem': 'memory', 'cpu_cores': 'cpu_count',
+             'storage': 'storage', 'root-disk': 'storage'}
+
+# juju constraint string keys and the columns they limit
+STRING_KEYS = {'mem': 'memory', 'cores': 'cpu_count',
+               'cpu-cores': 'cpu_count', 'root-disk': 'storage'}
+
+
+def to_mb(value):
+    """ Megabytes (or a plain count) of a constraint value like '4G' """
+    if str(value).isdecimal():
+        return float(value)
+    return human_to_mb(str(value))
+
+
+def hardware_value(value):
+    """ Numeric value of a machine hardware field, WILDCARD for '*' """
+    if value == '*':
+        return WILDCARD
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _zone_name(node):
+    zone = node.get('zone', None)
+    if isinstance(zone, dict):
+        return zone.get('name', '')
+    return zone or ''
+
+
+class Constraints:
+    """ Constraints compiled for evaluating against many nodes
+
+    Arguments:
+    minimums: [(constraint key, column, value)] lower limits on the
+              hardware columns
+    arch: architecture nodes must have, or None
+    arch_prefix: if True arch matches the part of a node's architecture
+                 before '/', so 'amd64' matches 'amd64/generic'
+    wildcard_arch: if True nodes with architecture '*' match any arch
+    tags: tags nodes must all have
+    zones: zones nodes must be in, any zone if empty
+    """
+
+    def __init__(self, minimums=(), arch=None, arch_prefix=False,
+                 tags=(), zones=(), wildcard_arch=True):
+        self.minimums = list(minimums)
+        self.arch = arch
+        self.arch_prefix = arch_prefix
+        self.wildcard_arch = wildcard_arch
+        self.tags = frozenset(tags)
+        self.zones = frozenset(zones)
+
+    @classmethod
+    def from_dict(cls, constraints):
+        """ Compiles a {'mem': .., 'cpu_cores': .., 'storage': ..,
+        'root-disk': .., 'arch': ..} dict as satisfies() takes
+
+        Raises:
+        KeyError for other keys
+        """
+        minimums, arch = [], None
+        for k, v in (constraints or {}).items():
+            if k == 'arch':
+                arch = v
+            else:
+                minimums.append((k, DICT_KEYS[k], to_mb(v)))
+        return cls(minimums, arch=arch)
+
+    @classmethod
+    def from_string(cls, constraints):
+        """ Compiles a juju constraints string, eg. 'arch=amd64 mem=4G
+        tags=ssd,fast zones=a'. Keys without a MAAS node attribute to
+        check are ignored.
+        """
+        minimums, arch, tags, zones = [], None, [], []
+        for term in (constraints or '').split():
+            k, _, v = term.partition('=')
+            if not v:
+                continue
+            if k == 'arch':
+                arch = v
+            elif k == 'tags':
+                tags = [t for t in v.split(',') if t]
+            elif k in ('zone', 'zones'):
+                zones = [z for z in v.split(',') if z]
+            elif k in STRING_KEYS:
+                minimums.append((k, STRING_KEYS[k], to_mb(v)))
+        return cls(minimums, arch=arch, arch_prefix=True, tags=tags,
+                   zones=zones)
+
+    def failed(self, node):
+        """ Returns the constraint keys node does not satisfy
+
+        Arguments:
+        node: MAAS node dict
+        """
+        failed = []
+        if self.arch is not None:
+            march = node.get('architecture', None) or '*'
+            if self.arch_prefix:
+                march = march.split('/')[0]
+            if march != self.arch and not (march == '*' and
+                                           self.wildcard_arch):
+                failed.append('arch')
+        for key, column, minimum in self.minimums:
+            if hardware_value(node.get(column, 0)) < minimum:
+                failed.append(key)
+        if self.tags and not self.tags.issubset(node.get('tag_names', [])):
+            failed.append('tags')
+        if self.zones and _zone_name(node) not in self.zones:
+            failed.append('zones')
+        return failed
+
+    def __bool__(self):
+        return bool(self.minimums or self.arch or self.tags or self.zones)
+
+    def __repr__(self):
+        return "<Constraints {} arch={} tags={} zones={}>".format(
+            ", ".join("{}>={}".format(k, v) for k, _, v in self.minimums),
+            self.arch, sorted(self.tags), sorted(self.zones))
+
+
+class NodeIndex:
+    """ Hardware columns and inverted indexes over a list of nodes
+
+    Rows are positions in the list given, select() returns them in that
+    order.
+
+    Arguments:
+    nodes: MAAS node dicts, eg. maas_client.nodes or the .machine of
+           MaasMachines
+    """
+
+    def __init__(self, nodes):
+        nodes = list(nodes)
+        self.size = len(nodes)
+        self.columns = {}
+        for name, key in COLUMNS:
+            values = [node.get(key, 0) for node in nodes]
+            self.columns[name] = array('d', [
+                v if isinstance(v, (int, float)) else hardware_value(v)
+                for v in values])
+        self.arch = {}
+        self.arch_prefix = {}
+        self.any_arch = set()
+        self.tags = {}
+        self.zones = {}
+        for row, node in enumerate(nodes):
+            arch = node.get('architecture', None) or '*'
+            if arch == '*':
+                self.any_arch.add(row)
+            else:
+                self.arch.setdefault(arch, set()).add(row)
+                self.arch_prefix.setdefault(arch.split('/')[0],
+                                            set()).add(row)
+            for tag in node.get('tag_names', []):
+                self.tags.setdefault(tag, set()).add(row)
+            self.zones.setdefault(_zone_name(node), set()).add(row)
+
+    def select(self, constraints):
+        """ Returns the rows of the nodes satisfying compiled constraints,
+        in order
+        """
+        rows = None
+        if constraints.arch is not None:
+            by_arch = (self.arch_prefix if constraints.arch_prefix
+                       else self.arch)
+            rows = set(by_arch.get(constraints.arch, set()))
+            if constraints.wildcard_arch:
+                rows |= self.any_arch
+        for tag in constraints.tags:
+            tagged = self.tags.get(tag, set())
+            rows = set(tagged) if rows is None else rows & tagged
+        if constraints.zones:
+            zoned = set()
+            for zone in constraints.zones:
+                zoned |= self.zones.get(zone, set())
+            rows = zoned if rows is None else rows & zoned
+        if rows is not None:
+            rows = sorted(rows)
+
+        for _, column, minimum in constraints.minimums:
+            values = self.columns[column]
+            if rows is None:
+                rows = list(compress(range(self.size),
+                                     map(ge, values, repeat(minimum))))
+            else:
+                rows = [row for row in rows if values[row] >= minimum]
+        if rows is None:
+            return list(range(self.size))
+        return rows
+
+    def __len__(self):
+        return self.size
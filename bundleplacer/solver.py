@@ -0,0 +1,387 @@
+# Copyright 2016 Canonical, Ltd.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+""" Auto-placement solvers
+
+gen_defaults() gives every unit of an isolated service a MAAS machine of
+its own and puts the remaining shared services together on one more.
+Which machines they get is up to a strategy:
+
+    first-fit             the first machine satisfying the constraints,
+                          in the order the machines were given (default)
+    first-fit-decreasing  first fit, placing the most demanding services
+                          first
+    best-fit              the smallest machine satisfying the constraints,
+                          keeping big machines for the units needing them
+    zone-spread           best fit in the zone holding the fewest units of
+                          the service so far
+
+For every strategy a service is placed whole or not at all, never next
+to a service it conflicts with, and not when a service it depends on
+could not be placed. Services others depend on are placed first.
+
+Machine hardware is read once into sortable capacity records, so finding
+a machine is a bisect and a short scan rather than a satisfies() call
+per machine.
+"""
+
+from abc import ABC, abstractmethod
+from bisect import bisect_left, bisect_right
+from collections import Counter, OrderedDict
+import logging
+
+from bundleplacer.nodeindex import hardware_value, to_mb
+
+log = logging.getLogger('bundleplacer')
+
+
+class Demand:
+    """ Constraints of a service, as satisfies() reads them
+
+    Arguments:
+    constraints: {'mem': .., 'cpu_cores': .., 'storage': .., 'arch': ..},
+                 'root-disk' counts as storage, other keys are ignored
+    """
+
+    __slots__ = ('mem', 'cpu_cores', 'storage', 'arch')
+
+    def __init__(self, constraints=None):
+        self.mem = self.cpu_cores = self.storage = 0
+        self.arch = None
+        for k, v in (constraints or {}).items():
+            if k == 'arch':
+                self.arch = v
+            elif k == 'mem':
+                self.mem = to_mb(v)
+            elif k == 'cpu_cores':
+                self.cpu_cores = int(v)
+            elif k in ('storage', 'root-disk'):
+                self.storage = max(self.storage, to_mb(v))
+            else:
+                log.debug("solver ignores constraint {}={}".format(k, v))
+
+    def key(self):
+        return (self.mem, self.cpu_cores, self.storage)
+
+    def union(self, other):
+        """ Returns the demand of both together on one machine, None when
+        their architectures differ
+        """
+        if None not in (self.arch, other.arch) and self.arch != other.arch:
+            return None
+        both = Demand()
+        both.mem = max(self.mem, other.mem)
+        both.cpu_cores = max(self.cpu_cores, other.cpu_cores)
+        both.storage = max(self.storage, other.storage)
+        both.arch = self.arch or other.arch
+        return both
+
+
+class Node:
+    """ Hardware of a machine, read once
+
+    Arguments:
+    index: position of the machine in the order given to the solver
+    machine: MaasMachine or anything with a MAAS style .machine dict
+    """
+
+    __slots__ = ('index', 'machine', 'mem', 'cpu_cores', 'storage', 'arch',
+                 'zone')
+
+    def __init__(self, index, machine):
+        hw = machine.machine
+        self.index = index
+        self.machine = machine
+        self.mem = hardware_value(hw.get('memory', 0))
+        self.cpu_cores = hardware_value(hw.get('cpu_count', 0))
+        self.storage = hardware_value(hw.get('storage', 0))
+        self.arch = hw.get('architecture', None) or '*'
+        zone = hw.get('zone', None)
+        self.zone = zone.get('name', '') if isinstance(zone, dict) else ''
+
+    def fits(self, demand):
+        if demand.arch and self.arch != '*' and self.arch != demand.arch \
+           and self.arch.split('/')[0] != demand.arch:
+            return False
+        return (self.mem >= demand.mem and
+                self.cpu_cores >= demand.cpu_cores and
+                self.storage >= demand.storage)
+
+
+class NodePool:
+    """ Free nodes kept sorted by key
+
+    Arguments:
+    nodes: Nodes to start with
+    key: sort key of a Node
+    """
+
+    def __init__(self, nodes, key):
+        self._key = key
+        self._nodes = sorted(nodes, key=key)
+        self._keys = [key(n) for n in self._nodes]
+
+    def add(self, node):
+        i = bisect_right(self._keys, self._key(node))
+        self._keys.insert(i, self._key(node))
+        self._nodes.insert(i, node)
+
+    def take(self, demand, start=None):
+        """ Removes and returns the first node from start on fitting
+        demand, None if there is none
+        """
+        i = 0 if start is None else bisect_left(self._keys, start)
+        for j in range(i, len(self._nodes)):
+            if self._nodes[j].fits(demand):
+                del self._keys[j]
+                return self._nodes.pop(j)
+        return None
+
+    def __len__(self):
+        return len(self._nodes)
+
+
+class Solution:
+    """ Machines picked by a solver
+
+    units: [(machine, service)] one per placed unit of an isolated service
+    shared_machine: machine for the shared services, or None
+    shared: shared services placed on shared_machine
+    unplaced: services that could not be placed
+    """
+
+    def __init__(self):
+        self.units = []
+        self.shared_machine = None
+        self.shared = []
+        self.unplaced = []
+
+    def machines_used(self):
+        return len(self.units) + (1 if self.shared_machine else 0)
+
+    def __repr__(self):
+        return "<Solution {} machines, {} unplaced>".format(
+            self.machines_used(), len(self.unplaced))
+
+
+class Solver(ABC):
+    """ Base of the placement strategies, see solve()
+
+    Subclasses keep the free nodes in pools and implement take() and
+    release().
+
+    Arguments:
+    machines: machines free to place on, most preferred first
+    """
+
+    name = None
+
+    def __init__(self, machines):
+        self.nodes = [Node(n, m) for n, m in enumerate(machines)]
+
+    def order(self, services, demands):
+        """ Returns services in the order to place them """
+        return list(services)
+
+    @abstractmethod
+    def take(self, service, demand):
+        """ Returns a free Node fitting demand for a unit of service, no
+        longer free, or None
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def release(self, service, node):
+        """ Frees a Node taken for service again """
+        raise NotImplementedError
+
+    def solve(self, isolated, shared=()):
+        """ Finds a machine for every unit of the isolated services and one
+        for the shared services together
+
+        Arguments:
+        isolated: services needing machines of their own
+        shared: services that may share one machine
+
+        Returns:
+        a Solution
+        """
+        solution = Solution()
+        isolated, shared = list(isolated), list(shared)
+        names = set(s.service_name for s in isolated + shared)
+        needed = set(d for s in isolated + shared for d in s.depends
+                     if d in names)
+        demands = {s: Demand(s.constraints) for s in isolated + shared}
+        placed = OrderedDict()
+        failed = set()
+
+        def conflicts(service):
+            return [other for other in list(placed) + solution.shared
+                    if other.service_name in service.conflicts or
+                    service.service_name in other.conflicts]
+
+        # services others depend on go first, sort is stable
+        ordered = sorted(self.order(isolated, demands),
+                         key=lambda s: s.service_name not in needed)
+        for service in ordered:
+            if conflicts(service) or any(d in failed
+                                         for d in service.depends):
+                failed.add(service.service_name)
+                continue
+            n_units = service.required_num_units()
+            if not service.allow_multi_units:
+                n_units = min(n_units, 1)
+            nodes = []
+            for n in range(n_units):
+                node = self.take(service, demands[service])
+                if node is None:
+                    break
+                nodes.append(node)
+            if len(nodes) < n_units:
+                for node in nodes:
+                    self.release(service, node)
+                failed.add(service.service_name)
+            else:
+                placed[service] = nodes
+
+        demand = Demand()
+        shared_node = None
+        for service in shared:
+            both = demand.union(demands[service])
+            if both is None or conflicts(service) or \
+               any(d in failed for d in service.depends):
+                failed.add(service.service_name)
+                continue
+            demand = both
+            solution.shared.append(service)
+        if solution.shared:
+            node = self.take(None, demand)
+            if node is None:
+                failed.update(s.service_name for s in solution.shared)
+                solution.shared = []
+            else:
+                shared_node = node
+                solution.shared_machine = node.machine
+
+        # a dependency may have failed after its dependents were placed
+        dropped = True
+        while dropped:
+            dropped = [s for s in placed
+                       if any(d in failed for d in s.depends)]
+            for service in dropped:
+                for node in placed.pop(service):
+                    self.release(service, node)
+                failed.add(service.service_name)
+            dropped_shared = [s for s in solution.shared
+                              if any(d in failed for d in s.depends)]
+            for service in dropped_shared:
+                solution.shared.remove(service)
+                failed.add(service.service_name)
+            dropped += dropped_shared
+        if shared_node is not None and not solution.shared:
+            self.release(None, shared_node)
+            solution.shared_machine = None
+
+        for service, nodes in placed.items():
+            solution.units.extend((node.machine, service) for node in nodes)
+        solution.unplaced = [s for s in isolated + shared
+                             if s.service_name in failed]
+        return solution
+
+
+class FirstFit(Solver):
+    name = 'first-fit'
+
+    def __init__(self, machines):
+        super().__init__(machines)
+        self.pool = NodePool(self.nodes, key=lambda n: n.index)
+
+    def take(self, service, demand):
+        return self.pool.take(demand)
+
+    def release(self, service, node):
+        self.pool.add(node)
+
+
+class FirstFitDecreasing(FirstFit):
+    name = 'first-fit-decreasing'
+
+    def order(self, services, demands):
+        return sorted(services, key=lambda s: demands[s].key(), reverse=True)
+
+
+def _capacity(node):
+    return (node.mem, node.cpu_cores, node.storage, node.index)
+
+
+class BestFit(Solver):
+    name = 'best-fit'
+
+    def __init__(self, machines):
+        super().__init__(machines)
+        self.pool = NodePool(self.nodes, key=_capacity)
+
+    def take(self, service, demand):
+        return self.pool.take(demand, start=(demand.mem,))
+
+    def release(self, service, node):
+        self.pool.add(node)
+
+
+class ZoneSpread(Solver):
+    name = 'zone-spread'
+
+    def __init__(self, machines):
+        super().__init__(machines)
+        zones = OrderedDict()
+        for node in self.nodes:
+            zones.setdefault(node.zone, []).append(node)
+        self.pools = OrderedDict((zone, NodePool(nodes, key=_capacity))
+                                 for zone, nodes in zones.items())
+        self.spread = Counter()
+
+    def take(self, service, demand):
+        name = service.service_name if service else None
+        zones = sorted(self.pools, key=lambda z: (self.spread[name, z],
+                                                  -len(self.pools[z])))
+        for zone in zones:
+            node = self.pools[zone].take(demand, start=(demand.mem,))
+            if node is not None:
+                self.spread[name, zone] += 1
+                return node
+        return None
+
+    def release(self, service, node):
+        name = service.service_name if service else None
+        self.spread[name, node.zone] -= 1
+        self.pools[node.zone].add(node)
+
+
+STRATEGIES = OrderedDict((s.name, s) for s in (FirstFit, FirstFitDecreasing,
+                                               BestFit, ZoneSpread))
+
+DEFAULT_STRATEGY = FirstFit.name
+
+
+def get_solver(strategy, machines):
+    """ Returns the Solver for a strategy name over machines
+
+    Raises:
+    ValueError for unknown strategies
+    """
+    if strategy not in STRATEGIES:
+        raise ValueError("Unknown placement strategy '{}', expected one "
+                         "of {}".format(strategy, ", ".join(STRATEGIES)))
+    return STRATEGIES[strategy](machines)
@@ -16,7 +16,8 @@
 import logging
 from urwid import Divider, Pile, Text, WidgetWrap
 
-from bundleplacer.maas import satisfies, MaasMachineStatus
+from bundleplacer.maas import MaasMachineStatus
+from bundleplacer.nodeindex import Constraints, NodeIndex
 
 from bundleplacer.ui.filter_box import FilterBox
 from bundleplacer.ui.simple_machine_widget import SimpleMachineWidget
@@ -59,6 +60,9 @@ class MachinesList(WidgetWrap):
             self.constraints = {}
         else:
             self.constraints = constraints
+        self._constraints = Constraints.from_dict(self.constraints)
+        # (node ids, nodes, NodeIndex) of the machines last listed
+        self._node_index = None
         self.show_hardware = show_hardware
         self.show_assignments = show_assignments
         self.show_placeholders = show_placeholders
@@ -115,7 +119,12 @@ class MachinesList(WidgetWrap):
             if machine is None:
                 self.remove_machine(mw.machine)
 
-        n_satisfying_machines = len(machines)
+        nodes = [m.machine for m in machines]
+        node_ids = [id(n) for n in nodes]
+        if self._node_index is None or self._node_index[0] != node_ids:
+            self._node_index = (node_ids, nodes, NodeIndex(nodes))
+        satisfying = set(self._node_index[2].select(self._constraints))
+        n_satisfying_machines = len(satisfying)
 
         def get_placement_filter_label(d):
             s = ""
@@ -125,10 +134,9 @@ class MachinesList(WidgetWrap):
                                for cc in al])
             return s
 
-        for m in machines:
-            if not satisfies(m, self.constraints)[0]:
+        for row, m in enumerate(machines):
+            if row not in satisfying:
                 self.remove_machine(m)
-                n_satisfying_machines -= 1
                 continue
 
             assignment_names = ""
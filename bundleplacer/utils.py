@@ -598,6 +598,14 @@ def slurp(path):
         raise IOError
 
 
+def cache_dir(*parts):
+    """ returns $XDG_CACHE_HOME (~/.cache if unset) joined with parts
+    """
+    cache_home = os.environ.get('XDG_CACHE_HOME', os.path.join(
+        os.path.expanduser('~'), '.cache'))
+    return os.path.join(cache_home, *parts)
+
+
 def human_to_mb(s):
     """Translates human-readable strings like '10G' to numeric
     megabytes"""
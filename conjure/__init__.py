@@ -1 +1,9 @@
 __version__ = "0.1.0"
+
+import sys  # noqa
+
+if '--profile-startup' in sys.argv:
+    # has to happen before the entry point pulls in the rest of the tree
+    from conjure.profiling import profiler
+    profiler.enable()
+    profiler.start('import')
@@ -0,0 +1,85 @@
+""" Status snapshot file for processing scripts
+
+The hooklib helpers used by pre/post processing scripts used to run
+`juju status` for every question they asked. Instead conjure keeps the
+model status it already streams from the AllWatcher in a JSON file,
+replaced atomically whenever the model changes, and points the scripts
+at it with CONJURE_STATUS_FILE.
+"""
+
+import asyncio
+import atexit
+import json
+import logging
+import os
+import tempfile
+
+log = logging.getLogger('conjure')
+
+
+def snapshot_path(session_id):
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR', tempfile.gettempdir())
+    return os.path.join(runtime_dir,
+                        'conjure-up-{}'.format(session_id),
+                        'status.json')
+
+
+class StatusSnapshot:
+    """ Writes a ModelStatus to path on change
+
+    Bursts of changes are coalesced, the file is written at most every
+    min_interval seconds. Readers always see a complete file, it is
+    written next to path and renamed over it. The file is removed at
+    exit.
+
+    Arguments:
+    path: file to write
+    min_interval: seconds between writes
+    """
+
+    def __init__(self, path, min_interval=0.5):
+        self.path = path
+        self.min_interval = min_interval
+        self.writes = 0
+        self._status = None
+        self._pending = None
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        atexit.register(self.close)
+
+    def update(self, status, changed=None):
+        """ Schedules a write of status, call from the event loop
+
+        Matches the StatusWatcher on_change signature.
+        """
+        self._status = status
+        if self._pending is None:
+            self._pending = asyncio.get_event_loop().call_later(
+                self.min_interval, self.flush)
+
+    def flush(self):
+        self._pending = None
+        if self._status is None:
+            return
+        data = json.dumps(self._status.to_json_status())
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(self.path))
+        try:
+            with os.fdopen(fd, 'w') as fp:
+                fp.write(data)
+            os.replace(tmp, self.path)
+            self.writes += 1
+        except OSError as e:
+            log.warning("Unable to write status snapshot: {}".format(e))
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+
+    def close(self):
+        if self._pending is not None:
+            self._pending.cancel()
+            self._pending = None
+        try:
+            os.unlink(self.path)
+            os.rmdir(os.path.dirname(self.path))
+        except OSError:
+            pass
@@ -0,0 +1,130 @@
+""" Interfaces to Juju API AllWatcher """
+
+from conjure.juju import Juju, requires_login
+from conjure.models.status import ModelStatus
+from macumba.v2 import AsyncJujuClient
+from macumba.errors import ConnectionClosedError, RequestTimeout
+import asyncio
+import logging
+
+log = logging.getLogger('conjure')
+
+
+@requires_login
+def connection_params():
+    """ Returns url, password and user of the current model connection
+    """
+    return Juju.client.url, Juju.client.password, Juju.user_tag
+
+
+class StatusWatcher:
+    """ Streams model changes from the AllWatcher into a ModelStatus
+
+    Runs as a task on the application's asyncio loop. The first Next call
+    of a fresh watcher returns the whole model, after that only deltas
+    arrive, so a full re-fetch only happens when the connection has to be
+    re-established. Entities missing from that re-fetch are reported as
+    changed so listeners see what was removed while disconnected.
+
+    While a Next call is outstanding the connection is pinged every
+    ping_interval seconds; an unanswered ping closes it so a silently
+    dropped socket is noticed within seconds instead of never. Reconnects
+    back off from retry_interval up to max_retry_interval.
+
+    Arguments:
+    on_change: callable(status, changed) invoked on the event loop with the
+               ModelStatus and the set of (entity, name) that changed.
+    """
+
+    def __init__(self, on_change, retry_interval=0.5, max_retry_interval=15,
+                 ping_interval=5, ping_timeout=5):
+        self.on_change = on_change
+        self.retry_interval = retry_interval
+        self.max_retry_interval = max_retry_interval
+        self.ping_interval = ping_interval
+        self.ping_timeout = ping_timeout
+        self.status = ModelStatus()
+        self.client = None
+        self._task = None
+
+    @property
+    def running(self):
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        if not self.running:
+            self._task = asyncio.ensure_future(self._run())
+        return self._task
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+
+    def _notify(self, changed):
+        try:
+            self.on_change(self.status, changed)
+        except Exception:
+            log.exception("status watcher callback failed")
+
+    async def _connect(self):
+        url, password, user = connection_params()
+        self.client = AsyncJujuClient(url, password, user)
+        await self.client.login()
+        res = await self.client.Client(request="WatchAll")
+        return res.get('AllWatcherId', res.get('watcher-id'))
+
+    async def _keepalive(self, client):
+        while True:
+            await asyncio.sleep(self.ping_interval)
+            try:
+                await client.Pinger(request="Ping",
+                                    timeout=self.ping_timeout)
+            except RequestTimeout:
+                log.warning("status watcher connection stalled, "
+                            "reconnecting")
+                # fails the outstanding Next with ConnectionClosedError
+                await client.close()
+                return
+            except ConnectionClosedError:
+                # the outstanding Next fails too, _run reconnects
+                return
+
+    async def _run(self):
+        delay = self.retry_interval
+        # entities seen before the last reconnect, not yet replayed
+        known = set()
+        while True:
+            keepalive = None
+            try:
+                watcher_id = await self._connect()
+                keepalive = asyncio.ensure_future(
+                    self._keepalive(self.client))
+                # a fresh watcher replays the whole model, start clean
+                known |= self.status.entities()
+                self.status.reset()
+                replayed = False
+                while True:
+                    res = await self.client.AllWatcher(
+                        request="Next", object_id=watcher_id)
+                    delay = self.retry_interval
+                    deltas = res.get('Deltas', res.get('deltas', []))
+                    changed = self.status.apply(deltas)
+                    if not replayed:
+                        changed |= known - self.status.entities()
+                        known = set()
+                        replayed = True
+                    if changed:
+                        self._notify(changed)
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                log.warning("status watcher lost connection: {}, retrying "
+                            "in {}s".format(e, delay))
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.max_retry_interval)
+            finally:
+                if keepalive is not None:
+                    keepalive.cancel()
+                if self.client is not None:
+                    await self.client.close()
+                    self.client = None
@@ -4,21 +4,18 @@
 from ubuntui.ev import EventLoop
 from ubuntui.palette import STYLES
 from conjure.ui import ConjureUI
-from conjure.juju import Juju
+from conjure.juju import Juju, connections
 from conjure import async
+from conjure import shell
 from conjure import __version__ as VERSION
 from conjure.models.bundle import BundleModel
-from conjure.controllers.welcome import WelcomeController
-from conjure.controllers.finish import FinishController
-from conjure.controllers.deploysummary import DeploySummaryController
-from conjure.controllers.deploy import DeployController
-from conjure.controllers.cloud import CloudController
-from conjure.controllers.newcloud import NewCloudController
-from conjure.controllers.jujucontroller import JujuControllerController
-from conjure.controllers.bootstrapwait import BootstrapWaitController
-from conjure.controllers.lxdsetup import LXDSetupController
+from conjure.controllers import ControllerRegistry
+from conjure.profiling import profiler
 from conjure.log import setup_logging
+from conjure import timeline
+import asyncio
 import json
+import signal
 import sys
 import argparse
 import os
@@ -26,6 +23,22 @@ import os.path as path
 import uuid
 
 
+CONTROLLERS = {
+    'welcome': 'conjure.controllers.welcome:WelcomeController',
+    'clouds': 'conjure.controllers.cloud:CloudController',
+    'newcloud': 'conjure.controllers.newcloud:NewCloudController',
+    'lxdsetup': 'conjure.controllers.lxdsetup:LXDSetupController',
+    'bootstrapwait':
+    'conjure.controllers.bootstrapwait:BootstrapWaitController',
+    'deploy': 'conjure.controllers.deploy:DeployController',
+    'deploysummary':
+    'conjure.controllers.deploysummary:DeploySummaryController',
+    'jujucontroller':
+    'conjure.controllers.jujucontroller:JujuControllerController',
+    'finish': 'conjure.controllers.finish:FinishController'
+}
+
+
 class ApplicationException(Exception):
     """ Error in application
     """
@@ -37,7 +50,8 @@ class ApplicationConfig:
     """
     def __init__(self):
         # Try to load cache file
-        self.cache = self.load()
+        with profiler.phase('cache load'):
+            self.cache = self.load()
         # Reference to entire UI
         self.ui = None
         # Global config attr
@@ -124,35 +138,32 @@ class Application:
         self.app = ApplicationConfig()
         self.metadata = metadata
         self.pkg_config = pkg_config
-        with open(self.pkg_config) as json_f:
-            config = json.load(json_f)
-            config['config_filename'] = self.pkg_config
+        with profiler.phase('config load'):
+            with open(self.pkg_config) as json_f:
+                config = json.load(json_f)
+                config['config_filename'] = self.pkg_config
 
-        with open(self.metadata) as json_f:
-            config['metadata_filename'] = path.abspath(self.metadata)
-            config['metadata'] = json.load(json_f)
+            with open(self.metadata) as json_f:
+                config['metadata_filename'] = path.abspath(self.metadata)
+                config['metadata'] = json.load(json_f)
 
         self.app.config = config
         self.app.argv = argv
         self.app.ui = ConjureUI()
 
-        self.app.controllers = {
-            'welcome': WelcomeController(self.app),
-            'clouds': CloudController(self.app),
-            'newcloud': NewCloudController(self.app),
-            'lxdsetup': LXDSetupController(self.app),
-            'bootstrapwait': BootstrapWaitController(self.app),
-            'deploy': DeployController(self.app),
-            'deploysummary': DeploySummaryController(self.app),
-            'jujucontroller': JujuControllerController(self.app),
-            'finish': FinishController(self.app)
-        }
+        # Controllers are imported on first render
+        self.app.controllers = ControllerRegistry(self.app, CONTROLLERS)
 
         self.app.log = setup_logging(self.app.config['name'],
                                      self.app.argv.debug)
 
     def unhandled_input(self, key):
         if key in ['q', 'Q']:
+            self.app.log.debug(
+                "juju query cache: {}".format(Juju.query_stats()))
+            self.app.log.debug(
+                "async lanes: {}".format(async.stats()))
+            connections.close_all()
             async.shutdown()
             EventLoop.exit(0)
 
@@ -163,17 +174,32 @@ class Application:
             self.app.controllers['finish'].render(bundle=None)
         else:
             self.app.controllers['welcome'].render()
+        # alarms run after the screen has been drawn
+        EventLoop.set_alarm_in(0, lambda *args: profiler.stop('first paint'))
+
+    def dump_tasks(self, *args):
+        """ Logs queued and running background work, bound to SIGUSR1
+        """
+        self.app.log.info("async tasks:\n{}".format(async.dump_tasks()))
 
     def start(self):
+        signal.signal(signal.SIGUSR1, self.dump_tasks)
         EventLoop.build_loop(self.app.ui, STYLES,
                              unhandled_input=self.unhandled_input)
+        # long running commands stream their output on the ui loop
+        shell.set_loop(asyncio.get_event_loop())
         EventLoop.set_alarm_in(0.05, self._start)
-        EventLoop.run()
+        profiler.start('first paint')
+        try:
+            EventLoop.run()
+        finally:
+            profiler.report()
 
 
 def parse_options(argv):
     parser = argparse.ArgumentParser(prog="conjure-up")
-    parser.add_argument('spell', help="Specify the Juju solution to "
+    parser.add_argument('spell', nargs='?',
+                        help="Specify the Juju solution to "
                         "deploy, e.g. openstack")
     parser.add_argument('-d', '--debug', action='store_true',
                         dest='debug',
@@ -182,14 +208,35 @@ def parse_options(argv):
                         dest='status_only',
                         help='Only display the Status of '
                         'an existing model.')
+    parser.add_argument('--profile-startup', action='store_true',
+                        dest='profile_startup',
+                        help='Report module import and startup phase '
+                        'timings on exit.')
+    parser.add_argument('--report', action='store_true',
+                        dest='report',
+                        help='Print where the last deployment to the '
+                        'current model spent its time.')
     parser.add_argument(
         '--version', action='version', version='%(prog)s {}'.format(VERSION))
-    return parser.parse_args(argv)
+    opts = parser.parse_args(argv)
+    if opts.spell is None and not opts.report:
+        parser.error("the following arguments are required: spell")
+    return opts
 
 
 def main():
+    profiler.stop('import')
     opts = parse_options(sys.argv[1:])
 
+    if opts.report:
+        try:
+            print(timeline.report(timeline.timeline_path(
+                Juju.current_controller(), Juju.current_model())))
+        except Exception as e:
+            print("Unable to report on the current model: {}".format(e))
+            sys.exit(1)
+        sys.exit(0)
+
     if os.geteuid() == 0:
         print("")
         print("This should _not_ be run as root or with sudo.")
@@ -198,7 +245,8 @@ def main():
 
     try:
         docs_url = "https://jujucharms.com/docs/stable/getting-started"
-        juju_version = Juju.version()
+        with profiler.phase('version check'):
+            juju_version = Juju.version()
         if int(juju_version[0]) < 2:
             print(
                 "Only Juju v2 and above is supported, "
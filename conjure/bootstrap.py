@@ -0,0 +1,179 @@
+""" Bootstrap progress
+
+Follows the output of `juju bootstrap` line by line and maps it onto a
+few coarse phases. Phase durations are kept per cloud so later
+bootstraps can show an estimate of the time left.
+"""
+
+import json
+import logging
+import os
+import re
+import tempfile
+import time
+
+log = logging.getLogger('conjure')
+
+# (key, label, pattern matching the line that starts the phase)
+PHASES = [
+    ('launching', 'Launching instance',
+     re.compile(r'Launching (controller )?instance|'
+                r'Creating Juju controller')),
+    ('address', 'Waiting for address',
+     re.compile(r'Waiting for address|Attempting to connect to')),
+    ('agent', 'Installing Juju agent',
+     re.compile(r'Installing Juju agent|Running machine configuration|'
+                r'Fetching Juju|Bootstrap agent installed|'
+                r'Waiting for API to become available')),
+    ('ready', 'Controller ready',
+     re.compile(r'Bootstrap complete|controller now available')),
+]
+
+# number of past bootstraps per cloud the estimate is made from
+HISTORY = 5
+
+
+def timings_file():
+    from bundleplacer.utils import cache_dir
+    return cache_dir('conjure-up', 'bootstrap-timings.json')
+
+
+class PhaseTimings:
+    """ Past phase durations, per cloud
+
+    Stored as {cloud: {phase: [seconds, ...]}} keeping the last HISTORY
+    runs of each phase.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or timings_file()
+        self.data = {}
+        try:
+            with open(self.path) as fp:
+                self.data = json.load(fp)
+        except (OSError, ValueError):
+            pass
+
+    def expected(self, cloud, phase):
+        """ Median duration of phase on cloud, None if never seen
+        """
+        runs = sorted(self.data.get(cloud, {}).get(phase, []))
+        if not runs:
+            return None
+        return runs[len(runs) // 2]
+
+    def record(self, cloud, durations):
+        """ Adds a run of {phase: seconds} and saves the file
+        """
+        phases = self.data.setdefault(cloud, {})
+        for phase, seconds in durations.items():
+            phases[phase] = (phases.get(phase, []) + [seconds])[-HISTORY:]
+        self.save()
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(self.path))
+        try:
+            with os.fdopen(fd, 'w') as fp:
+                json.dump(self.data, fp)
+            os.replace(tmp, self.path)
+        except Exception:
+            os.unlink(tmp)
+            raise
+
+
+class BootstrapProgress:
+    """ Turns bootstrap output into phase changes
+
+    Feed every output line to feed(), on_phase(progress) is called only
+    when the phase moves forward. Phases never go back, lines matching an
+    earlier phase are ignored.
+
+    Arguments:
+    cloud: cloud being bootstrapped, keys the stored timings
+    on_phase: optional callable(progress)
+    timings: PhaseTimings, defaults to the per user timings file
+    """
+
+    def __init__(self, cloud, on_phase=None, timings=None):
+        self.cloud = cloud
+        self.on_phase = on_phase
+        self.timings = timings or PhaseTimings()
+        self.started = time.time()
+        # phase index -> start time
+        self.starts = {}
+        self.current = -1
+
+    @property
+    def phase(self):
+        if self.current < 0:
+            return None
+        return PHASES[self.current][0]
+
+    @property
+    def label(self):
+        if self.current < 0:
+            return 'Starting bootstrap'
+        return PHASES[self.current][1]
+
+    def feed(self, stream, line):
+        """ Parses one output line, returns True on a phase change
+        """
+        for idx in range(len(PHASES) - 1, self.current, -1):
+            if PHASES[idx][2].search(line):
+                self.advance(idx)
+                return True
+        return False
+
+    def advance(self, idx, now=None):
+        now = now or time.time()
+        self.current = idx
+        self.starts[idx] = now
+        log.debug("bootstrap phase {} after {:.1f}s".format(
+            PHASES[idx][0], now - self.started))
+        if self.on_phase:
+            self.on_phase(self)
+
+    def durations(self, end=None):
+        """ Returns {phase: seconds} of the phases passed so far
+
+        A phase lasts until the next one seen starts, the time before the
+        first recognized line counts towards that first phase.
+        """
+        end = end or time.time()
+        out = {}
+        seen = sorted(self.starts)
+        for pos, idx in enumerate(seen):
+            start = self.started if pos == 0 else self.starts[idx]
+            stop = self.starts[seen[pos + 1]] if pos + 1 < len(seen) else end
+            if PHASES[idx][0] != 'ready':
+                out[PHASES[idx][0]] = stop - start
+        return out
+
+    def eta(self, now=None):
+        """ Estimated seconds left, None without history for this cloud
+        """
+        now = now or time.time()
+        left = 0
+        known = False
+        current = max(self.current, 0)
+        for idx in range(current, len(PHASES) - 1):
+            expected = self.timings.expected(self.cloud, PHASES[idx][0])
+            if expected is None:
+                continue
+            known = True
+            if idx == current:
+                since = self.starts.get(idx, self.started)
+                expected = max(expected - (now - since), 0)
+            left += expected
+        return left if known else None
+
+    def finish(self, success=True):
+        """ Stores the phase timings of a successful bootstrap
+        """
+        if not success:
+            return
+        try:
+            self.timings.record(self.cloud, self.durations())
+        except (OSError, TypeError, ValueError) as e:
+            log.warning("Unable to save bootstrap timings: {}".format(e))
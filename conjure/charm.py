@@ -4,14 +4,11 @@ Api for the charmstore:
 https://github.com/juju/charmstore/blob/v4/docs/API.md
 """
 import yaml
-import requests
 import os.path as path
 from tempfile import NamedTemporaryFile
 import shutil
 from conjure.utils import spew
 
-cs = 'https://api.jujucharms.com/v4'
-
 
 class CharmStoreException(Exception):
     """ CharmStore exception """
@@ -28,6 +25,9 @@ def get_bundle(bundle, to_file=False):
     Dictionary of bundle's yaml unless to_file is True,
     then returns the path to the downloaded bundle
     """
+    # pulls in requests, only needed for bundles from the charm store
+    from bundleplacer.charmstore_backend import (get_backend,
+                                                 CharmStoreBackendException)
     if path.isfile(bundle):
         if to_file:
             with NamedTemporaryFile(mode="w", encoding="utf-8",
@@ -38,14 +38,14 @@ def get_bundle(bundle, to_file=False):
             with open(bundle) as f:
                 return yaml.safe_load(f.read())
 
-    bundle = path.join(cs, bundle, 'archive/bundle.yaml')
-    req = requests.get(bundle)
-    if not req.ok:
-        raise CharmStoreException("Problem getting bundle: {}".format(req))
+    try:
+        text = get_backend().bundle_yaml(bundle)
+    except CharmStoreBackendException as e:
+        raise CharmStoreException(e)
     if to_file:
         with NamedTemporaryFile(mode="w", encoding="utf-8",
                                 delete=False) as tempf:
-            spew(tempf.name, req.text)
+            spew(tempf.name, text)
             return tempf.name
     else:
-        return yaml.safe_load(req.text)
+        return yaml.safe_load(text)
@@ -0,0 +1,44 @@
+""" Application controllers
+"""
+
+from importlib import import_module
+from threading import RLock
+
+
+class ControllerRegistry:
+    """ Maps controller names to lazily created controllers
+
+    Controllers (and the views and libraries they pull in) are only
+    imported and instantiated the first time they are looked up, so
+    screens that are never visited cost nothing at startup.
+
+    Arguments:
+    app: application config passed to each controller
+    entries: dict of name -> 'module:Class'
+    """
+
+    def __init__(self, app, entries):
+        self.app = app
+        self.entries = entries
+        self._loaded = {}
+        # done callbacks look controllers up from worker threads
+        self._lock = RLock()
+
+    def __getitem__(self, name):
+        with self._lock:
+            if name not in self._loaded:
+                module, cls = self.entries[name].split(':')
+                controller = getattr(import_module(module), cls)
+                self._loaded[name] = controller(self.app)
+            return self._loaded[name]
+
+    def __contains__(self, name):
+        return name in self.entries
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def loaded(self):
+        """ Names of controllers instantiated so far
+        """
+        return list(self._loaded)
@@ -3,19 +3,53 @@ from ubuntui.ev import EventLoop
 
 
 class BootstrapWaitController:
+    # seconds between refreshes of the time left
+    TICK = 5
+
     def __init__(self, app):
         self.app = app
+        self.view = None
+        self.progress = None
+        # pending tick alarm, None while there is no estimate to count
+        self._tick = None
+
+    def update(self, progress):
+        """ Called by BootstrapProgress whenever the phase changes
+        """
+        if self.view is None:
+            return
+        self.view.set_progress(progress)
+        EventLoop.redraw_screen()
+        self._schedule_tick()
+
+    def _schedule_tick(self):
+        if self._tick is None:
+            self._tick = EventLoop.set_alarm_in(self.TICK, self.tick)
+
+    def tick(self, *args):
+        """ Counts the time left down between phase changes
 
-    def refresh(self, *args):
-        self.view.redraw_kitt()
-        EventLoop.set_alarm_in(1, self.refresh)
+        Stops once there is no estimate, update() starts it again on the
+        next phase change.
+        """
+        self._tick = None
+        if self.view is None or self.progress is None or \
+           self.progress.phase == 'ready' or self.progress.eta() is None:
+            return
+        self.view.set_eta(self.progress)
+        EventLoop.redraw_screen()
+        self._schedule_tick()
 
-    def render(self):
+    def render(self, progress=None):
         self.view = BootstrapWaitView(self.app)
+        self.progress = progress
+        if progress is not None:
+            progress.on_phase = self.update
+            self.view.set_progress(progress)
+            self._schedule_tick()
         self.app.ui.set_header(
             title="Initializing model",
             excerpt="Please wait while Juju bootstraps the model.",
         )
         self.app.ui.set_body(self.view)
         self.app.ui.set_subheader("Press (Q) to cancel bootstrap and exit.")
-        EventLoop.set_alarm_in(1, self.refresh)
@@ -1,14 +1,27 @@
 from conjure.ui.views.services import ServicesView
+from conjure.api.watcher import StatusWatcher
+from conjure.api.snapshot import StatusSnapshot, snapshot_path
+from conjure.timeline import TimelineRecorder, timeline_path
+from conjure import deployer
 from ubuntui.ev import EventLoop
 from conjure.juju import Juju
 from functools import partial
 from conjure import async
 from conjure.models.bundle import BundleModel
+from conjure.models.conditions import parse_conditions, pending
 from conjure.utils import pollinate
 import os.path as path
 import os
 import json
 from subprocess import check_output
+import time
+
+# post.sh is re-run on this interval when the conditions it waits on are
+# not seen met, in case the status watcher missed something
+POST_FALLBACK_INTERVAL = 60
+# a post.sh that declares no conditions runs again on the next model
+# change, but not more often than this
+POST_MIN_INTERVAL = 5
 
 
 class FinishController:
@@ -17,6 +30,17 @@ class FinishController:
         self.app = app
         self._post_exec_pollinate = False
         self._pre_exec_pollinate = False
+        self.watcher = None
+        self.snapshot = None
+        self.timeline = None
+        # post processing state, see _wait_for_post
+        self._post_conditions = None
+        self._post_waiting = False
+        self._post_running = False
+        self._post_fallback = None
+        self._post_check = None
+        self._post_last_run = 0
+        self._post_changed = False
 
     def handle_exception(self, tag, exc):
         pollinate(self.app.session_id, tag, self.app.log)
@@ -43,7 +67,7 @@ class FinishController:
 
         try:
             bundle_key = self.app.cache['selected_bundle']['key']
-        except:
+        except (KeyError, TypeError):
             bundle_key = BundleModel.key()
 
         self._pre_exec_sh = path.join('/usr/share/',
@@ -69,7 +93,8 @@ class FinishController:
                                           shell=True,
                                           env=self.app.env),
                                   partial(self.handle_exception,
-                                          "E002"))
+                                          "E002"),
+                                  queue_name='long-running')
             future.add_done_callback(self._pre_exec_done)
         except Exception as e:
             self.handle_exception("E002", e)
@@ -88,12 +113,44 @@ class FinishController:
         self.app.log.debug("Deploying bundle: {}".format(self.bundle))
         self.app.ui.set_footer('Deploying bundle...')
         pollinate(self.app.session_id, 'DS', self.app.log)
+        if os.getenv('CONJURE_DEPLOYER', 'api') == 'api' and \
+           path.isfile(self.bundle):
+            future = async.submit(
+                partial(deployer.deploy_bundle, self.bundle,
+                        self._deploy_step_done),
+                partial(self.handle_exception, "ED"),
+                queue_name='long-running')
+            future.add_done_callback(self._native_deploy_done)
+            return
         future = async.submit(
             partial(Juju.deploy_bundle, self.bundle),
-            partial(self.handle_exception, "ED"))
+            partial(self.handle_exception, "ED"),
+            queue_name='long-running')
         future.add_done_callback(self._deploy_bundle_done)
 
+    def _deploy_step_done(self, step, done, total):
+        msg = 'Deploying bundle: {}/{} ({})'.format(done, total, step.name)
+        EventLoop.call_soon(lambda *args: self.app.ui.set_footer(msg))
+
+    def _native_deploy_done(self, future):
+        EventLoop.call_soon(lambda *args: self._native_deployed(future))
+
+    def _native_deployed(self, future):
+        if future.exception():
+            return
+        timings = future.result()
+        self.app.log.debug("native deploy took {:.2f}s, first deploy call "
+                           "after {}s: {}".format(timings['total'],
+                                                  timings['first_deploy_call'],
+                                                  timings['steps']))
+        self.app.ui.set_footer('Deploy committed, waiting...')
+        pollinate(self.app.session_id, 'DC', self.app.log)
+        self._wait_for_post(self._bundle_conditions())
+
     def _deploy_bundle_done(self, future):
+        EventLoop.call_soon(lambda *args: self._bundle_deployed(future))
+
+    def _bundle_deployed(self, future):
         result = future.result()
         self.app.log.debug("deploy_bundle_done: {}".format(result.output()))
         if result.code > 0:
@@ -103,14 +160,17 @@ class FinishController:
             return
         self.app.ui.set_footer('Deploy committed, waiting...')
         pollinate(self.app.session_id, 'DC', self.app.log)
-        EventLoop.set_alarm_in(1, self._post_exec)
+        self._wait_for_post(self._bundle_conditions())
 
     def _post_exec(self, *args):
         """ Executes a bundles post processing script if exists
         """
+        self._post_waiting = False
+        if self._post_running:
+            return
         try:
             bundle_key = self.app.cache['selected_bundle']['key']
-        except:
+        except (KeyError, TypeError):
             bundle_key = BundleModel.key()
             if bundle_key is None:
                 self.app.log.debug(
@@ -135,15 +195,25 @@ class FinishController:
             pollinate(self.app.session_id, 'XB', self.app.log)
             self._post_exec_pollinate = True
 
+        self._post_running = True
+        self._post_last_run = time.time()
+        self._post_changed = False
+        # hand post.sh the status its conditions were checked against
+        self.snapshot.flush()
         self.app.log.debug("post_exec running: {}".format(self._post_exec_sh))
         future = async.submit(partial(check_output,
                                       self._post_exec_sh,
                                       shell=True,
                                       env=self.app.env),
-                              self.handle_post_exception)
+                              self.handle_post_exception,
+                              queue_name='long-running')
         future.add_done_callback(self._post_exec_done)
 
     def _post_exec_done(self, future):
+        EventLoop.call_soon(lambda *args: self._post_exec_finished(future))
+
+    def _post_exec_finished(self, future):
+        self._post_running = False
         try:
             result = json.loads(future.result().decode('utf8'))
             self.app.log.debug("post_exec_done: {}".format(result))
@@ -152,18 +222,96 @@ class FinishController:
                 self.app.log.error(
                     'There was an error during the post processing '
                     'phase, retrying.')
-                EventLoop.set_alarm_in(5, self._post_exec)
+                self._wait_for_post(parse_conditions(
+                    result.get('waitFor', None)))
             else:
                 # Stop post processing loop and restart view refresh
                 EventLoop.remove_alarms()
+                self._post_fallback = None
+                self._post_check = None
                 EventLoop.set_alarm_in(1, self.refresh)
         except Exception as e:
             self.app.log.error(e)
             self.handle_exception("E002", e)
 
+    def _bundle_conditions(self):
+        try:
+            specs = self.app.cache['selected_bundle'].get(
+                'postConditions', [])
+        except (KeyError, TypeError, AttributeError):
+            specs = BundleModel.postConditions()
+        return parse_conditions(specs)
+
+    def _wait_for_post(self, conditions):
+        """ Runs post.sh once the status watcher sees conditions met
+
+        Without conditions post.sh runs again on the next model change,
+        at most every POST_MIN_INTERVAL seconds. Either way it also runs
+        after POST_FALLBACK_INTERVAL seconds.
+        """
+        self._post_conditions = conditions
+        self._post_waiting = True
+        if self._post_fallback is not None:
+            EventLoop.remove_alarm(self._post_fallback)
+        self._post_fallback = EventLoop.set_alarm_in(
+            POST_FALLBACK_INTERVAL, self._post_fallback_expired)
+        if conditions:
+            self.app.ui.set_footer('Waiting for {}...'.format(
+                ', '.join(str(c) for c in conditions)))
+        self._check_post()
+
+    def _post_fallback_expired(self, *args):
+        self._post_fallback = None
+        if self._post_waiting:
+            self.app.log.debug("post_exec fallback, still waiting on "
+                               "{}".format(self._post_conditions))
+            self._post_exec()
+
+    def _check_post(self, *args):
+        """ Starts post.sh if what it waits on has happened
+        """
+        if not self._post_waiting or self._post_running:
+            return
+        if self._post_conditions:
+            if self.watcher is None or \
+               pending(self._post_conditions, self.watcher.status):
+                return
+        else:
+            if not self._post_changed:
+                return
+            wait = POST_MIN_INTERVAL - (time.time() - self._post_last_run)
+            if wait > 0:
+                if self._post_check is None:
+                    self._post_check = EventLoop.set_alarm_in(
+                        wait, self._post_check_expired)
+                return
+        if self._post_fallback is not None:
+            EventLoop.remove_alarm(self._post_fallback)
+            self._post_fallback = None
+        if self._post_check is not None:
+            EventLoop.remove_alarm(self._post_check)
+            self._post_check = None
+        self._post_exec()
+
+    def _post_check_expired(self, *args):
+        self._post_check = None
+        self._check_post()
+
+    def _status_changed(self, status, changed):
+        self.snapshot.update(status, changed)
+        if self.timeline is not None:
+            self.timeline.record(status, changed)
+        self.view.update_units(status, changed)
+        EventLoop.redraw_screen()
+        self._post_changed = True
+        self._check_post()
+
     def refresh(self, *args):
-        self.view.refresh_nodes()
-        EventLoop.set_alarm_in(1, self.refresh)
+        """ Makes sure model changes are streaming into the view
+        """
+        if self.watcher is None:
+            self.watcher = StatusWatcher(self._status_changed)
+        self.watcher.start()
 
     def render(self, bundle):
         """ Render services status view
@@ -173,10 +321,23 @@ class FinishController:
         """
         self.bundle = bundle
         self.view = ServicesView(self.app)
+        if self.snapshot is None:
+            self.snapshot = StatusSnapshot(snapshot_path(self.app.session_id))
+        # hooklib helpers read the model status from here
+        self.app.env['CONJURE_STATUS_FILE'] = self.snapshot.path
+        if self.timeline is None:
+            try:
+                model = Juju.current_model()
+                self.timeline = TimelineRecorder(
+                    timeline_path(Juju.current_controller(), model),
+                    model, resume=self.app.argv.status_only)
+            except Exception as e:
+                self.app.log.warning(
+                    "Not recording a timeline: {}".format(e))
 
         try:
             bundle_name = self.app.cache['selected_bundle']['name']
-        except:
+        except (KeyError, TypeError):
             bundle_name = BundleModel.name()
             if bundle_name is None:
                 self.app.log.debug(
@@ -197,6 +358,6 @@ class FinishController:
             EventLoop.set_alarm_in(1, self._pre_exec)
         else:
             # Re-run post processor if loading the status screen
-            EventLoop.set_alarm_in(1, self._post_exec)
+            self._wait_for_post(self._bundle_conditions())
             self.app.ui.set_footer('')
         EventLoop.set_alarm_in(1, self.refresh)
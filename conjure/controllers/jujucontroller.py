@@ -1,6 +1,7 @@
 from conjure.ui.views.jujucontroller import JujuControllerView
 from conjure.utils import pollinate
-from conjure.juju import Juju
+from conjure.juju import Juju, connections
+from conjure.bootstrap import BootstrapProgress
 from ubuntui.ev import EventLoop
 from conjure.models.bundle import BundleModel
 from conjure import async
@@ -23,6 +24,7 @@ class JujuControllerController:
         self.cloud = None
         self.bootstrap = None
         self._post_bootstrap_pollinate = False
+        self._progress = None
 
     def handle_exception(self, exc):
         pollinate(self.app.session_id, 'EB', self.app.log)
@@ -45,16 +47,18 @@ class JujuControllerController:
         if self.bootstrap:
             self.app.log.debug("Performing bootstrap: {} {}".format(
                 controller, self.cloud))
+            self._progress = BootstrapProgress(self.cloud)
             future = Juju.bootstrap_async(
                 controller=self.app.current_controller,
                 cloud=self.cloud,
                 series=BundleModel.bootstrapSeries(),
                 exc_cb=self.handle_exception,
-                log=self.app.log)
+                log=self.app.log,
+                on_line=self._progress.feed)
             future.add_done_callback(
                 self._handle_bootstrap_done)
 
-            self.app.controllers['bootstrapwait'].render()
+            self.app.controllers['bootstrapwait'].render(self._progress)
             pollinate(self.app.session_id, 'J003', self.app.log)
 
         else:
@@ -63,6 +67,7 @@ class JujuControllerController:
     def _handle_bootstrap_done(self, future):
         self.app.log.debug("handle bootstrap")
         result = future.result()
+        self._progress.finish(result.code == 0)
         if result.code > 0:
             self.app.log.error(result.errors())
             return self.handle_exception(Exception(result.errors()))
@@ -100,7 +105,8 @@ class JujuControllerController:
                                           self._post_bootstrap_sh,
                                           shell=True,
                                           env=self.app.env),
-                                  self.handle_exception)
+                                  self.handle_exception,
+                                  queue_name='long-running')
             future.add_done_callback(self._post_bootstrap_done)
         except Exception as e:
             return self.handle_exception(e)
@@ -147,16 +153,19 @@ class JujuControllerController:
             return self.handle_exception(Exception(
                 "Unable to determine a controller to bootstrap"))
         else:
-            controllers = Juju.controllers().keys()
-            models = {}
-            for c in controllers:
-                Juju.switch(c)
-                models[c] = Juju.models()
-            self.view = JujuControllerView(self.app,
-                                           models,
-                                           self.finish)
-
-        self.app.ui.set_header(
-            title="Juju Model",
-        )
+            self.app.ui.set_header(
+                title="Juju Model",
+            )
+            self.app.ui.set_footer('Listing models')
+            connections.models_for_controllers(
+                sorted(Juju.controllers().keys()), self._render_models)
+
+    def _render_models(self, models):
+        """ Shows the models listed by render, called from a worker thread
+        """
+        self.view = JujuControllerView(self.app,
+                                       models,
+                                       self.finish)
+        self.app.ui.set_footer('')
         self.app.ui.set_body(self.view)
+        EventLoop.redraw_screen()
@@ -0,0 +1,379 @@
+""" Native bundle deployer
+
+Deploys a bundle (as written by bundleplacer's BundleWriter) through the
+Juju API instead of `juju deploy`. The bundle is turned into a graph of
+steps:
+
+    resolve         Client.ResolveCharms for every charm, one bulk call
+    charm:<url>     Client.AddCharm per distinct charm
+    machines        Client.AddMachines for every bundle machine, one call
+    deploy:<svc>    Service.Deploy of the first unit
+    units:<svc>     Service.AddUnits for the remaining units
+    relation:<n>    Service.AddRelation
+
+Each step runs as soon as the steps it depends on are done, independent
+steps run concurrently on the 'deploy' scheduler lane, never more at
+once than the lane can queue.
+
+Services already in the model are left alone, as `juju deploy` does:
+their deploy and units steps, and relations the model already has, are
+skipped.
+"""
+
+from concurrent.futures import wait, FIRST_COMPLETED
+from functools import partial
+from conjure import async
+from conjure.juju import Juju, requires_login, query_cache
+from bundleplacer.utils import human_to_mb
+import logging
+import time
+import yaml
+
+log = logging.getLogger('conjure')
+
+CONTAINER_TYPES = ('lxd', 'lxc', 'kvm')
+
+
+class DeployException(Exception):
+    """ A deploy step failed """
+
+
+def parse_constraints(constraints):
+    """ Converts a 'mem=4G cores=2 tags=a,b' string to api constraints
+    """
+    if not constraints:
+        return {}
+    if isinstance(constraints, dict):
+        return constraints
+    out = {}
+    for item in constraints.split():
+        key, _, value = item.partition('=')
+        if key in ('tags', 'spaces'):
+            out[key] = [v for v in value.split(',') if v]
+        elif key in ('mem', 'root-disk'):
+            out[key] = int(human_to_mb(value))
+        elif key in ('cores', 'cpu-cores', 'cpu-power'):
+            out[key] = int(value)
+        else:
+            out[key] = value
+    return out
+
+
+def parse_placement(directive):
+    """ Splits a bundle 'to' directive, eg. 'lxd:2' -> ('lxd', '2')
+
+    A bare container type, eg. 'lxd', gives ('lxd', ''), a container
+    on a new machine.
+    """
+    directive = str(directive)
+    if directive in CONTAINER_TYPES:
+        return directive, ''
+    scope, _, target = directive.rpartition(':')
+    if scope in CONTAINER_TYPES:
+        return scope, target
+    return None, directive
+
+
+class Step:
+    def __init__(self, name, func, deps=()):
+        self.name = name
+        self.func = func
+        self.deps = set(deps)
+        self.start = None
+        self.end = None
+        self.result = None
+        self.skipped = False
+
+    @property
+    def elapsed(self):
+        if self.start is None or self.end is None:
+            return None
+        return self.end - self.start
+
+
+class BundleDeployer:
+    """ Deploys a bundle dict with a JujuClient
+
+    Arguments:
+    client: logged in macumba.v2.JujuClient
+    bundle: bundle dict or path to a bundle yaml file
+    on_step: optional callable(step, done, total) called after each step
+    """
+
+    def __init__(self, client, bundle, on_step=None):
+        if isinstance(bundle, str):
+            with open(bundle) as fp:
+                bundle = yaml.safe_load(fp)
+        self.client = client
+        self.bundle = bundle
+        self.on_step = on_step
+        self.series = bundle.get('series', None)
+        self.services = bundle.get('services',
+                                   bundle.get('applications', {})) or {}
+        self.machines = bundle.get('machines', {}) or {}
+        self.relations = bundle.get('relations', []) or []
+        # bundle charm reference -> resolved url
+        self.charm_urls = {}
+        # bundle machine id -> juju machine id
+        self.machine_map = {}
+        self.steps = {}
+        self.started = None
+        # seconds until the first Deploy call carrying a unit returned,
+        # not until juju allocated that unit
+        self.first_deploy_call = None
+        self.plan()
+
+    def _add(self, name, func, deps=()):
+        self.steps[name] = Step(name, func, deps)
+
+    def plan(self):
+        """ Builds the step graph
+        """
+        self.steps = {}
+        charms = sorted({svc['charm'] for svc in self.services.values()})
+        self._add('resolve', partial(self._resolve, charms))
+        for charm in charms:
+            self._add('charm:{}'.format(charm),
+                      partial(self._add_charm, charm), ['resolve'])
+        if self.machines:
+            self._add('machines', self._add_machines)
+
+        for name, svc in sorted(self.services.items()):
+            deps = ['charm:{}'.format(svc['charm'])]
+            if self.machines and svc.get('to'):
+                deps.append('machines')
+            self._add('deploy:{}'.format(name),
+                      partial(self._deploy, name, svc), deps)
+            if self._placements(svc)[1:] or self._num_units(svc) > 1:
+                self._add('units:{}'.format(name),
+                          partial(self._add_units, name, svc),
+                          ['deploy:{}'.format(name)])
+
+        for idx, endpoints in enumerate(self.relations):
+            deps = ['deploy:{}'.format(ep.split(':')[0])
+                    for ep in endpoints]
+            self._add('relation:{}'.format(idx),
+                      partial(self._add_relation, endpoints),
+                      [d for d in deps if d in self.steps])
+
+    def _call(self, facade, request, params):
+        return getattr(self.client, facade)(request=request, params=params)
+
+    def _check_errors(self, what, results):
+        errors = [r['Error'] for r in results if r.get('Error')]
+        if errors:
+            raise DeployException("{} failed: {}".format(what, errors))
+
+    def _resolve(self, charms):
+        res = self._call('Client', 'ResolveCharms',
+                         {'References': charms})
+        urls = res.get('URLs', []) or []
+        for charm, result in zip(charms, urls):
+            self.charm_urls[charm] = result.get('URL', None) or charm
+        for charm in charms:
+            self.charm_urls.setdefault(charm, charm)
+
+    def _add_charm(self, charm):
+        self._call('Client', 'AddCharm', {'URL': self.charm_urls[charm]})
+
+    def _add_machines(self):
+        ids = sorted(self.machines, key=str)
+        params = []
+        for mid in ids:
+            md = self.machines[mid] or {}
+            params.append({
+                'Jobs': ['JobHostUnits'],
+                'Series': md.get('series', self.series) or '',
+                'Constraints': parse_constraints(md.get('constraints'))})
+        res = self._call('Client', 'AddMachines', {'MachineParams': params})
+        results = res.get('Machines', []) or []
+        self._check_errors('AddMachines', results)
+        for mid, result in zip(ids, results):
+            self.machine_map[str(mid)] = result['Machine']
+
+    def _num_units(self, svc):
+        return int(svc.get('num_units', 0) or 0)
+
+    def _placements(self, svc):
+        """ Api placements for each 'to' directive of a service
+        """
+        placements = []
+        to = svc.get('to', []) or []
+        if not isinstance(to, list):
+            to = [to]
+        for directive in to:
+            scope, target = parse_placement(directive)
+            target = self.machine_map.get(target, target)
+            if scope is None:
+                placements.append({'Scope': '#', 'Directive': target})
+            else:
+                placements.append({'Scope': scope, 'Directive': target})
+        return placements
+
+    def _series(self, svc):
+        url = self.charm_urls.get(svc['charm'], svc['charm'])
+        parts = url.split(':', 1)[-1].split('/')
+        if len(parts) > 1 and not parts[-2].startswith('~'):
+            return parts[-2]
+        return self.series or ''
+
+    def _deploy(self, name, svc):
+        num_units = min(self._num_units(svc), 1)
+        config = ''
+        if svc.get('options'):
+            config = yaml.safe_dump({name: svc['options']},
+                                    default_flow_style=False)
+        res = self._call('Service', 'Deploy', {'Services': [{
+            'ServiceName': name,
+            'CharmUrl': self.charm_urls[svc['charm']],
+            'Series': self._series(svc),
+            'NumUnits': num_units,
+            'ConfigYAML': config,
+            'Constraints': parse_constraints(svc.get('constraints')),
+            'Placement': self._placements(svc)[:num_units]}]})
+        self._check_errors('Deploy {}'.format(name),
+                           res.get('Results', []) or [])
+        if num_units and self.first_deploy_call is None:
+            self.first_deploy_call = time.time() - self.started
+
+    def _add_units(self, name, svc):
+        remaining = self._num_units(svc) - 1
+        if remaining < 1:
+            return
+        self._call('Service', 'AddUnits', {
+            'ServiceName': name,
+            'NumUnits': remaining,
+            'Placement': self._placements(svc)[1:]})
+
+    def _add_relation(self, endpoints):
+        self._call('Service', 'AddRelation', {'Endpoints': list(endpoints)})
+
+    def _existing(self):
+        """ Returns (service names, relations) already in the model, a
+        relation being the frozenset of the services it joins
+        """
+        status = self._call('Client', 'FullStatus', {}) or {}
+        services = status.get('Services', status.get('Applications', {}))
+        relations = set()
+        for rel in status.get('Relations', []) or []:
+            relations.add(frozenset(
+                ep.get('ServiceName', ep.get('ApplicationName'))
+                for ep in rel.get('Endpoints', [])))
+        return set(services or {}), relations
+
+    def skip_existing(self):
+        """ Marks the steps of services and relations the model already
+        has as skipped
+
+        Returns:
+        names of the skipped steps
+        """
+        services, relations = self._existing()
+        skipped = []
+        for name in services:
+            skipped += ['deploy:{}'.format(name), 'units:{}'.format(name)]
+        for idx, endpoints in enumerate(self.relations):
+            if frozenset(ep.split(':')[0] for ep in endpoints) in relations:
+                skipped.append('relation:{}'.format(idx))
+        if services & set(self.services) and all(
+                name in services for name, svc in self.services.items()
+                if svc.get('to')):
+            skipped.append('machines')
+        skipped = [name for name in skipped if name in self.steps]
+        for name in skipped:
+            self.steps[name].skipped = True
+        return skipped
+
+    def _run_step(self, step):
+        step.start = time.time()
+        try:
+            step.result = step.func()
+        finally:
+            step.end = time.time()
+        return step
+
+    def run(self):
+        """ Runs all steps, returns the timings()
+
+        Raises DeployException once in-flight steps have finished if any
+        step failed.
+        """
+        self.started = time.time()
+        done, running = set(), {}
+        errors = []
+        total = len(self.steps)
+        lane = async.get_lane('deploy')
+        limit = lane.max_queue or total
+        for name in self.skip_existing():
+            done.add(name)
+            log.debug("deploy step {} skipped, already in the model".format(
+                name))
+            if self.on_step:
+                self.on_step(self.steps[name], len(done), total)
+        while len(done) < total and not errors:
+            for step in self.steps.values():
+                if len(running) >= limit:
+                    break
+                if step.name in done or step in running.values() or \
+                   not step.deps <= done:
+                    continue
+                f = async.submit(partial(self._run_step, step),
+                                 lambda _: None, queue_name='deploy')
+                if f is None:
+                    raise DeployException("deploy cancelled")
+                running[f] = step
+            if not running:
+                raise DeployException("unsatisfiable steps: {}".format(
+                    sorted(set(self.steps) - done)))
+            finished, _ = wait(list(running), return_when=FIRST_COMPLETED)
+            rejected = False
+            for f in finished:
+                step = running.pop(f)
+                if isinstance(f.exception(), async.LaneFullException):
+                    # other work filled the lane, submit again later
+                    rejected = True
+                    continue
+                if f.exception() is not None:
+                    errors.append("{}: {}".format(step.name, f.exception()))
+                    continue
+                done.add(step.name)
+                log.debug("deploy step {} took {:.2f}s".format(
+                    step.name, step.elapsed))
+                if self.on_step:
+                    self.on_step(step, len(done), total)
+            if rejected and not running:
+                time.sleep(0.1)
+        if running:
+            wait(list(running))
+        if errors:
+            raise DeployException("; ".join(errors))
+        return self.timings()
+
+    def timings(self):
+        """ Returns {'total', 'first_deploy_call',
+        'steps': [(name, offset, secs)]}
+        """
+        steps = sorted((s for s in self.steps.values() if s.end),
+                       key=lambda s: s.start)
+        end = max([s.end for s in steps] or [self.started or 0])
+        return {'total': end - self.started if self.started else 0,
+                'first_deploy_call': self.first_deploy_call,
+                'steps': [(s.name, s.start - self.started, s.elapsed)
+                          for s in steps]}
+
+
+@requires_login
+def deploy_bundle(bundle, on_step=None):
+    """ Deploys a bundle file through the api of the current model
+
+    Arguments:
+    bundle: path to bundle yaml
+    on_step: optional callable(step, done, total) for progress
+
+    Returns:
+    Step timings, see BundleDeployer.timings
+    """
+    try:
+        return BundleDeployer(Juju.client, bundle, on_step).run()
+    finally:
+        query_cache.invalidate()
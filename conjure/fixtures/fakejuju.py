@@ -0,0 +1,271 @@
+""" Fake juju CLI
+
+Puts a scripted `juju` first on PATH and points JUJU_DATA at a matching
+set of client stores, so the parts of conjure that shell out to juju can
+be exercised and benchmarked without juju installed or a cloud.
+
+Every invocation is appended to a call log, letting callers count the
+processes a flow spawns.
+
+Example:
+juju = FakeJuju(controllers=['lxd-test'], latency=0.05).start()
+Juju.version()
+juju.spawns()    # Counter({'version': 1})
+juju.stop()
+
+Each command answers with fixture output generated from the controllers
+and models given, override one with set_command(). Commands without
+output fail like an unknown juju command. With stores=False (or a list
+leaving some out) fewer client stores are written, so conjure falls back
+to the list-* commands.
+"""
+
+from collections import Counter
+import json
+import os
+import shlex
+import shutil
+import stat
+import tempfile
+import uuid
+import yaml
+
+SCRIPT = """#!/bin/sh
+# fake juju, see conjure/fixtures/fakejuju.py
+dir={dir}
+echo "$*" >> "$dir/calls.log"
+cmd=${{1:-help}}
+if [ -f "$dir/$cmd.latency" ]; then sleep "$(cat "$dir/$cmd.latency")"; fi
+if [ ! -f "$dir/$cmd.out" ]; then
+    echo "ERROR unrecognized command: juju $cmd" >&2
+    exit 2
+fi
+cat "$dir/$cmd.out"
+if [ -f "$dir/$cmd.err" ]; then cat "$dir/$cmd.err" >&2; fi
+exit "$(cat "$dir/$cmd.code")"
+"""
+
+VERSION = '2.0-beta15-xenial-amd64'
+
+STORES = ['controllers', 'models', 'accounts', 'credentials',
+          'public-clouds', 'current-controller']
+
+
+class FakeJuju:
+    """ Scripted juju binary and client stores in a temporary directory
+
+    Arguments:
+    controllers: controller names, the first one is current
+    models: model names created on each controller, the first one is
+            current
+    cloud: cloud (and cloud type) the controllers were bootstrapped on
+    latency: seconds every command takes, or {command: seconds}
+    stores: write controllers.yaml and friends to JUJU_DATA, True for
+            all of STORES or a list of their names
+    endpoint: api address recorded for every controller
+    """
+
+    def __init__(self, controllers=('fake',), models=('default',),
+                 cloud='localhost', latency=0, stores=True,
+                 endpoint='127.0.0.1:17070'):
+        self.controllers = list(controllers)
+        self.models = list(models)
+        self.cloud = cloud
+        self.latency = latency
+        self.stores = stores
+        self.endpoint = endpoint
+        self.uuids = {(c, m): str(uuid.uuid4())
+                      for c in self.controllers for m in self.models}
+        self.path = None
+        self._environ = None
+
+    @property
+    def bin_dir(self):
+        return os.path.join(self.path, 'bin')
+
+    @property
+    def juju_data(self):
+        return os.path.join(self.path, 'juju')
+
+    @property
+    def fixtures_dir(self):
+        return os.path.join(self.path, 'fixtures')
+
+    def _latency(self, command):
+        if isinstance(self.latency, dict):
+            return self.latency.get(command, 0)
+        return self.latency
+
+    def set_command(self, command, output='', code=0, errors='',
+                    latency=None):
+        """ Scripts the answer to `juju <command> ...`
+
+        Arguments are ignored, every invocation of command answers the
+        same.
+        """
+        base = os.path.join(self.fixtures_dir, command)
+        with open(base + '.out', 'w') as fp:
+            fp.write(output)
+        with open(base + '.code', 'w') as fp:
+            fp.write(str(code))
+        if errors:
+            with open(base + '.err', 'w') as fp:
+                fp.write(errors)
+        elif os.path.exists(base + '.err'):
+            os.unlink(base + '.err')
+        if latency is None:
+            latency = self._latency(command)
+        if latency:
+            with open(base + '.latency', 'w') as fp:
+                fp.write("{:.3f}".format(latency))
+        elif os.path.exists(base + '.latency'):
+            os.unlink(base + '.latency')
+
+    def _account(self):
+        return {'admin@local': {'user': 'admin@local',
+                                'password': 'secret'}}
+
+    def _controller(self, name):
+        return {'unresolved-api-endpoints': [self.endpoint],
+                'api-endpoints': [self.endpoint],
+                'uuid': self.uuids[(name, self.models[0])],
+                'ca-cert': ''}
+
+    def _bootstrap_config(self, name):
+        return {'cloud': self.cloud,
+                'cloud-type': 'lxd' if self.cloud in ('localhost', 'lxd')
+                else self.cloud,
+                'region': self.cloud,
+                'credential': name,
+                'controller-uuid': self.uuids[(name, self.models[0])]}
+
+    def _models(self, controller):
+        return [{'name': m, 'model-uuid': self.uuids[(controller, m)],
+                 'owner': 'admin@local'} for m in self.models]
+
+    def write_fixtures(self):
+        """ Writes the default answer of every command conjure runs
+        """
+        current = self.controllers[0]
+        dump = yaml.safe_dump
+        self.set_command('version', VERSION + '\n')
+        self.set_command('status', "[Services]\nNAME STATUS EXPOSED CHARM\n")
+        self.set_command('switch', '')
+        self.set_command('autoload-credentials', '')
+        self.set_command('list-controllers', json.dumps({
+            'controllers': {c: {'current-model': self.models[0],
+                                'user': 'admin@local',
+                                'server': self.endpoint,
+                                'api-endpoints': [self.endpoint]}
+                            for c in self.controllers},
+            'current-controller': current}) + '\n')
+        self.set_command('list-models', dump({
+            'models': self._models(current),
+            'current-model': self.models[0]}))
+        self.set_command('list-clouds', dump({
+            'localhost': {'type': 'lxd'},
+            'aws': {'type': 'ec2', 'auth-types': ['access-key'],
+                    'regions': {'us-east-1': {}}}}))
+        self.set_command('list-credentials', dump({
+            'credentials': {'aws': {'admin': {'auth-type': 'access-key',
+                                              'access-key': 'key',
+                                              'secret-key': 'secret'}}}}))
+        self.set_command('show-controller', dump({
+            current: {'details': self._controller(current),
+                      'bootstrap-config': self._bootstrap_config(current),
+                      'accounts': self._account()}}))
+
+    def write_stores(self, names=STORES):
+        """ Writes the client-side YAML stores juju keeps in JUJU_DATA
+        """
+        current = self.controllers[0]
+        stores = {
+            'controllers': {
+                'controllers': {c: self._controller(c)
+                                for c in self.controllers},
+                'current-controller': current},
+            'models': {
+                'controllers': {c: {'models': {m: {'uuid':
+                                                   self.uuids[(c, m)]}
+                                               for m in self.models},
+                                    'current-model': self.models[0]}
+                                for c in self.controllers}},
+            'accounts': {
+                'controllers': {c: {'accounts': self._account(),
+                                    'current-account': 'admin@local'}
+                                for c in self.controllers}},
+            'credentials': {
+                'credentials': {'aws': {'admin': {
+                    'auth-type': 'access-key',
+                    'access-key': 'key',
+                    'secret-key': 'secret'}}}},
+            'public-clouds': {
+                'clouds': {'aws': {'type': 'ec2',
+                                   'auth-types': ['access-key'],
+                                   'regions': {'us-east-1': {}}}}},
+        }
+        for name, data in stores.items():
+            if name not in names:
+                continue
+            with open(os.path.join(self.juju_data,
+                                   '{}.yaml'.format(name)), 'w') as fp:
+                yaml.safe_dump(data, fp, default_flow_style=False)
+        if 'current-controller' in names:
+            with open(os.path.join(self.juju_data, 'current-controller'),
+                      'w') as fp:
+                fp.write(current)
+
+    def start(self):
+        """ Creates the fake and puts it on PATH of this process
+        """
+        self.path = tempfile.mkdtemp(prefix='fakejuju-')
+        for d in (self.bin_dir, self.juju_data, self.fixtures_dir):
+            os.makedirs(d)
+        script = os.path.join(self.bin_dir, 'juju')
+        with open(script, 'w') as fp:
+            fp.write(SCRIPT.format(dir=shlex.quote(self.fixtures_dir)))
+        os.chmod(script, os.stat(script).st_mode | stat.S_IXUSR)
+        self.write_fixtures()
+        if self.stores is True:
+            self.write_stores()
+        elif self.stores:
+            self.write_stores(self.stores)
+        self.reset()
+
+        self._environ = {k: os.environ.get(k, None)
+                         for k in ('PATH', 'JUJU_DATA')}
+        os.environ['PATH'] = os.pathsep.join(
+            [self.bin_dir, os.environ.get('PATH', os.defpath)])
+        os.environ['JUJU_DATA'] = self.juju_data
+        return self
+
+    def stop(self):
+        """ Restores PATH and JUJU_DATA and removes the fake
+        """
+        if self._environ is not None:
+            for k, v in self._environ.items():
+                if v is None:
+                    os.environ.pop(k, None)
+                else:
+                    os.environ[k] = v
+            self._environ = None
+        if self.path is not None:
+            shutil.rmtree(self.path, ignore_errors=True)
+            self.path = None
+
+    def reset(self):
+        """ Forgets the calls made so far
+        """
+        open(os.path.join(self.fixtures_dir, 'calls.log'), 'w').close()
+
+    def calls(self):
+        """ Returns the argument lists juju was called with, in order
+        """
+        with open(os.path.join(self.fixtures_dir, 'calls.log')) as fp:
+            return [line.split() for line in fp.read().splitlines()]
+
+    def spawns(self):
+        """ Returns a Counter of juju invocations per command
+        """
+        return Counter(args[0] if args else 'help'
+                       for args in self.calls())
@@ -1,15 +1,21 @@
 """ Juju helpers
 """
-from conjure.shell import shell
+from conjure.shell import CommandTimeout, shell, spawn, stream
 from conjure.utils import juju_path
 import os
 import yaml
 import json
+import copy
+import logging
+import time
+from threading import RLock, Thread, Event, Timer
 from macumba.v2 import JujuClient
-from macumba.errors import LoginError
+from macumba.errors import ConnectionClosedError, LoginError
 from functools import wraps, partial
 from conjure import async
 
+log = logging.getLogger('conjure')
+
 
 class JujuNotFoundException(Exception):
     """ The available config is not found """
@@ -44,9 +50,69 @@ def requires_login(f):
     return wraps(f)(_decorator)
 
 
+class QueryCache:
+    """ Memoizes juju CLI queries for a limited amount of time
+
+    Every query costs a juju process spawn, entries are kept for a per
+    query ttl and dropped wholesale whenever juju state is changed by us.
+    """
+
+    def __init__(self):
+        self._lock = RLock()
+        self._entries = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, ttl, fn):
+        with self._lock:
+            entry = self._entries.get(key, None)
+            if entry is not None and time.time() - entry[0] < ttl:
+                self.hits += 1
+                return copy.deepcopy(entry[1])
+        val = fn()
+        with self._lock:
+            self.misses += 1
+            self._entries[key] = (time.time(), val)
+        return copy.deepcopy(val)
+
+    def invalidate(self):
+        with self._lock:
+            self._entries = {}
+
+    def stats(self):
+        """ Returns hit/miss counters, hits are subprocesses avoided
+        """
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses}
+
+
+query_cache = QueryCache()
+
+
+def cached_query(ttl):
+    """ Caches the result of a Juju query for 'ttl' seconds
+
+    Failures are not cached.
+    """
+    def _decorator(f):
+        def _wrapper(cls, *args, **kwargs):
+            key = (f.__name__, args, tuple(sorted(kwargs.items())))
+            return query_cache.get(key, ttl,
+                                   partial(f, cls, *args, **kwargs))
+        return wraps(f)(_wrapper)
+    return _decorator
+
+
+_config_cache = {}
+_config_cache_lock = RLock()
+
+
 def read_config(name):
     """ Reads a juju config file
 
+    Parsed files are kept until their mtime or size changes, so repeated
+    reads of the client-side stores only cost a stat().
+
     Arguments:
     name: filename without extension (ext defaults to yaml)
 
@@ -54,9 +120,18 @@ def read_config(name):
     dictionary of yaml object
     """
     abs_path = os.path.join(juju_path(), "{}.yaml".format(name))
-    if not os.path.isfile(abs_path):
+    try:
+        st = os.stat(abs_path)
+    except OSError:
         raise JujuConfigNotFound("Cannot load {}".format(abs_path))
-    return yaml.safe_load(open(abs_path))
+    stamp = (st.st_mtime, st.st_size)
+    with _config_cache_lock:
+        cached = _config_cache.get(abs_path, None)
+        if cached is None or cached[0] != stamp:
+            with open(abs_path) as fp:
+                cached = (stamp, yaml.safe_load(fp))
+            _config_cache[abs_path] = cached
+    return copy.deepcopy(cached[1])
 
 
 def current_controller():
@@ -68,9 +143,248 @@ def current_controller():
         return out
 
 
+class ConnectionRegistry:
+    """ Logged in api connections keyed by (controller, model uuid)
+
+    Lets several controllers and models be queried at once without
+    `juju switch`, and lets screens share connections instead of each
+    logging in again. Connections unused for idle_timeout seconds are
+    closed by a background sweeper, pinned ones (the current model) are
+    kept.
+    """
+
+    def __init__(self, idle_timeout=300):
+        self.idle_timeout = idle_timeout
+        self._lock = RLock()
+        # (controller, uuid) -> [client, last used]
+        self._conns = {}
+        self._pinned = set()
+        self._sweeper = None
+        self._stopped = Event()
+        # set by close_all(), no new connections after that
+        self._closed = False
+
+    def _connect(self, controller, uuid):
+        env = Juju.controller(controller)
+        if env is None:
+            raise JujuControllerNotFound(
+                "Unable to find controller: {}".format(controller))
+        account = Juju.account(controller)
+        user = account['current']
+        if user is None:
+            raise LoginError(
+                "No current account for controller {}".format(controller))
+        password = account['users'][user]['password']
+        server = env['api-endpoints'][0]
+        if uuid is None:
+            url = os.path.join('wss://', server, 'api')
+        else:
+            url = os.path.join('wss://', server, 'model', uuid, 'api')
+        client = JujuClient(user="user-{}".format(user),
+                            url=url,
+                            password=password)
+        client.login()
+        client.start_keepalive()
+        return client
+
+    def get(self, controller, uuid=None, pin=False):
+        """ Returns a logged in client, connecting on first use
+
+        Arguments:
+        controller: controller name
+        uuid: model uuid, None for the controller endpoint
+        pin: never evict this connection while pinned
+
+        Returns:
+        macumba.v2.JujuClient, raises ConnectionClosedError once
+        close_all() has been called
+        """
+        key = (controller, uuid)
+        with self._lock:
+            if self._closed:
+                raise ConnectionClosedError("connection registry is closed")
+            entry = self._conns.get(key, None)
+            if entry is not None and not entry[0].conn.terminated:
+                entry[1] = time.time()
+                if pin:
+                    self._pinned.add(key)
+                return entry[0]
+        # connect outside the lock so other controllers are not held up
+        client = self._connect(controller, uuid)
+        stale = None
+        with self._lock:
+            entry = self._conns.get(key, None)
+            if self._closed:
+                stale = client
+            elif entry is not None and not entry[0].conn.terminated:
+                # lost a race with another caller, keep theirs
+                stale = client
+                client = entry[0]
+                entry[1] = time.time()
+            else:
+                self._conns[key] = [client, time.time()]
+                self._start_sweeper()
+            if pin and not self._closed:
+                self._pinned.add(key)
+        if stale is not None:
+            self._close(stale)
+            if stale is client:
+                raise ConnectionClosedError("connection registry is closed")
+        return client
+
+    def unpin(self, controller, uuid=None):
+        with self._lock:
+            self._pinned.discard((controller, uuid))
+
+    def _close(self, client):
+        if client.keepalive is not None:
+            client.keepalive.stop()
+        try:
+            client.close()
+        except Exception as e:
+            log.debug("closing connection failed: {}".format(e))
+
+    def evict_idle(self, now=None):
+        """ Closes connections unused for idle_timeout seconds
+
+        Returns:
+        List of evicted keys
+        """
+        now = now or time.time()
+        with self._lock:
+            idle = [key for key, (_, used) in self._conns.items()
+                    if key not in self._pinned and
+                    now - used >= self.idle_timeout]
+            clients = [self._conns.pop(key)[0] for key in idle]
+        for client in clients:
+            self._close(client)
+        if idle:
+            log.debug("evicted idle connections: {}".format(idle))
+        return idle
+
+    def close_all(self):
+        with self._lock:
+            self._closed = True
+            self._stopped.set()
+            clients = [entry[0] for entry in self._conns.values()]
+            self._conns = {}
+            self._pinned = set()
+        for client in clients:
+            self._close(client)
+
+    def _start_sweeper(self):
+        if self._sweeper is not None:
+            return
+        self._stopped.clear()
+        self._sweeper = Thread(target=self._sweep, daemon=True,
+                               name='juju-connections')
+        self._sweeper.start()
+
+    def _sweep(self):
+        while not self._stopped.wait(max(self.idle_timeout / 2, 1)):
+            self.evict_idle()
+        self._sweeper = None
+
+    def keys(self):
+        with self._lock:
+            return list(self._conns)
+
+    def _api_models(self, controller):
+        client = self.get(controller)
+        account = Juju.account(controller)['current']
+        res = client.ModelManager(request="ListModels",
+                                  params={'Tag': "user-{}".format(account)})
+        models = []
+        for entry in sorted(res.get('UserModels', []) or [],
+                            key=lambda m: m['Model']['Name']):
+            md = entry['Model']
+            owner = md.get('OwnerTag', '')
+            if owner.startswith('user-'):
+                owner = owner[len('user-'):]
+            models.append({'name': md['Name'],
+                           'model-uuid': md['UUID'],
+                           'owner': owner})
+        return models
+
+    def models(self, controller, use_api=False):
+        """ Models of a controller, without switching to it
+
+        The client-side store is used unless use_api is set or the store
+        has no models for the controller, in which case the controller
+        is asked through ModelManager.ListModels.
+
+        Returns:
+        {'models': [...], 'current-model': name or None}
+        """
+        out = {'models': [], 'current-model': None}
+        if not use_api:
+            try:
+                out = Juju.models(controller)
+            except JujuNotFoundException:
+                pass
+            if out['models']:
+                return out
+        out['models'] = self._api_models(controller)
+        return out
+
+    def models_for_controllers(self, controllers, callback, use_api=False,
+                               timeout=None):
+        """ Lists the models of several controllers concurrently
+
+        Each controller is queried on the 'fetch' lane, a controller
+        that cannot be reached maps to an empty model list. Nothing
+        blocks: callback is called once, from a worker thread, when every
+        controller has answered or timeout seconds have passed.
+
+        Arguments:
+        controllers: controller names
+        callback: callable({controller: {'models': [...],
+                                         'current-model': ...}})
+        use_api: passed on to models()
+        timeout: seconds to wait for slow controllers, None waits forever
+        """
+        futures = {}
+        lock = RLock()
+        finished = Event()
+
+        def _finish(timed_out=False):
+            with lock:
+                if finished.is_set():
+                    return
+                if not timed_out and not all(
+                        f is None or f.done() for f in futures.values()):
+                    return
+                finished.set()
+            result = {}
+            for c, f in futures.items():
+                if f is None or not f.done() or f.exception() is not None:
+                    log.warning("unable to list models of {}: {}".format(
+                        c, f.exception() if f and f.done() else 'timed out'))
+                    result[c] = {'models': [], 'current-model': None}
+                else:
+                    result[c] = f.result()
+            callback(result)
+
+        for c in controllers:
+            futures[c] = async.submit(partial(self.models, c, use_api),
+                                      lambda _: None, queue_name='fetch')
+        for f in futures.values():
+            if f is not None:
+                f.add_done_callback(lambda _: _finish())
+        if timeout is not None:
+            timer = Timer(timeout, _finish, kwargs={'timed_out': True})
+            timer.daemon = True
+            timer.start()
+        _finish()
+
+
+connections = ConnectionRegistry()
+
+
 class Juju:
     is_authenticated = False
     client = None
+    client_key = None
     user_tag = None
 
     @classmethod
@@ -87,26 +401,18 @@ class Juju:
         if not current_controller:
             raise LoginError("Unable to determine current controller")
 
-        env = cls.controller(current_controller)
         account = cls.account(current_controller)
         uuid = cls.model(cls.current_model())['model-uuid']
-        server = env['api-endpoints'][0]
+        if cls.client is not None and cls.client_key is not None:
+            connections.unpin(*cls.client_key)
+        cls.client_key = (current_controller, uuid)
         cls.user_tag = "user-{}".format(account['current'])
-        current_user = account['current']
-        password = account['users'][current_user]['password']
-        url = os.path.join('wss://', server, 'model', uuid, 'api')
-        cls.client = JujuClient(
-            user=cls.user_tag,
-            url=url,
-            password=password)
-        try:
-            cls.client.login()
-        except LoginError as e:
-            raise e
+        cls.client = connections.get(current_controller, uuid, pin=True)
         cls.is_authenticated = True
 
     @classmethod
-    def bootstrap(cls, controller, cloud, series=None, log=None):
+    def bootstrap(cls, controller, cloud, series=None, log=None,
+                  on_line=None):
         """ Performs juju bootstrap
 
         If not LXD pass along the newly defined credentials
@@ -116,6 +422,8 @@ class Juju:
         cloud: name of local or public cloud to deploy to
         series: define the bootstrap series defaults to xenial
         log: application logger
+        on_line: optional callable(stream, line) fed the output as it
+                 is produced
         """
         cmd = "juju bootstrap {} {} --upload-tools " \
               "--config image-stream=daily ".format(
@@ -126,24 +434,45 @@ class Juju:
             cmd += "--credential {}".format(controller)
         if log:
             log.debug("bootstrap cmd: {}".format(cmd))
-        return shell(cmd)
+        try:
+            return stream(cmd, on_line=on_line)
+        finally:
+            query_cache.invalidate()
 
     @classmethod
     def bootstrap_async(cls, controller, cloud,
-                        series=None, log=None, exc_cb=None):
+                        series=None, log=None, exc_cb=None, on_line=None):
         """ Performs a bootstrap asynchronously
         """
         return async.submit(partial(cls.bootstrap, controller,
-                                    cloud, series, log), exc_cb)
+                                    cloud, series, log, on_line), exc_cb,
+                            queue_name='long-running')
 
     @classmethod
     def log(cls, limit=1):
-        """ returns juju debug-log output
+        """ returns the last 'limit' lines of juju debug-log output
+
+        Whatever was read is returned if the controller does not answer
+        within 30 seconds.
+        """
+        try:
+            return shell('juju debug-log -T --limit {}'.format(limit),
+                         timeout=30)
+        except CommandTimeout as e:
+            log.warning("juju debug-log: {}".format(e))
+            return e.result
+
+    @classmethod
+    def follow_log(cls, on_line, max_lines=1000):
+        """ Streams juju debug-log to on_line(stream, line)
+
+        Returns:
+        conjure.shell.Process, cancel() it to stop following
         """
-        sh = shell('juju debug-log -T')
-        return sh
+        return spawn('juju debug-log', on_line=on_line, max_lines=max_lines)
 
     @classmethod
+    @cached_query(ttl=10)
     def available(cls):
         """ Checks if juju is available
 
@@ -156,7 +485,10 @@ class Juju:
     def autoload_credentials(cls):
         """ Automatically checks known places for cloud credentials
         """
-        return 0 == shell('juju autoload-credentials').code
+        try:
+            return 0 == shell('juju autoload-credentials').code
+        finally:
+            query_cache.invalidate()
 
     @classmethod
     def credential(cls, cloud, user):
@@ -177,7 +509,8 @@ class Juju:
     def credentials(cls, secrets=True):
         """ List credentials
 
-        This will fallback to reading the credentials file directly
+        Reads credentials.yaml directly, falling back to the juju cli
+        when the file does not exist.
 
         Arguments:
         secrets: True/False whether to show secrets (ie password)
@@ -185,17 +518,23 @@ class Juju:
         Returns:
         List of credentials
         """
+        if secrets:
+            try:
+                return read_config('credentials')['credentials']
+            except JujuConfigNotFound:
+                pass
+        return cls._credentials_cli(secrets)
+
+    @classmethod
+    @cached_query(ttl=60)
+    def _credentials_cli(cls, secrets=True):
         cmd = 'juju list-credentials --format yaml'
         if secrets:
             cmd += ' --show-secrets'
         sh = shell(cmd)
         if sh.code > 0:
-            try:
-                env = read_config('credentials')
-                return env['credentials']
-            except:
-                raise JujuNotFoundException(
-                    "Unable to list credentials: {}".format(sh.errors()))
+            raise JujuNotFoundException(
+                "Unable to list credentials: {}".format(sh.errors()))
         env = yaml.safe_load("\n".join(sh.output()))
         return env['credentials']
 
@@ -203,9 +542,28 @@ class Juju:
     def clouds(cls):
         """ List available clouds
 
+        Merges public-clouds.yaml, the user's clouds.yaml and the builtin
+        lxd cloud, named localhost as juju list-clouds reports it,
+        falling back to the juju cli when no public cloud definitions
+        are stored locally.
+
         Returns:
         Dictionary of all known clouds including newly created MAAS/Local
         """
+        try:
+            clouds = read_config('public-clouds').get('clouds', {})
+        except JujuConfigNotFound:
+            return cls._clouds_cli()
+        clouds['localhost'] = {'type': 'lxd'}
+        try:
+            clouds.update(read_config('clouds').get('clouds', {}) or {})
+        except JujuConfigNotFound:
+            pass
+        return clouds
+
+    @classmethod
+    @cached_query(ttl=300)
+    def _clouds_cli(cls):
         sh = shell('juju list-clouds --format yaml')
         if sh.code > 0:
             raise JujuNotFoundException(
@@ -222,8 +580,13 @@ class Juju:
         Returns:
         Dictionary of cloud attributes
         """
-        if name in cls.clouds().keys():
-            return cls.clouds()[name]
+        clouds = cls.clouds()
+        if name in clouds.keys():
+            return clouds[name]
+        # juju accepts lxd and localhost for the builtin lxd cloud
+        alias = {'lxd': 'localhost', 'localhost': 'lxd'}.get(name)
+        if alias in clouds.keys():
+            return clouds[alias]
         raise JujuCloudNotFound("Unable to locate cloud: {}".format(name))
 
     @classmethod
@@ -237,6 +600,7 @@ class Juju:
         False if failed to switch to Juju Model.
         """
         ret = 0 == shell('juju switch {}'.format(model)).code
+        query_cache.invalidate()
         if ret:
             cls.login(True)
         return ret
@@ -249,17 +613,23 @@ class Juju:
         bundle: Name of bundle to deploy, can be a path to local bundle file or
                 charmstore path.
         """
-        return shell('juju deploy {}'.format(bundle))
+        try:
+            return shell('juju deploy {}'.format(bundle))
+        finally:
+            query_cache.invalidate()
 
     @classmethod
     def current_controller(cls):
         """ Grabs the current default controller
         """
-        env = os.path.join(juju_path(), 'current-controller')
-        if not os.path.isfile(env):
+        controller = current_controller()
+        if controller is not None:
+            return controller
+        try:
+            return read_config('controllers').get('current-controller',
+                                                  None)
+        except JujuConfigNotFound:
             return None
-        with open(env) as fp:
-            return fp.read().strip()
 
     @classmethod
     def controller(cls, controller):
@@ -274,6 +644,7 @@ class Juju:
         return None
 
     @classmethod
+    @cached_query(ttl=30)
     def controller_info(cls, name=None):
         """ Returns information on current controller
 
@@ -297,9 +668,20 @@ class Juju:
     def controllers(cls):
         """ List available controllers
 
+        Reads controllers.yaml directly, falling back to the juju cli
+        when the file does not exist.
+
         Returns:
         List of known controllers
         """
+        try:
+            return read_config('controllers')['controllers']
+        except JujuConfigNotFound:
+            return cls._controllers_cli()
+
+    @classmethod
+    @cached_query(ttl=30)
+    def _controllers_cli(cls):
         sh = shell('juju list-controllers --format json')
         if sh.code > 0:
             raise JujuNotFoundException(
@@ -338,14 +720,10 @@ class Juju:
         Returns:
         List of known accounts
         """
-        env = os.path.join(juju_path(), 'accounts.yaml')
-        if not os.path.isfile(env):
-            raise JujuNotFoundException(
-                "Unable to find: {}".format(env))
-        with open(env, 'r') as c:
-            env = yaml.load(c)
-            return env['controllers']
-        raise JujuControllerNotFound("Unable to find accounts")
+        try:
+            return read_config('accounts')['controllers']
+        except JujuConfigNotFound as e:
+            raise JujuNotFoundException(e)
 
     @classmethod
     def model_by_owner(cls, user):
@@ -357,7 +735,7 @@ class Juju:
         Returns:
         Dictionary containing model information for user
         """
-        models = cls.models()
+        models = cls.models()['models']
         for m in models:
             if m['owner'] == user:
                 return m
@@ -384,13 +762,63 @@ class Juju:
             "Unable to find model: {}".format(name))
 
     @classmethod
-    def models(cls):
+    def models(cls, controller=None, details=False):
         """ List available models
 
+        Reads models.yaml directly, falling back to the juju cli when the
+        file does not exist. The stores only know names, uuids, owners
+        and the controller's cloud; details=True asks `juju list-models`
+        for what only the controller knows, eg. status and life.
+
+        Arguments:
+        controller: controller to list models of, defaults to current
+        details: include the live model status from the controller
+
         Returns:
         List of known models
         """
-        sh = shell('juju list-models --format yaml')
+        if controller is None:
+            controller = cls.current_controller()
+        if details:
+            return cls._models_cli(controller)
+        try:
+            store = read_config('models').get('controllers', {})
+        except JujuConfigNotFound:
+            return cls._models_cli(controller)
+
+        entry = store.get(controller, {}) or {}
+        owner = None
+        if 'accounts' in entry:
+            # older stores nest models below the account owning them
+            owner = cls.account(controller)['current']
+            entry = entry['accounts'].get(owner, {}) or {}
+        elif entry.get('models'):
+            owner = cls.account(controller)['current']
+        info = cls.controller(controller) or {}
+        models = []
+        for name, md in sorted((entry.get('models', {}) or {}).items()):
+            model = {'name': name,
+                     'model-uuid': md.get('uuid', None),
+                     'owner': owner,
+                     'controller-name': controller,
+                     'controller-uuid': info.get('uuid', None)}
+            if '/' in name:
+                # newer stores key models by owner/name
+                model['owner'] = name.split('/', 1)[0]
+            for key in ('cloud', 'region'):
+                if key in info:
+                    model[key] = info[key]
+            models.append(model)
+        return {'models': models,
+                'current-model': entry.get('current-model', None)}
+
+    @classmethod
+    @cached_query(ttl=10)
+    def _models_cli(cls, controller=None):
+        cmd = 'juju list-models --format yaml'
+        if controller is not None:
+            cmd += ' -c {}'.format(controller)
+        sh = shell(cmd)
         if sh.code > 0:
             raise JujuNotFoundException(
                 "Unable to list models: {}".format(sh.errors()))
@@ -402,6 +830,7 @@ class Juju:
         return cls.models()['current-model']
 
     @classmethod
+    @cached_query(ttl=3600)
     def version(cls):
         """ Returns version of Juju
         """
@@ -414,3 +843,9 @@ class Juju:
             return out.pop()
         else:
             return out
+
+    @classmethod
+    def query_stats(cls):
+        """ Returns cache hit/miss counters for juju CLI queries
+        """
+        return query_cache.stats()
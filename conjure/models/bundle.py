@@ -14,7 +14,8 @@ class BundleModel:
         "blacklist": [],
         "whitelist": [],
         "recommendedCharms": [],
-        "bootstrapSeries": None
+        "bootstrapSeries": None,
+        "postConditions": []
     }
 
     @classmethod
@@ -72,6 +73,12 @@ class BundleModel:
         """
         return cls.bundle.get('recommendedCharms', [])
 
+    @classmethod
+    def postConditions(cls):
+        """ Returns readiness conditions post processing waits on
+        """
+        return cls.bundle.get('postConditions', [])
+
     @classmethod
     def to_entity(cls, use_latest=True):
         """ Returns proper entity key to query the charmstore.
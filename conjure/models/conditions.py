@@ -0,0 +1,79 @@
+""" Readiness conditions evaluated against a ModelStatus
+
+A condition is written as '<target>[:<state>]' where target is an
+application ('keystone') or a unit ('keystone/0') and state is either a
+workload status ('active', the default) or 'address'.
+
+    keystone                every keystone unit is active
+    keystone:blocked        every keystone unit is blocked
+    keystone:address        some keystone unit has a public address
+    keystone/0:address      keystone/0 has a public address
+"""
+
+
+class ConditionException(Exception):
+    """ Malformed condition """
+
+
+class Condition:
+    def __init__(self, target, state='active'):
+        self.target = target
+        self.state = state
+
+    @classmethod
+    def parse(cls, spec):
+        if isinstance(spec, Condition):
+            return spec
+        if not isinstance(spec, str) or not spec.strip():
+            raise ConditionException(
+                "Invalid condition: {!r}".format(spec))
+        target, _, state = spec.strip().partition(':')
+        return cls(target, state or 'active')
+
+    def _units(self, status):
+        if '/' in self.target:
+            unit = status.units.get(self.target, None)
+            return [unit] if unit is not None else []
+        return list(status.units_for(self.target).values())
+
+    def satisfied(self, status):
+        """ True if status meets the condition
+
+        Arguments:
+        status: conjure.models.status.ModelStatus
+        """
+        units = self._units(status)
+        if not units:
+            return False
+        if self.state == 'address':
+            return any(u['PublicAddress'] for u in units)
+        return all(u['WorkloadStatus']['Status'] == self.state
+                   for u in units)
+
+    def __eq__(self, other):
+        return isinstance(other, Condition) and \
+            (self.target, self.state) == (other.target, other.state)
+
+    def __hash__(self):
+        return hash((self.target, self.state))
+
+    def __str__(self):
+        return "{}:{}".format(self.target, self.state)
+
+    __repr__ = __str__
+
+
+def parse_conditions(specs):
+    """ Parses a list of condition strings, a single string is accepted
+    """
+    if not specs:
+        return []
+    if isinstance(specs, str):
+        specs = [specs]
+    return [Condition.parse(s) for s in specs]
+
+
+def pending(conditions, status):
+    """ Returns the conditions status does not meet yet
+    """
+    return [c for c in conditions if not c.satisfied(status)]
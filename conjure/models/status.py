@@ -0,0 +1,170 @@
+""" In-memory model status built from AllWatcher deltas
+"""
+
+
+def _get(d, *keys, default=None):
+    """ Returns the first key found in d
+
+    AllWatcher payloads changed key styles between Juju 2.0 releases
+    (eg. 'WorkloadStatus' vs 'workload-status'), accept either.
+    """
+    for k in keys:
+        if k in d:
+            return d[k]
+    return default
+
+
+def _status(d, *keys):
+    st = _get(d, *keys, default={}) or {}
+    return {'Status': _get(st, 'Current', 'current', 'Status', 'status',
+                           default=''),
+            'Info': _get(st, 'Message', 'message', 'Info', 'info',
+                         default='')}
+
+
+class ModelStatus:
+    """ Keeps units, machines, applications and relations of a model
+
+    Entries are kept in the same shape as the FullStatus output so the
+    existing widgets can consume them unchanged.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.applications = {}
+        self.units = {}
+        self.machines = {}
+        self.relations = {}
+        # application name -> {unit_name: unit}
+        self._units_by_app = {}
+
+    def entities(self):
+        """ Returns the set of (entity, name) tuples currently known
+        """
+        out = set()
+        for entity, table in (('application', self.applications),
+                              ('unit', self.units),
+                              ('machine', self.machines),
+                              ('relation', self.relations)):
+            out.update((entity, name) for name in table)
+        return out
+
+    def apply(self, deltas):
+        """ Applies a list of [entity, change, data] deltas
+
+        Returns:
+        Set of (entity, name) tuples that changed or were removed
+        """
+        changed = set()
+        for entity, change, data in deltas:
+            handler = getattr(self, '_apply_{}'.format(entity), None)
+            if handler is None:
+                continue
+            name = handler(change == 'remove', data)
+            if name is not None:
+                changed.add((entity if entity != 'service'
+                             else 'application', name))
+        return changed
+
+    def _apply_unit(self, removed, data):
+        name = _get(data, 'Name', 'name')
+        old = self.units.pop(name, None) if removed else self.units.get(name)
+        if old is not None:
+            by_app = self._units_by_app.get(old['Application'], {})
+            by_app.pop(name, None)
+            if not by_app:
+                self._units_by_app.pop(old['Application'], None)
+        if removed:
+            return name
+        unit = self.units[name] = {
+            'Application': _get(data, 'Application', 'application',
+                                'Service', 'service'),
+            'Machine': _get(data, 'MachineId', 'machine-id', default=''),
+            'PublicAddress': _get(data, 'PublicAddress', 'public-address',
+                                  default=''),
+            'WorkloadStatus': _status(data, 'WorkloadStatus',
+                                      'workload-status'),
+            'AgentStatus': _status(data, 'AgentStatus', 'agent-status')}
+        self._units_by_app.setdefault(unit['Application'], {})[name] = unit
+        return name
+
+    def _apply_application(self, removed, data):
+        name = _get(data, 'Name', 'name')
+        if removed:
+            self.applications.pop(name, None)
+            return name
+        self.applications[name] = {
+            'Charm': _get(data, 'CharmURL', 'charm-url', default=''),
+            'Status': _status(data, 'Status', 'status')}
+        return name
+
+    _apply_service = _apply_application
+
+    def _apply_machine(self, removed, data):
+        name = _get(data, 'Id', 'id')
+        if removed:
+            self.machines.pop(name, None)
+            return name
+        addresses = _get(data, 'Addresses', 'addresses', default=[]) or []
+        self.machines[name] = {
+            'InstanceId': _get(data, 'InstanceId', 'instance-id',
+                               default=''),
+            'AgentStatus': _status(data, 'AgentStatus', 'agent-status',
+                                   'JujuStatus', 'juju-status'),
+            'Addresses': [_get(a, 'Value', 'value') for a in addresses]}
+        return name
+
+    def _apply_relation(self, removed, data):
+        key = _get(data, 'Key', 'key')
+        if removed:
+            self.relations.pop(key, None)
+            return key
+        endpoints = []
+        for ep in _get(data, 'Endpoints', 'endpoints', default=[]) or []:
+            endpoints.append(_get(ep, 'ServiceName', 'application-name',
+                                  'service-name'))
+        self.relations[key] = endpoints
+        return key
+
+    def units_for(self, application):
+        """ Returns {unit_name: unit} for an application
+        """
+        return dict(self._units_by_app.get(application, {}))
+
+    def to_json_status(self):
+        """ Returns the model in the layout of `juju status --format json`
+
+        Only the fields kept here are filled in, enough for the hooklib
+        helpers to run their jq filters unchanged. Applications are
+        listed under both 'services' and 'applications'.
+        """
+        def _st(st):
+            return {'current': st['Status'], 'message': st['Info']}
+
+        machines = {}
+        for name, m in self.machines.items():
+            machines[name] = {
+                'juju-status': _st(m['AgentStatus']),
+                'instance-id': m['InstanceId'],
+                'dns-name': m['Addresses'][0] if m['Addresses'] else ''}
+        applications = {}
+        for name, app in self.applications.items():
+            applications[name] = {'charm': app['Charm'],
+                                  'service-status': _st(app['Status']),
+                                  'units': {}}
+        for name, u in self.units.items():
+            app = applications.setdefault(
+                u['Application'], {'charm': '',
+                                   'service-status': {'current': '',
+                                                      'message': ''},
+                                   'units': {}})
+            app['units'][name] = {
+                'workload-status': _st(u['WorkloadStatus']),
+                'juju-status': _st(u['AgentStatus']),
+                'machine': u['Machine'],
+                'public-address': u['PublicAddress']}
+        return {'machines': machines,
+                'services': applications,
+                'applications': applications}
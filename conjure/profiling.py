@@ -0,0 +1,147 @@
+""" Startup profiling
+
+Enabled with `conjure-up --profile-startup`, records how long each module
+takes to import and how long each startup phase takes until the first
+screen is drawn. The report is written to stderr once the UI exits.
+"""
+
+from contextlib import contextmanager
+from importlib.abc import MetaPathFinder
+import sys
+import time
+
+
+class _TimedLoader:
+    """ Wraps a module loader and records the time spent executing it
+    """
+
+    def __init__(self, loader, recorder):
+        self.loader = loader
+        self.recorder = recorder
+
+    def create_module(self, spec):
+        return self.loader.create_module(spec)
+
+    def exec_module(self, module):
+        start = time.perf_counter()
+        self.recorder.push()
+        try:
+            self.loader.exec_module(module)
+        finally:
+            self.recorder.pop(module.__name__,
+                              time.perf_counter() - start)
+
+    def __getattr__(self, attr):
+        return getattr(self.loader, attr)
+
+
+class ImportTimer(MetaPathFinder):
+    """ Meta path finder recording per-module import times
+
+    Times are cumulative (including nested imports) and self (excluding
+    them), the same split `python -X importtime` reports.
+    """
+
+    def __init__(self):
+        self.times = {}
+        self._stack = []
+        self._finding = set()
+
+    def find_spec(self, fullname, path, target=None):
+        if fullname in self._finding:
+            return None
+        self._finding.add(fullname)
+        try:
+            for finder in sys.meta_path:
+                if finder is self or not hasattr(finder, 'find_spec'):
+                    continue
+                spec = finder.find_spec(fullname, path, target)
+                if spec is not None:
+                    break
+            else:
+                return None
+        finally:
+            self._finding.discard(fullname)
+        if spec.loader is None or not hasattr(spec.loader, 'exec_module'):
+            return spec
+        spec.loader = _TimedLoader(spec.loader, self)
+        return spec
+
+    def push(self):
+        self._stack.append(0.0)
+
+    def pop(self, name, elapsed):
+        nested = self._stack.pop()
+        if self._stack:
+            self._stack[-1] += elapsed
+        self.times[name] = (elapsed, elapsed - nested)
+
+    def install(self):
+        if self not in sys.meta_path:
+            sys.meta_path.insert(0, self)
+
+    def uninstall(self):
+        if self in sys.meta_path:
+            sys.meta_path.remove(self)
+
+
+class StartupProfiler:
+    def __init__(self):
+        self.enabled = False
+        self.imports = ImportTimer()
+        self.phases = []
+        self._origin = time.perf_counter()
+        self._open = {}
+
+    def enable(self):
+        self.enabled = True
+        self._origin = time.perf_counter()
+        self.imports.install()
+
+    def start(self, name):
+        if self.enabled:
+            self._open[name] = time.perf_counter()
+
+    def stop(self, name):
+        if not self.enabled or name not in self._open:
+            return
+        start = self._open.pop(name)
+        self.phases.append((name, start - self._origin,
+                            time.perf_counter() - start))
+
+    @contextmanager
+    def phase(self, name):
+        self.start(name)
+        try:
+            yield
+        finally:
+            self.stop(name)
+
+    def report(self, out=None, limit=25):
+        """ Writes phase and import timings
+
+        Arguments:
+        out: file object, defaults to stderr
+        limit: number of slowest imports to list
+        """
+        if not self.enabled:
+            return
+        self.imports.uninstall()
+        out = out or sys.stderr
+        out.write("startup phases (ms):\n")
+        for name, offset, elapsed in self.phases:
+            out.write("  {:<16} +{:>8.1f} {:>8.1f}\n".format(
+                name, offset * 1000, elapsed * 1000))
+        times = sorted(self.imports.times.items(),
+                       key=lambda item: item[1][1], reverse=True)
+        total = sum(t[1] for _, t in times)
+        out.write("imports: {} modules, {:.1f}ms\n".format(
+            len(times), total * 1000))
+        out.write("  {:>8} {:>8}  module\n".format('self', 'cumul'))
+        for name, (cumulative, own) in times[:limit]:
+            out.write("  {:>8.1f} {:>8.1f}  {}\n".format(
+                own * 1000, cumulative * 1000, name))
+        out.flush()
+
+
+profiler = StartupProfiler()
@@ -49,9 +49,21 @@ If you need to extend the behavior, you can also use the ``Shell`` object::
     >>> cat.output()
     ['Hello, world!']
 
+Long running commands can be streamed line by line on an asyncio loop
+instead, keeping only the last ``max_lines`` lines of each stream::
+
+    >>> from shell import spawn
+    >>> proc = spawn('juju debug-log', on_line=print)
+    >>> proc.cancel()
+
 """
+from collections import deque
+import asyncio
+import os
 import shlex
+import signal
 import subprocess
+import threading
 
 
 __author__ = 'Daniel Lindsley'
@@ -74,6 +86,13 @@ class CommandError(ShellException):
     error_code = 1
 
 
+class CommandTimeout(ShellException):
+    """Thrown when a command runs longer than its timeout."""
+    def __init__(self, message, result=None):
+        super().__init__(message)
+        self.result = result
+
+
 class Shell(object):
     """
     Handles executing commands & recording output.
@@ -95,21 +114,50 @@ class Shell(object):
     Optionally accepts a ``strip_empty`` parameter, which should be a boolean.
     If set to ``True``, only non-empty lines from ``Shell.output`` or
     ``Shell.errors`` will be returned. (Default: ``True``)
+
+    Optionally accepts a ``timeout`` parameter, in seconds. A command running
+    longer is killed and ``CommandTimeout`` raised. (Default: ``None``)
     """
     def __init__(self, has_input=False, record_output=True, record_errors=True,
-                 strip_empty=True):
+                 strip_empty=True, timeout=None):
         self.has_input = has_input
         self.record_output = record_output
         self.record_errors = record_errors
         self.strip_empty = strip_empty
+        self.timeout = timeout
 
         self.last_command = ''
         self.line_breaks = '\n'
         self.pid = None
         self.code = 0
         self._popen = None
-        self._stdout = ''
-        self._stderr = ''
+        # chunks are joined and split once, when output is asked for
+        self._stdout_chunks = []
+        self._stderr_chunks = []
+        self._lines = {}
+
+    @property
+    def _stdout(self):
+        return self._joined(self._stdout_chunks)
+
+    @property
+    def _stderr(self):
+        return self._joined(self._stderr_chunks)
+
+    def _joined(self, chunks):
+        if len(chunks) > 1:
+            chunks[:] = [''.join(chunks)]
+        return chunks[0] if chunks else ''
+
+    def _split(self, name, raw):
+        cached = self._lines.get(name, None)
+        if cached is None or cached[0] is not raw:
+            lines = raw.split(self.line_breaks)
+            if self.strip_empty:
+                lines = [line for line in lines if line]
+            cached = (raw, lines)
+            self._lines[name] = cached
+        return list(cached[1])
 
     def _split_command(self, command):
         """
@@ -135,12 +183,12 @@ class Shell(object):
         Records nothing if the ``record_*`` options have been set to ``False``.
         """
         if self.record_output:
-            if stdout is not None:
-                self._stdout += stdout
+            if stdout:
+                self._stdout_chunks.append(stdout)
 
         if self.record_errors:
-            if stderr is not None:
-                self._stderr += stderr
+            if stderr:
+                self._stderr_chunks.append(stderr)
 
     def _communicate(self, the_input=None):
         """
@@ -149,7 +197,17 @@ class Shell(object):
         Optionally accepts a ``the_input`` parameter, which can be a string
         to send to the process. (Default: ``None``)
         """
-        stdout, stderr = self._popen.communicate(input=the_input)
+        try:
+            stdout, stderr = self._popen.communicate(input=the_input,
+                                                     timeout=self.timeout)
+        except subprocess.TimeoutExpired:
+            self._popen.kill()
+            stdout, stderr = self._popen.communicate()
+            self._handle_output(stdout, stderr)
+            self.code = self._popen.returncode
+            raise CommandTimeout(
+                "{} timed out after {}s".format(self.last_command,
+                                                self.timeout), self)
         self._handle_output(stdout, stderr)
 
         if self._popen.returncode is not None:
@@ -267,12 +325,7 @@ class Shell(object):
         if raw:
             return self._stdout
 
-        lines = self._stdout.split(self.line_breaks)
-
-        if self.strip_empty:
-            lines = [line for line in lines if line]
-
-        return lines
+        return self._split('stdout', self._stdout)
 
     def errors(self, raw=False):
         """
@@ -298,16 +351,11 @@ class Shell(object):
         if raw:
             return self._stderr
 
-        lines = self._stderr.split(self.line_breaks)
-
-        if self.strip_empty:
-            lines = [line for line in lines if line]
-
-        return lines
+        return self._split('stderr', self._stderr)
 
 
 def shell(command, has_input=False, record_output=True, record_errors=True,
-          strip_empty=True):
+          strip_empty=True, timeout=None):
     """
     A convenient shortcut for running commands.
 
@@ -333,6 +381,9 @@ def shell(command, has_input=False, record_output=True, record_errors=True,
     If set to ``True``, only non-empty lines from ``Shell.output`` or
     ``Shell.errors`` will be returned. (Default: ``True``)
 
+    Optionally accepts a ``timeout`` parameter, in seconds, after which the
+    command is killed and ``CommandTimeout`` raised. (Default: ``None``)
+
     Returns the ``Shell`` instance, which has been run with the given command.
 
     Example::
@@ -347,6 +398,245 @@ def shell(command, has_input=False, record_output=True, record_errors=True,
         has_input=has_input,
         record_output=record_output,
         record_errors=record_errors,
-        strip_empty=strip_empty
+        strip_empty=strip_empty,
+        timeout=timeout
     )
     return sh.run(command)
+
+
+_loop = None
+# ident of the thread running _loop, recorded once it starts
+_loop_thread = None
+
+
+def _record_loop_thread():
+    global _loop_thread
+    _loop_thread = threading.get_ident()
+
+
+def set_loop(loop):
+    """
+    Sets the asyncio loop streamed commands run on, normally the loop the
+    UI runs on. Defaults to the main thread's event loop.
+    """
+    global _loop, _loop_thread
+    _loop = loop
+    _loop_thread = None
+    loop.call_soon_threadsafe(_record_loop_thread)
+
+
+def _get_loop():
+    if _loop is None:
+        set_loop(asyncio.get_event_loop())
+    return _loop
+
+
+class Process(object):
+    """
+    Runs a command on an asyncio loop, streaming its output line by line.
+
+    Only the last ``max_lines`` lines of stdout and stderr are kept, so
+    commands producing unbounded output (``juju debug-log``) run in
+    constant memory. ``on_line(stream, line)`` is called on the loop for
+    every line, ``stream`` being ``'stdout'`` or ``'stderr'``.
+
+    The lines can also be consumed with ``async for stream, line in proc``
+    once ``start`` has been awaited.
+
+    ``timeout`` bounds the whole run, the process is then terminated and
+    ``wait`` raises ``CommandTimeout``. The process is terminated as well
+    when ``wait`` fails otherwise, eg. because ``on_line`` raised.
+    """
+    def __init__(self, command, on_line=None, max_lines=1000, timeout=None,
+                 env=None, strip_empty=True, loop=None):
+        self.command = command
+        self.on_line = on_line
+        self.timeout = timeout
+        self.env = env
+        self.strip_empty = strip_empty
+        self.loop = loop
+        self.stdout = deque(maxlen=max_lines)
+        self.stderr = deque(maxlen=max_lines)
+        self.code = None
+        self.pid = None
+        self.cancelled = False
+        self._proc = None
+        self._pumps = []
+        self._queue = None
+        self._done = None
+        self._started = threading.Event()
+
+    def _split_command(self, command):
+        if isinstance(command, (tuple, list)):
+            return command
+        return shlex.split(command)
+
+    async def start(self):
+        """
+        Spawns the process, returns the ``Process`` instance.
+        """
+        if self.loop is None:
+            self.loop = _get_loop()
+        self._queue = asyncio.Queue()
+        self._proc = await asyncio.create_subprocess_exec(
+            *self._split_command(self.command),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            env=self.env,
+            start_new_session=True)
+        self.pid = self._proc.pid
+        self._pumps = [
+            asyncio.ensure_future(self._pump('stdout', self._proc.stdout,
+                                             self.stdout)),
+            asyncio.ensure_future(self._pump('stderr', self._proc.stderr,
+                                             self.stderr))]
+        self._started.set()
+        return self
+
+    def _emit(self, name, buf, data):
+        line = data.decode('utf-8', 'replace')
+        if self.strip_empty and not line:
+            return
+        buf.append(line)
+        self._queue.put_nowait((name, line))
+        if self.on_line is not None:
+            self.on_line(name, line)
+
+    async def _pump(self, name, reader, buf):
+        pending = b''
+        while True:
+            chunk = await reader.read(65536)
+            if not chunk:
+                break
+            lines = (pending + chunk).split(b'\n')
+            pending = lines.pop()
+            for data in lines:
+                self._emit(name, buf, data)
+        if pending:
+            self._emit(name, buf, pending)
+        self._queue.put_nowait((name, None))
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        while True:
+            if not self._pumps or all(p.done() for p in self._pumps) and \
+               self._queue.empty():
+                raise StopAsyncIteration
+            name, line = await self._queue.get()
+            if line is not None:
+                return name, line
+
+    async def wait(self):
+        """
+        Waits for the process to exit and its output to be read.
+
+        Returns a ``Shell`` instance holding the exit code and the kept
+        output, so callers of ``shell()`` can use it unchanged.
+        """
+        if self._proc is None:
+            await self.start()
+        if self._done is None:
+            self._done = asyncio.ensure_future(self._finish())
+        try:
+            # shielded, a timeout must not cancel the readers
+            await asyncio.wait_for(asyncio.shield(self._done), self.timeout)
+        except asyncio.TimeoutError:
+            self._terminate()
+            await self._done
+            raise CommandTimeout(
+                "{} timed out after {}s".format(self.command, self.timeout),
+                self.result())
+        finally:
+            # eg. on_line raised, do not leave the command running
+            self._terminate()
+        return self.result()
+
+    async def _finish(self):
+        await asyncio.gather(*self._pumps)
+        self.code = await self._proc.wait()
+
+    def _terminate(self, grace=5):
+        if self._proc is None or self._proc.returncode is not None:
+            return
+        try:
+            # the whole group, children keeping our pipes open included
+            os.killpg(self.pid, signal.SIGTERM)
+        except ProcessLookupError:
+            return
+        self.loop.call_later(grace, self._kill)
+
+    def _kill(self):
+        try:
+            os.killpg(self.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+    def cancel(self, grace=5):
+        """
+        Terminates the process, killing it if still around after ``grace``
+        seconds. Safe to call from any thread.
+        """
+        self.cancelled = True
+        if not self._started.is_set():
+            return
+        self.loop.call_soon_threadsafe(self._terminate, grace)
+
+    def result(self):
+        sh = Shell(strip_empty=self.strip_empty)
+        sh.last_command = self.command
+        sh.pid = self.pid
+        sh.code = self.code if self.code is not None else -1
+        sh._stdout_chunks = ['\n'.join(self.stdout)]
+        sh._stderr_chunks = ['\n'.join(self.stderr)]
+        return sh
+
+
+def spawn(command, on_line=None, max_lines=1000, timeout=None, env=None,
+          loop=None):
+    """
+    Starts ``command`` as a ``Process`` on the streaming loop.
+
+    Can be called from any thread. ``Process.future`` is a
+    ``concurrent.futures.Future`` resolving to the ``Shell`` result.
+    """
+    loop = loop or _get_loop()
+    proc = Process(command, on_line=on_line, max_lines=max_lines,
+                   timeout=timeout, env=env, loop=loop)
+    proc.future = asyncio.run_coroutine_threadsafe(proc.wait(), loop)
+    return proc
+
+
+def stream(command, on_line=None, max_lines=1000, timeout=None):
+    """
+    Runs ``command`` streaming its output to ``on_line(stream, line)``,
+    blocking until it exits.
+
+    Meant for worker threads while the streaming loop runs; without a
+    running loop the command is run with ``shell()``, replaying its
+    output to ``on_line`` when it is done.
+
+    Returns the ``Shell`` instance like ``shell()`` does.
+
+    Raises ``RuntimeError`` when called from the thread running the loop,
+    which it would block; use ``spawn()`` there.
+    """
+    loop = _get_loop()
+    if loop.is_running() and _loop_thread == threading.get_ident():
+        raise RuntimeError(
+            "stream() would block the loop it streams on, use spawn()")
+    if loop.is_running():
+        return spawn(command, on_line, max_lines, timeout,
+                     loop=loop).future.result()
+    if threading.current_thread() is threading.main_thread():
+        proc = Process(command, on_line=on_line, max_lines=max_lines,
+                       timeout=timeout, loop=loop)
+        return loop.run_until_complete(proc.wait())
+    sh = shell(command, timeout=timeout)
+    if on_line is not None:
+        for line in sh.output():
+            on_line('stdout', line)
+        for line in sh.errors():
+            on_line('stderr', line)
+    return sh
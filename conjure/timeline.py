@@ -0,0 +1,232 @@
+""" Deployment timeline
+
+Records when units and machines change state while a model deploys and
+summarizes it afterwards with `conjure-up --report`.
+
+The timeline is an append-only file with one JSON array per line:
+
+    [time, "start", model]       a new deployment begins
+    [time, "resume", model]      conjure-up was started again on it
+    [time, "u", unit, application, workload status, agent status]
+    [time, "m", machine, agent status]
+    [time, "r", relation key, [application, ...]]
+
+A line is written only when the recorded state actually changes.
+"""
+
+from collections import defaultdict
+import json
+import logging
+import os
+import time
+
+log = logging.getLogger('conjure')
+
+
+def timeline_path(controller, model):
+    from bundleplacer.utils import cache_dir
+    return cache_dir('conjure-up', 'timelines', controller, model,
+                     'timeline.log')
+
+
+class TimelineRecorder:
+    """ Appends state transitions of a ModelStatus to path
+
+    Arguments:
+    path: timeline file, appended to if it exists
+    model: model name for the start marker
+    resume: continue the deployment already recorded in path, eg. for
+            `conjure-up --status`
+    """
+
+    def __init__(self, path, model=None, resume=False):
+        self.path = path
+        self.last = {}
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._fp = open(path, 'a')
+        self._write([[time.time(), 'resume' if resume else 'start', model]])
+
+    def _write(self, entries):
+        for entry in entries:
+            self._fp.write(json.dumps(entry, separators=(',', ':')))
+            self._fp.write('\n')
+        self._fp.flush()
+
+    def record(self, status, changed, now=None):
+        """ Records transitions of the (entity, name) pairs in changed
+
+        Matches the StatusWatcher on_change signature.
+        """
+        now = now or time.time()
+        entries = []
+        for entity, name in sorted(changed, key=str):
+            if entity == 'unit' and name in status.units:
+                u = status.units[name]
+                state = [u['Application'], u['WorkloadStatus']['Status'],
+                         u['AgentStatus']['Status']]
+                kind = 'u'
+            elif entity == 'machine' and name in status.machines:
+                state = [status.machines[name]['AgentStatus']['Status']]
+                kind = 'm'
+            elif entity == 'relation' and name in status.relations:
+                state = [sorted(status.relations[name])]
+                kind = 'r'
+            else:
+                continue
+            if self.last.get((kind, name)) == state:
+                continue
+            self.last[(kind, name)] = state
+            entries.append([round(now, 2), kind, name] + state)
+        if entries:
+            try:
+                self._write(entries)
+            except OSError as e:
+                log.warning("Unable to write timeline: {}".format(e))
+
+    def close(self):
+        self._fp.close()
+
+
+def load(path):
+    """ Reads the last deployment of a timeline file
+
+    Returns:
+    (start time, {unit: [(time, app, workload, agent)]},
+     {machine: [(time, status)]}, {relation: [applications]})
+    """
+    start, units, machines, relations = None, None, None, None
+    with open(path) as fp:
+        for line in fp:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # a torn last line of an interrupted run
+                continue
+            t, kind = entry[0], entry[1]
+            if kind == 'start':
+                start = t
+                units = defaultdict(list)
+                machines = defaultdict(list)
+                relations = {}
+            elif start is None or kind == 'resume':
+                continue
+            elif kind == 'u':
+                units[entry[2]].append((t, entry[3], entry[4], entry[5]))
+            elif kind == 'm':
+                machines[entry[2]].append((t, entry[3]))
+            elif kind == 'r':
+                relations[entry[2]] = entry[3]
+    return start, units or {}, machines or {}, relations or {}
+
+
+def time_to_active(start, units):
+    """ Returns ({unit: seconds}, {application: seconds}) until active
+
+    Units that never went active are left out, so are applications with
+    such a unit.
+    """
+    per_unit, apps, waiting = {}, {}, set()
+    for name, events in units.items():
+        app = events[0][1]
+        active = [t for t, _, workload, _ in events if workload == 'active']
+        if not active:
+            waiting.add(app)
+            continue
+        per_unit[name] = active[0] - start
+        apps[app] = max(apps.get(app, 0), per_unit[name])
+    for app in waiting:
+        apps.pop(app, None)
+    return per_unit, apps
+
+
+def state_durations(start, events, end):
+    """ Seconds a unit spent per state until end, agent states taking
+    precedence
+    """
+    out = defaultdict(float)
+    prev_t, prev_state = start, 'pending'
+    for t, _, workload, agent in events:
+        if t >= end:
+            break
+        out[prev_state] += t - prev_t
+        prev_t = t
+        prev_state = agent if agent in ('allocating', 'executing') \
+            else workload or agent
+    out[prev_state] += max(end - prev_t, 0)
+    return out
+
+
+def critical_path(apps, relations):
+    """ Chain of related applications that kept the deploy from finishing
+
+    Walks back from the last application to go active, each step going to
+    the related application that went active last before it.
+
+    Arguments:
+    apps: {application: seconds to active}
+    relations: {key: [application, ...]}
+
+    Returns:
+    [(application, seconds to active)] earliest first
+    """
+    related = defaultdict(set)
+    for endpoints in relations.values():
+        for a in endpoints:
+            related[a].update(e for e in endpoints if e != a)
+    if not apps:
+        return []
+    app = max(apps, key=apps.get)
+    path = [(app, apps[app])]
+    while True:
+        before = [(apps[r], r) for r in related[app]
+                  if r in apps and apps[r] < apps[app] and
+                  r not in dict(path)]
+        if not before:
+            break
+        t, app = max(before)
+        path.append((app, t))
+    return list(reversed(path))
+
+
+def _fmt(seconds):
+    return "{:d}m{:02d}s".format(int(seconds) // 60, int(seconds) % 60)
+
+
+def report(path, slowest=10):
+    """ Returns the text of `conjure-up --report` for a timeline file
+    """
+    start, units, machines, relations = load(path)
+    if start is None:
+        return "No deployment recorded in {}".format(path)
+    per_unit, apps = time_to_active(start, units)
+    end = max([e[-1][0] for e in units.values()] +
+              [e[-1][0] for e in machines.values()] + [start])
+    lines = ["Deployment started {}, last change after {}".format(
+        time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(start)),
+        _fmt(end - start)), ""]
+
+    lines.append("Time to active per application:")
+    for app, secs in sorted(apps.items(), key=lambda i: -i[1]):
+        lines.append("  {:<30} {:>8}".format(app, _fmt(secs)))
+    pending = sorted({e[0][1] for e in units.values()} - set(apps))
+    for app in pending:
+        lines.append("  {:<30} {:>8}".format(app, 'never'))
+
+    lines += ["", "Slowest units:"]
+    for name, secs in sorted(per_unit.items(),
+                             key=lambda i: -i[1])[:slowest]:
+        spent = state_durations(start, units[name], start + secs)
+        breakdown = ", ".join(
+            "{} {}".format(state, _fmt(d))
+            for state, d in sorted(spent.items(), key=lambda i: -i[1])
+            if d >= 1)
+        lines.append("  {:<30} {:>8}  ({})".format(
+            name, _fmt(secs), breakdown))
+
+    lines += ["", "Critical path:"]
+    prev = 0
+    for app, secs in critical_path(apps, relations):
+        lines.append("  {:<30} {:>8}  (+{})".format(
+            app, _fmt(secs), _fmt(secs - prev)))
+        prev = secs
+    return "\n".join(lines)
@@ -3,47 +3,60 @@ from urwid import (WidgetWrap, Text, Pile,
                    Filler, Columns)
 from ubuntui.utils import Padding
 from ubuntui.widgets.text import Instruction
-import random
+from conjure.bootstrap import PHASES
 
 
 class BootstrapWaitView(WidgetWrap):
 
-    load_attributes = [('pending_icon', "\u2581"),
-                       ('pending_icon', "\u2582"),
-                       ('pending_icon', "\u2583"),
-                       ('pending_icon', "\u2584"),
-                       ('pending_icon', "\u2585"),
-                       ('pending_icon', "\u2586"),
-                       ('pending_icon', "\u2587"),
-                       ('pending_icon', "\u2588")]
+    pending = ('pending_icon', "\N{HOURGLASS}")
+    active = ('pending_icon', "\N{CIRCLED BULLET}")
+    done = ('success_icon', "\u2713")
 
     def __init__(self, app):
         self.app = app
         self.message = Instruction('Bootstrapping...', align="center")
-        self.loading_boxes = [Text(x) for x in self.load_attributes]
+        self.eta = Text('', align="center")
+        self.icons = [Text(self.pending) for _ in PHASES]
         super().__init__(self._build_node_waiting())
 
-    def redraw_kitt(self):
-        """ Redraws the KITT bar
+    def set_progress(self, progress):
+        """ Shows the current phase of a BootstrapProgress
+
+        Called on phase changes, set_eta() refreshes the estimate in
+        between.
+        """
+        self.message.set_text(progress.label + '...')
+        for idx, icon in enumerate(self.icons):
+            if idx < progress.current or progress.phase == 'ready':
+                icon.set_text(self.done)
+            elif idx == progress.current:
+                icon.set_text(self.active)
+        self.set_eta(progress)
+
+    def set_eta(self, progress):
+        """ Shows the time left estimated by a BootstrapProgress
         """
-        random.shuffle(self.load_attributes)
-        for i in self.loading_boxes:
-            i.set_text(
-                self.load_attributes[random.randrange(
-                    len(self.load_attributes))])
+        eta = progress.eta()
+        if eta is not None and progress.phase != 'ready':
+            self.eta.set_text(
+                "About {} minute(s) left, going by earlier "
+                "bootstraps".format(max(int(round(eta / 60.0)), 1)))
+        else:
+            self.eta.set_text('')
 
     def _build_node_waiting(self):
         """ creates a loading screen if nodes do not exist yet """
         text = [Padding.line_break(""),
                 self.message,
+                self.eta,
                 Padding.line_break("")]
 
-        _boxes = []
-        _boxes.append(('weight', 1, Text('')))
-        for i in self.loading_boxes:
-            _boxes.append(('pack', i))
-        _boxes.append(('weight', 1, Text('')))
-        _boxes = Columns(_boxes)
+        rows = []
+        for icon, (_, label, _) in zip(self.icons, PHASES):
+            rows.append(Columns([('weight', 1, Text('')),
+                                 ('fixed', 3, icon),
+                                 ('fixed', 24, Text(label)),
+                                 ('weight', 1, Text(''))]))
 
-        return Filler(Pile(text + [_boxes]),
+        return Filler(Pile(text + rows),
                       valign="middle")
@@ -1,6 +1,6 @@
 import random
 from urwid import (Text, WidgetWrap)
-from ubuntui.widgets.juju.service import ServiceWidget
+from ubuntui.widgets.juju.unit import UnitWidget
 from ubuntui.widgets.table import Table
 from ubuntui.utils import Color
 from conjure.api.models import model_status
@@ -33,42 +33,77 @@ class ServicesView(WidgetWrap):
         self.table.addHeadings(headings)
         super().__init__(self.table.render())
 
-        self.refresh_nodes()
-
     def refresh_nodes(self):
         """ Adds services to the view if they don't already exist
+
+        Performs a full FullStatus query, prefer feeding changes through
+        update_units from a status watcher.
         """
         status = model_status()
         for name, service in sorted(status['Services'].items()):
-            service_w = ServiceWidget(name, service)
-            for unit in service_w.Units:
-                services_list = []
-                try:
-                    unit_w = self.deployed[unit._name]
-                except:
-                    self.deployed[unit._name] = unit
-                    unit_w = self.deployed[unit._name]
-                    for k, label, width in self.view_columns:
-                        if width == 0:
-                            services_list.append(getattr(unit_w, k))
-                        else:
-                            if not hasattr(unit_w, k):
-                                continue
-                            services_list.append(('fixed', width,
-                                                  getattr(unit_w, k)))
-
-                    self.table.addColumns(unit._name, services_list)
-                    if not hasattr(unit_w, 'WorkloadInfo'):
+            units = service['Units'] or {}
+            for unit_name, unit in sorted(units.items()):
+                self.update_unit(unit_name, unit)
+
+    def update_units(self, status, changed):
+        """ Updates only the rows of units that changed
+
+        Arguments:
+        status: ModelStatus holding current units
+        changed: set of (entity, name) tuples reported by the watcher
+        """
+        for entity, name in sorted(changed):
+            if entity != 'unit':
+                continue
+            if name in status.units:
+                self.update_unit(name, status.units[name])
+            else:
+                self.remove_unit(name)
+
+    def remove_unit(self, name):
+        """ Drops the row of a unit that left the model
+
+        Arguments:
+        name: unit name, ie. mysql/0
+        """
+        if self.deployed.pop(name, None) is not None:
+            self.table.removeRow(name)
+
+    def update_unit(self, name, unit):
+        """ Adds a row for the unit if it doesn't already exist and
+        refreshes its state
+
+        Arguments:
+        name: unit name, ie. mysql/0
+        unit: FullStatus style unit dictionary
+        """
+        try:
+            unit_w = self.deployed[name]
+        except KeyError:
+            unit_w = UnitWidget(name, unit)
+            self.deployed[name] = unit_w
+            services_list = []
+            for k, label, width in self.view_columns:
+                if width == 0:
+                    services_list.append(getattr(unit_w, k))
+                else:
+                    if not hasattr(unit_w, k):
                         continue
-                    self.table.addColumns(
-                        unit._name,
-                        [
-                            ('fixed', 5, Text("")),
-                            Color.info_context(
-                                unit_w.WorkloadInfo)
-                        ],
-                        force=True)
-                self.update_ui_state(unit_w, unit._unit)
+                    services_list.append(('fixed', width,
+                                          getattr(unit_w, k)))
+
+            self.table.addColumns(name, services_list)
+            if not hasattr(unit_w, 'WorkloadInfo'):
+                return
+            self.table.addColumns(
+                name,
+                [
+                    ('fixed', 5, Text("")),
+                    Color.info_context(
+                        unit_w.WorkloadInfo)
+                ],
+                force=True)
+        self.update_ui_state(unit_w, unit)
 
     def status_icon_state(self, agent_state):
         if agent_state == "maintenance" \
@@ -2,7 +2,7 @@ import shutil
 import os
 from subprocess import check_call, CalledProcessError
 from conjure.models.bundle import BundleModel
-from conjure.async import submit
+from conjure.async import submit, PRIORITY_LOW
 
 
 class UtilsException(Exception):
@@ -150,4 +150,5 @@ def pollinate(session, tag, log):
             check_call(cmd, shell=True)
         except CalledProcessError as e:
             log.warning("Generating random seed failed: {}".format(e))
-    submit(do_pollinate, lambda _: None)
+    submit(do_pollinate, lambda _: None, queue_name='telemetry',
+           priority=PRIORITY_LOW)
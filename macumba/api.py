@@ -1,14 +1,16 @@
-import time
 import os.path as path
 import requests
 import logging
 import threading
+import time
 from .errors import (LoginError,
                      CharmNotFoundError,
-                     RequestTimeout,
                      ServerError,
                      BadResponseError,
+                     ConnectionClosedError,
+                     RequestNotSentError,
                      MacumbaError)
+from .keepalive import Keepalive
 from .ws import JujuWS
 
 log = logging.getLogger('macumba')
@@ -36,11 +38,33 @@ def query_cs(charm):
     return r.json()
 
 
+# Read-only requests that are safe to send again on a new connection when
+# the one they went out on dies before answering.
+IDEMPOTENT_REQUESTS = {
+    ('Client', 'FullStatus'),
+    ('Client', 'ModelInfo'),
+    ('Client', 'ModelGet'),
+    ('Client', 'AgentVersion'),
+    ('Client', 'ResolveCharms'),
+    ('Client', 'GetModelConstraints'),
+    ('ModelManager', 'ListModels'),
+    ('ModelManager', 'ModelInfo'),
+    ('Service', 'Get'),
+    ('Service', 'CharmRelations'),
+    ('Pinger', 'Ping'),
+}
+
+
 class Base:
     """ Base api class
     """
     API_VERSION = None
     FACADE_VERSIONS = {}
+    # seconds between reconnect attempts, doubling up to the maximum
+    RECONNECT_BACKOFF = (0.5, 10)
+    RECONNECT_ATTEMPTS = 8
+    # times a request is sent before its ConnectionClosedError is raised
+    SEND_ATTEMPTS = 3
 
     def __init__(self, url, password, user='user-admin'):
         """ init
@@ -52,6 +76,7 @@ class Base:
         """
         self.url = url
         self.password = password
+        self.keepalive = None
         self.connlock = threading.RLock()
         with self.connlock:
             self.conn = JujuWS(url, password)
@@ -91,19 +116,57 @@ class Base:
 
     def reconnect(self):
         with self.connlock:
-            self.close()
+            try:
+                self.close()
+            except Exception as e:
+                log.debug("closing old connection failed: {}".format(e))
             start_id = self.conn.get_current_request_id() + 1
             self.conn = JujuWS(self.url,
                                self.password,
                                start_reqid=start_id)
             self.login()
 
+    def recover(self, dead_conn):
+        """ Replaces dead_conn with a new logged in connection
+
+        Safe to call from several threads at once, only the first caller
+        reconnects, the others find self.conn already replaced. Retries
+        with exponential backoff and raises ConnectionClosedError when
+        RECONNECT_ATTEMPTS are exhausted.
+        """
+        delay, max_delay = self.RECONNECT_BACKOFF
+        with self.connlock:
+            if self.conn is not dead_conn:
+                return
+            for attempt in range(1, self.RECONNECT_ATTEMPTS + 1):
+                try:
+                    self.reconnect()
+                    log.info("reconnected to {} after {} attempt(s)".format(
+                        self.url, attempt))
+                    return
+                except Exception as e:
+                    log.warning("reconnect attempt {} failed: {}".format(
+                        attempt, e))
+                    time.sleep(delay)
+                    delay = min(delay * 2, max_delay)
+            raise ConnectionClosedError(
+                "unable to reconnect to {}".format(self.url))
+
+    def start_keepalive(self, interval=5, timeout=5):
+        """ Pings the controller in the background, failing over to a new
+        connection when a ping goes unanswered for timeout seconds
+        """
+        if self.keepalive is None:
+            self.keepalive = Keepalive(self, interval, timeout)
+            self.keepalive.start()
+        return self.keepalive
+
     def close(self):
         """ Closes connection to juju websocket """
         with self.connlock:
             self.conn.do_close()
 
-    def receive(self, request_id, timeout=None):
+    def receive(self, request_id, timeout=None, conn=None):
         """receives expected message.
 
         returns parsed response object.
@@ -111,16 +174,14 @@ class Base:
         if timeout is set, raises RequestTimeout after 'timeout' seconds
         with no received message.
 
+        Waits on the reply registered for request_id rather than polling,
+        so any number of callers can have requests in flight on the same
+        socket without contending on connlock.
         """
-        res = None
-        start_time = time.time()
-        while res is None:
+        if conn is None:
             with self.connlock:
-                res = self.conn.do_receive(request_id)
-            if res is None:
-                time.sleep(0.1)
-                if timeout and (time.time() - start_time > timeout):
-                    raise RequestTimeout(request_id)
+                conn = self.conn
+        res = conn.wait_for(request_id, timeout)
 
         if 'Error' in res:
             raise ServerError(res['Error'], res)
@@ -141,7 +202,34 @@ class Base:
         else:
             raise MacumbaError(
                 'Unknown facade type: {}'.format(params['Type']))
-        with self.connlock:
-            req_id = self.conn.do_send(params)
+        return self.send_request(params, timeout)
+
+    def send_request(self, params, timeout=None):
+        """ Sends params and waits for the response
 
-        return self.receive(req_id, timeout)
+        If the connection dies underneath the request it is recovered and
+        the request is sent again on the new connection, up to
+        SEND_ATTEMPTS times. Requests that already went out are only sent
+        again when listed in IDEMPOTENT_REQUESTS, anything else raises
+        ConnectionClosedError since the server may have acted on it.
+        """
+        idempotent = (params['Type'], params['Request']) in \
+            IDEMPOTENT_REQUESTS
+        for attempt in range(1, self.SEND_ATTEMPTS + 1):
+            with self.connlock:
+                conn = self.conn
+            try:
+                req_id = conn.do_send(params)
+            except RequestNotSentError:
+                self.recover(conn)
+                if attempt == self.SEND_ATTEMPTS:
+                    raise
+                continue
+            try:
+                return self.receive(req_id, timeout, conn)
+            except ConnectionClosedError:
+                self.recover(conn)
+                if not idempotent or attempt == self.SEND_ATTEMPTS:
+                    raise
+                log.debug("re-sending {}.{} on new connection".format(
+                    params['Type'], params['Request']))
@@ -0,0 +1,161 @@
+""" asyncio websocket transport for the Juju API
+
+Speaks the same request/response framing as JujuWS but runs entirely on
+the calling asyncio event loop: no ws4py client thread, no polling.
+"""
+
+from ws4py.streaming import Stream
+from ws4py import WS_KEY
+from base64 import b64encode
+from hashlib import sha1
+from urllib.parse import urlsplit
+import asyncio
+import json
+import logging
+import os
+import ssl
+from .errors import ConnectionClosedError, RequestTimeout
+
+log = logging.getLogger('macumba')
+
+
+class AsyncJujuWS:
+
+    def __init__(self, url, start_reqid=1, ssl_context=None):
+        self.url = url
+        self.ssl_context = ssl_context
+        self.messages = {}
+        self.terminated = True
+        self._cur_request_id = start_reqid
+        self._stream = Stream(always_mask=True, expect_masking=False)
+        self._reader = None
+        self._writer = None
+        self._read_task = None
+
+    def get_current_request_id(self):
+        "only intended to pass to constructor of a replacing client"
+        return self._cur_request_id
+
+    def _default_ssl_context(self):
+        # Juju controllers present self-signed certificates, same as the
+        # threaded client which does not verify them either.
+        ctx = ssl.SSLContext(ssl.PROTOCOL_SSLv23)
+        ctx.check_hostname = False
+        ctx.verify_mode = ssl.CERT_NONE
+        return ctx
+
+    async def connect(self):
+        parts = urlsplit(self.url)
+        secure = parts.scheme == 'wss'
+        port = parts.port or (443 if secure else 80)
+        ssl_context = None
+        if secure:
+            ssl_context = self.ssl_context or self._default_ssl_context()
+        self._reader, self._writer = await asyncio.open_connection(
+            parts.hostname, port, ssl=ssl_context)
+
+        key = b64encode(os.urandom(16))
+        resource = parts.path or '/'
+        if parts.query:
+            resource += '?' + parts.query
+        request = ["GET {} HTTP/1.1".format(resource),
+                   "Host: {}:{}".format(parts.hostname, port),
+                   "Connection: Upgrade",
+                   "Upgrade: websocket",
+                   "Sec-WebSocket-Key: {}".format(key.decode('utf-8')),
+                   "Sec-WebSocket-Version: 13",
+                   "Origin: {}://{}:{}".format(parts.scheme, parts.hostname,
+                                               port)]
+        self._writer.write(("\r\n".join(request) + "\r\n\r\n").encode())
+
+        status = await self._reader.readline()
+        if status.split(b' ', 2)[1] != b'101':
+            raise ConnectionClosedError(
+                "websocket handshake failed: {}".format(status.strip()))
+        accept = b64encode(sha1(key + WS_KEY).digest())
+        while True:
+            line = await self._reader.readline()
+            if line in (b'\r\n', b''):
+                break
+            header, value = line.split(b':', 1)
+            if header.strip().lower() == b'sec-websocket-accept' and \
+               value.strip() != accept:
+                raise ConnectionClosedError(
+                    "websocket handshake failed: bad accept key")
+
+        self.terminated = False
+        self._read_task = asyncio.ensure_future(self._read_loop())
+
+    async def _read_loop(self):
+        parser = self._stream.parser
+        needed = next(parser)
+        try:
+            while True:
+                data = await self._reader.readexactly(needed)
+                needed = parser.send(data) or 1
+                s = self._stream
+                if s.closing is not None or s.errors:
+                    break
+                if s.has_message:
+                    self._dispatch(s.message.data)
+                    s.message = None
+                for ping in s.pings:
+                    self._writer.write(s.pong(ping.data))
+                s.pings = []
+                s.pongs = []
+        except (asyncio.IncompleteReadError, ConnectionError) as e:
+            log.debug("async socket read failed: {}".format(e))
+        finally:
+            self._closed()
+
+    def _dispatch(self, data):
+        msg = json.loads(data.decode('utf-8'))
+        future = self.messages.pop(msg['RequestId'], None)
+        if future is None or future.done():
+            log.debug("dropping reply for request {}".format(
+                msg['RequestId']))
+            return
+        future.set_result(msg)
+
+    def _closed(self):
+        self.terminated = True
+        pending, self.messages = self.messages, {}
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(ConnectionClosedError("socket closed"))
+
+    def send(self, json_message):
+        """Sends json_message, returns a future for its reply.
+        """
+        if self.terminated:
+            raise ConnectionClosedError
+        self._cur_request_id += 1
+        json_message['RequestId'] = self._cur_request_id
+        future = asyncio.Future()
+        self.messages[self._cur_request_id] = future
+        frame = self._stream.text_message(json.dumps(json_message))
+        self._writer.write(frame.single(mask=True))
+        return future
+
+    async def request(self, json_message, timeout=None):
+        """Sends json_message and waits for its reply.
+        """
+        future = self.send(json_message)
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            self.messages.pop(json_message['RequestId'], None)
+            raise RequestTimeout(json_message['RequestId'])
+
+    async def close(self):
+        if self._writer is None:
+            return
+        if not self.terminated:
+            try:
+                self._writer.write(self._stream.close(1000).single(mask=True))
+            except ConnectionError:
+                pass
+        self._writer.close()
+        if self._read_task is not None:
+            self._read_task.cancel()
+        self._closed()
@@ -32,6 +32,11 @@ class ConnectionClosedError(MacumbaError):
     "Attempted to receive messages from closed connection"
 
 
+class RequestNotSentError(ConnectionClosedError):
+
+    "Connection closed before the request was written to it"
+
+
 class UnknownRequestError(MacumbaError):
 
     "Attempted to receive a message with an unknown ID"
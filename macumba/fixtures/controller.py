@@ -0,0 +1,433 @@
+""" Fake Juju API controller
+
+A local websocket server speaking the same JSON request/response framing
+as a Juju 2 API server, useful for exercising and benchmarking macumba
+without a real cloud.
+
+SimulatedModel populates a FakeController with applications whose units
+go through the usual states on a schedule, answering FullStatus,
+ModelManager, AllWatcher and Service/Application requests.
+"""
+
+from collections import Counter
+from concurrent.futures import Future
+from wsgiref.simple_server import make_server
+from ws4py.server.wsgirefserver import (WSGIServer,
+                                        WebSocketWSGIRequestHandler)
+from ws4py.server.wsgiutils import WebSocketWSGIApplication
+from ws4py.websocket import WebSocket
+import json
+import logging
+import threading
+import time
+
+log = logging.getLogger('macumba')
+
+
+class FakeJujuSocket(WebSocket):
+    """ Answers each request through the owning FakeController
+    """
+    controller = None
+    send_lock = None
+
+    def _reply(self, reply):
+        with self.send_lock:
+            self.send(json.dumps(reply))
+
+    def received_message(self, m):
+        req = json.loads(m.data.decode('utf-8'))
+        self.controller.requests += 1
+        reply = self.controller.dispatch(req)
+        if reply is None:
+            # dropped on purpose, eg. to simulate a stalled socket
+            return
+        if isinstance(reply, Future):
+            # answered later, eg. a watcher Next waiting for changes
+            reply.add_done_callback(lambda f: self._reply(f.result()))
+            return
+        if not self.controller.latency:
+            self._reply(reply)
+        elif self.controller.concurrent:
+            threading.Timer(self.controller.latency, self._reply,
+                            [reply]).start()
+        else:
+            time.sleep(self.controller.latency)
+            self._reply(reply)
+
+
+class FakeController:
+    """ Runs a fake Juju API endpoint in a background thread
+
+    Handlers are registered per (facade, request) and receive the request
+    params, returning the 'Response' body. Unknown requests answer with an
+    empty response.
+
+    Example:
+    ctrl = FakeController()
+    ctrl.start()
+    j = JujuClient(ctrl.url, 'secret')
+    j.login()
+
+    With concurrent=True replies are delayed by latency independently of
+    each other, like a real controller working on several requests at
+    once; otherwise requests on a connection are answered one by one.
+
+    A handler may return a concurrent.futures.Future to answer later.
+    Handlers registered with raw=True receive the whole request instead
+    of its params, eg. to read the 'Id' of a watcher.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0,
+                 concurrent=False):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.concurrent = concurrent
+        self.requests = 0
+        # (facade, request) -> number of requests
+        self.counts = Counter()
+        self.raw = set()
+        self.handlers = {
+            ('Admin', 'Login'): lambda params: {},
+            ('Pinger', 'Ping'): lambda params: {},
+        }
+        self.server = None
+        self.thread = None
+
+    @property
+    def url(self):
+        return 'ws://{}:{}/model/{}/api'.format(
+            self.host, self.port, '00000000-0000-0000-0000-000000000000')
+
+    def register(self, facade, request, handler, raw=False):
+        self.handlers[(facade, request)] = handler
+        if raw:
+            self.raw.add((facade, request))
+
+    def _wrap(self, req, response):
+        return {'RequestId': req['RequestId'],
+                'Response': response}
+
+    def dispatch(self, req):
+        key = (req.get('Type'), req.get('Request'))
+        self.counts[key] += 1
+        handler = self.handlers.get(key, lambda params: {})
+        try:
+            if key in self.raw:
+                response = handler(req)
+            else:
+                response = handler(req.get('Params', {}))
+        except Exception as e:
+            return {'RequestId': req['RequestId'],
+                    'Error': str(e),
+                    'ErrorCode': ''}
+        if response is None:
+            return None
+        if isinstance(response, Future):
+            reply = Future()
+            response.add_done_callback(
+                lambda f: reply.set_result(self._wrap(req, f.result())))
+            return reply
+        return self._wrap(req, response)
+
+    def start(self):
+        handler_cls = type('BoundFakeJujuSocket', (FakeJujuSocket,),
+                           {'controller': self,
+                            'send_lock': threading.Lock()})
+        self.server = make_server(
+            self.host, self.port,
+            server_class=WSGIServer,
+            handler_class=WebSocketWSGIRequestHandler,
+            app=WebSocketWSGIApplication(handler_cls=handler_cls))
+        self.server.initialize_websockets_manager()
+        self.port = self.server.server_port
+        self.thread = threading.Thread(target=self.server.serve_forever,
+                                       daemon=True)
+        self.thread.start()
+        log.debug("fake controller listening on {}".format(self.url))
+        return self
+
+    def stop(self):
+        if self.server is None:
+            return
+        self.server.shutdown()
+        self.server.server_close()
+        self.server = None
+
+
+# (seconds after the unit is added, agent status, workload status, message)
+DEFAULT_SCHEDULE = [
+    (0, 'allocating', 'waiting', 'waiting for machine'),
+    (2, 'executing', 'maintenance', 'installing charm software'),
+    (5, 'executing', 'waiting', 'waiting for relations'),
+    (6, 'idle', 'active', 'Unit is ready'),
+]
+
+MODEL_UUID = '00000000-0000-0000-0000-000000000000'
+
+
+class SimulatedModel:
+    """ A model whose units go through the states of a schedule
+
+    Every unit gets its own machine. Of the units created up front, unit
+    n starts its schedule n * spread / units seconds after the model is
+    started, so transitions trickle in rather than arriving all at once.
+    Units deployed later start their schedule right away.
+
+    Arguments:
+    applications: number of applications deployed up front
+    units: units per application
+    schedule: [(delay, agent status, workload status, message)]
+    spread: seconds over which unit start times are spread
+    tick: seconds between state updates
+    """
+
+    def __init__(self, applications=10, units=1, schedule=None, spread=0,
+                 tick=0.1, name='default'):
+        self.schedule = schedule or DEFAULT_SCHEDULE
+        self.spread = spread
+        self.tick = tick
+        self.name = name
+        self.lock = threading.RLock()
+        self.started = None
+        self.applications = {}
+        self.units = {}
+        self.machines = {}
+        self.relations = {}
+        # watcher id -> [pending deltas, Future of a waiting Next]
+        self.watchers = {}
+        self._watcher_ids = iter(range(1, 2 ** 31))
+        self._thread = None
+        self._stopped = threading.Event()
+        self._planned = applications * units
+        for n in range(applications):
+            self.add_application('app{}'.format(n), units)
+        for n in range(1, applications):
+            self.add_relation('app{}'.format(n - 1), 'app{}'.format(n))
+
+    def _offset(self):
+        """ When a new unit starts its schedule, relative to start()
+        """
+        if self.started is not None:
+            # deployed while running, starts right away
+            return time.time() - self.started
+        return len(self.units) * self.spread / max(self._planned, 1)
+
+    def add_application(self, name, units=1, charm=None):
+        with self.lock:
+            self.applications[name] = {
+                'Name': name,
+                'CharmURL': charm or 'cs:xenial/{}-1'.format(name),
+                'Status': {'Current': 'waiting', 'Message': ''}}
+            self._emit('service', self.applications[name])
+            self.add_units(name, units)
+
+    def add_units(self, application, count):
+        with self.lock:
+            start = len([u for u in self.units.values()
+                         if u['Service'] == application])
+            for n in range(start, start + count):
+                mid = str(len(self.machines))
+                self.machines[mid] = {
+                    'Id': mid, 'InstanceId': 'juju-{}'.format(mid),
+                    'JujuStatus': {'Current': 'pending', 'Message': ''},
+                    'Addresses': []}
+                name = '{}/{}'.format(application, n)
+                self.units[name] = {
+                    'Name': name, 'Service': application, 'MachineId': mid,
+                    'PublicAddress': '',
+                    'AgentStatus': {'Current': '', 'Message': ''},
+                    'WorkloadStatus': {'Current': 'unknown', 'Message': ''},
+                    '_step': -1, '_offset': self._offset()}
+                self._emit('machine', self.machines[mid])
+                self._emit('unit', self.units[name])
+
+    def add_relation(self, *applications):
+        with self.lock:
+            key = ' '.join('{}:rel'.format(a) for a in applications)
+            self.relations[key] = {
+                'Key': key,
+                'Endpoints': [{'ServiceName': a} for a in applications]}
+            self._emit('relation', self.relations[key])
+
+    def _public(self, data):
+        return {k: v for k, v in data.items() if not k.startswith('_')}
+
+    def _emit(self, entity, data):
+        delta = [entity, 'change', self._public(data)]
+        for watcher in self.watchers.values():
+            watcher[0].append(delta)
+            self._wake(watcher)
+
+    def _wake(self, watcher):
+        if watcher[1] is not None and watcher[0]:
+            future, watcher[1] = watcher[1], None
+            deltas, watcher[0][:] = list(watcher[0]), []
+            future.set_result({'Deltas': deltas})
+
+    def advance(self, now=None):
+        """ Moves every unit to its scheduled state, returns #changes
+        """
+        now = now or time.time()
+        elapsed = now - self.started
+        changes = 0
+        with self.lock:
+            for name, unit in self.units.items():
+                step = unit['_step']
+                while step + 1 < len(self.schedule) and \
+                        unit['_offset'] + self.schedule[step + 1][0] <= \
+                        elapsed:
+                    step += 1
+                if step == unit['_step']:
+                    continue
+                unit['_step'] = step
+                _, agent, workload, message = self.schedule[step]
+                unit['AgentStatus'] = {'Current': agent, 'Message': ''}
+                unit['WorkloadStatus'] = {'Current': workload,
+                                          'Message': message}
+                if step > 0 and not unit['PublicAddress']:
+                    machine = self.machines[unit['MachineId']]
+                    address = '10.0.{}.{}'.format(int(machine['Id']) // 250,
+                                                  int(machine['Id']) % 250 + 2)
+                    unit['PublicAddress'] = address
+                    machine['Addresses'] = [{'Value': address}]
+                    machine['JujuStatus'] = {'Current': 'started',
+                                             'Message': ''}
+                    self._emit('machine', machine)
+                self._emit('unit', unit)
+                changes += 1
+        return changes
+
+    def settled(self):
+        """ True once every unit reached the end of the schedule
+        """
+        with self.lock:
+            last = len(self.schedule) - 1
+            return all(u['_step'] == last for u in self.units.values())
+
+    def _run(self):
+        while not self._stopped.wait(self.tick):
+            self.advance()
+
+    def start(self):
+        self.started = time.time()
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        with self.lock:
+            for watcher in self.watchers.values():
+                if watcher[1] is not None:
+                    watcher[1].set_result({'Deltas': []})
+
+    # api handlers
+    def full_status(self, params):
+        with self.lock:
+            services = {}
+            for name, app in self.applications.items():
+                services[name] = {
+                    'Charm': app['CharmURL'],
+                    'Status': {'Status': app['Status']['Current'],
+                               'Info': app['Status']['Message']},
+                    'Units': {}}
+            for name, u in self.units.items():
+                services[u['Service']]['Units'][name] = {
+                    'WorkloadStatus': {
+                        'Status': u['WorkloadStatus']['Current'],
+                        'Info': u['WorkloadStatus']['Message']},
+                    'AgentStatus': {'Status': u['AgentStatus']['Current'],
+                                    'Info': ''},
+                    'Machine': u['MachineId'],
+                    'PublicAddress': u['PublicAddress']}
+            machines = {}
+            for mid, m in self.machines.items():
+                machines[mid] = {
+                    'Id': mid, 'InstanceId': m['InstanceId'],
+                    'AgentStatus': {'Status': m['JujuStatus']['Current'],
+                                    'Info': ''},
+                    'DNSName': (m['Addresses'] or [{'Value': ''}])[0][
+                        'Value']}
+            relations = [{'Key': key, 'Endpoints': [
+                {'ServiceName': ep['ServiceName']}
+                for ep in rel['Endpoints']]}
+                for key, rel in self.relations.items()]
+            return {'ModelName': self.name, 'Machines': machines,
+                    'Services': services, 'Relations': relations}
+
+    def watch_all(self, params):
+        with self.lock:
+            wid = str(next(self._watcher_ids))
+            # a fresh watcher starts with the whole model
+            deltas = [['service', 'change', self._public(a)]
+                      for a in self.applications.values()]
+            deltas += [['machine', 'change', self._public(m)]
+                       for m in self.machines.values()]
+            deltas += [['unit', 'change', self._public(u)]
+                       for u in self.units.values()]
+            deltas += [['relation', 'change', r]
+                       for r in self.relations.values()]
+            self.watchers[wid] = [deltas, None]
+        return {'AllWatcherId': wid}
+
+    def watcher_next(self, req):
+        with self.lock:
+            watcher = self.watchers.get(req.get('Id'))
+            if watcher is None:
+                raise Exception("unknown watcher {}".format(req.get('Id')))
+            future = Future()
+            watcher[1] = future
+            self._wake(watcher)
+        return future
+
+    def watcher_stop(self, req):
+        with self.lock:
+            watcher = self.watchers.pop(req.get('Id'), None)
+            if watcher is not None and watcher[1] is not None:
+                watcher[1].set_result({'Deltas': []})
+        return {}
+
+    def list_models(self, params):
+        return {'UserModels': [{
+            'Model': {'Name': self.name, 'UUID': MODEL_UUID,
+                      'OwnerTag': params.get('Tag', 'user-admin@local')},
+            'LastConnection': None}]}
+
+    def model_info(self, params):
+        return {'Name': self.name, 'UUID': MODEL_UUID,
+                'ProviderType': 'lxd', 'DefaultSeries': 'xenial'}
+
+    def deploy(self, params):
+        results = []
+        for svc in params.get('Services', params.get('Applications', [])):
+            name = svc.get('ServiceName', svc.get('ApplicationName'))
+            self.add_application(name, svc.get('NumUnits', 0),
+                                 svc.get('CharmUrl'))
+            results.append({})
+        return {'Results': results}
+
+    def add_units_request(self, params):
+        name = params.get('ServiceName', params.get('ApplicationName'))
+        self.add_units(name, params.get('NumUnits', 1))
+        return {}
+
+    def add_relation_request(self, params):
+        self.add_relation(*[ep.split(':')[0] for ep in params['Endpoints']])
+        return {}
+
+    def install(self, ctrl):
+        """ Registers the model's handlers on a FakeController
+        """
+        ctrl.register('Client', 'FullStatus', self.full_status)
+        ctrl.register('Client', 'ModelInfo', self.model_info)
+        ctrl.register('Client', 'WatchAll', self.watch_all)
+        ctrl.register('AllWatcher', 'Next', self.watcher_next, raw=True)
+        ctrl.register('AllWatcher', 'Stop', self.watcher_stop, raw=True)
+        ctrl.register('ModelManager', 'ListModels', self.list_models)
+        for facade in ('Service', 'Application'):
+            ctrl.register(facade, 'Deploy', self.deploy)
+            ctrl.register(facade, 'AddUnits', self.add_units_request)
+            ctrl.register(facade, 'AddRelation', self.add_relation_request)
+        return self
@@ -0,0 +1,70 @@
+""" Connection keepalive for the threaded clients
+
+Juju drops idle API connections and a connection can also die silently
+(suspended laptop, NAT timeout), in which case replies simply never
+arrive. Keepalive pings the controller whenever the connection has been
+quiet for a while and declares it dead when a ping goes unanswered, which
+fails the pending requests at once and has the client reconnect.
+"""
+
+import logging
+import threading
+import time
+from .errors import ConnectionClosedError, RequestTimeout
+
+log = logging.getLogger('macumba')
+
+PING = {'Type': 'Pinger', 'Version': 1, 'Request': 'Ping', 'Params': {}}
+
+
+class Keepalive(threading.Thread):
+    """ Background pinger for a macumba client
+
+    Arguments:
+    client: api.Base instance
+    interval: seconds of silence before a ping is sent
+    timeout: seconds a ping may take before the connection is dead
+    """
+
+    def __init__(self, client, interval=5, timeout=5):
+        super().__init__(name='macumba-keepalive', daemon=True)
+        self.client = client
+        self.interval = interval
+        self.timeout = timeout
+        self.stopped = threading.Event()
+        self.failures = 0
+
+    def stop(self):
+        self.stopped.set()
+
+    def check(self):
+        """ Pings the current connection if it has been quiet
+
+        Returns:
+        True if the connection is alive
+        """
+        with self.client.connlock:
+            conn = self.client.conn
+        if time.time() - conn.last_received < self.interval:
+            return True
+        try:
+            req_id = conn.do_send(dict(PING))
+            conn.wait_for(req_id, self.timeout)
+            return True
+        except RequestTimeout:
+            conn.mark_dead("no ping reply in {}s".format(self.timeout))
+        except ConnectionClosedError:
+            pass
+        self.failures += 1
+        try:
+            self.client.recover(conn)
+        except ConnectionClosedError as e:
+            log.error("keepalive: {}".format(e))
+        return False
+
+    def run(self):
+        while not self.stopped.wait(self.interval / 2):
+            try:
+                self.check()
+            except Exception:
+                log.exception("keepalive check failed")
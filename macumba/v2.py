@@ -1,4 +1,8 @@
 from .api import Base
+from .asyncws import AsyncJujuWS
+from .errors import (LoginError,
+                     ServerError,
+                     BadResponseError)
 
 from functools import partial
 
@@ -105,7 +109,85 @@ class JujuClient(Base):
         Params:
         params: Additional params to be passed into request
         """
-        with self.connlock:
-            req_id = self.conn.do_send(params)
+        return self.send_request(params, timeout)
 
-        return self.receive(req_id, timeout)
+
+class AsyncJujuClient:
+    """ Exposes Juju 2.0 facades as coroutines on the running asyncio loop
+
+    Example:
+    jujuc = AsyncJujuClient(
+        'wss://10.0.3.53:17070/model/e712da7b-6808-49ec-8c90-113b26d1650d/api',
+        'f2cbbb1f163f2ed8725e973e5eeaf51a')
+    await jujuc.login()
+    status = await jujuc.Client(request="FullStatus")
+    """
+    API_VERSION = 2
+
+    def __init__(self, url, password, user='user-admin'):
+        for name, version in _FACADE_VERSIONS.items():
+            setattr(self, name, partial(self._request,
+                                        name_type=name,
+                                        version=version))
+        self.url = url
+        self.password = password
+        self.conn = AsyncJujuWS(url)
+        self.creds = {'Type': 'Admin',
+                      'Version': 3,
+                      'Request': 'Login',
+                      'Params': {'auth-tag': user,
+                                 'credentials': password}}
+
+    async def login(self):
+        """Connect and log in to juju websocket endpoint.
+        """
+        try:
+            await self.conn.connect()
+            res = await self.conn.request(dict(self.creds))
+        except Exception as e:
+            raise LoginError(str(e))
+        if 'Error' in res:
+            raise LoginError(res['ErrorCode'])
+
+    async def reconnect(self):
+        await self.close()
+        start_id = self.conn.get_current_request_id() + 1
+        self.conn = AsyncJujuWS(self.url, start_reqid=start_id)
+        await self.login()
+
+    async def close(self):
+        """ Closes connection to juju websocket """
+        await self.conn.close()
+
+    async def _request(self, name_type, version, request, params=None,
+                       timeout=None, object_id=None):
+        """ Performs a request
+
+            Params:
+            name_type: Facade type
+            version: Facade version
+            request: Name of Juju API call
+            params: Query options to pass to request
+            timeout: seconds to wait for the reply, None waits forever
+            object_id: Id of the facade object, eg. an AllWatcher id
+        """
+        if params is None:
+            params = {}
+
+        if not isinstance(params, dict):
+            raise Exception("Must be a dictionary of query parameters.")
+
+        req = {'Type': name_type,
+               'Version': version,
+               'Request': request,
+               'Params': params}
+        if object_id is not None:
+            req['Id'] = object_id
+        res = await self.conn.request(req, timeout)
+        if 'Error' in res:
+            raise ServerError(res['Error'], res)
+
+        try:
+            return res['Response']
+        except:
+            raise BadResponseError("Failed to parse response: {}".format(res))
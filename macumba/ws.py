@@ -1,8 +1,11 @@
 from ws4py.client.threadedclient import WebSocketClient
+from concurrent.futures import Future, TimeoutError
 import json
 import threading
 import logging
-from .errors import ConnectionClosedError, UnknownRequestError
+import time
+from .errors import (ConnectionClosedError, UnknownRequestError,
+                     RequestNotSentError, RequestTimeout)
 
 log = logging.getLogger('macumba')
 
@@ -17,23 +20,54 @@ class JujuWS(WebSocketClient):
         self.open_done = threading.Event()
         self.rid_lock = threading.RLock()
         self.msglock = threading.RLock()
+        # request id -> Future completed by received_message
         self.messages = {}
         self._cur_request_id = start_reqid
+        self.last_received = time.time()
+        self.dead = False
 
     # WebSocketClient subclass overrides, run in private thread:
     def opened(self):
         self.open_done.set()
 
     def received_message(self, m):
+        self.last_received = time.time()
         msg = json.loads(m.data.decode('utf-8'))
         msg_req_id = msg['RequestId']
+        # checked and completed under msglock, closed() may race us
         with self.msglock:
-            self.messages[msg_req_id] = msg
+            future = self.messages.get(msg_req_id, None)
+            if future is None:
+                log.debug("dropping reply for unknown request {}".format(
+                    msg_req_id))
+                return
+            if not future.done():
+                future.set_result(msg)
 
     def closed(self, code, reason=None):
         log.debug("socket closed: code:{} reason:{}".format(code, reason))
+        with self.msglock:
+            for f in list(self.messages.values()):
+                if not f.done():
+                    f.set_exception(ConnectionClosedError(
+                        "socket closed: code:{} reason:{}".format(code,
+                                                                  reason)))
 
     # actions for users of the class:
+    def mark_dead(self, reason):
+        """Gives up on a stalled socket.
+
+        Fails every pending request with ConnectionClosedError right away
+        instead of leaving them to whatever timeout their callers use.
+        """
+        log.warning("socket marked dead: {}".format(reason))
+        self.dead = True
+        self.closed(1006, reason)
+        try:
+            self.close_connection()
+        except Exception:
+            pass
+
     def get_current_request_id(self):
         "only intended to pass to constructor of a replacing client"
         return self._cur_request_id
@@ -49,19 +83,44 @@ class JujuWS(WebSocketClient):
         return rv
 
     def do_send(self, json_message):
+        """Sends json_message, returns its request id.
+
+        The reply future is registered before the frame goes out so a
+        fast reply can never race ahead of its waiter.
+
+        Raises RequestNotSentError if the socket is already gone or the
+        frame could not be written, the server never saw the request.
+        """
+        if self.terminated or self.dead:
+            raise RequestNotSentError
+
         with self.rid_lock:
             self._cur_request_id += 1
             request_id = self._cur_request_id
 
-        json_message['RequestId'] = request_id
-
-        self.send(json.dumps(json_message))
+            json_message['RequestId'] = request_id
+            with self.msglock:
+                self.messages[request_id] = Future()
 
-        with self.msglock:
-            self.messages[request_id] = None
+            # ws4py does not serialize writers, keep frames whole.
+            try:
+                self.send(json.dumps(json_message))
+            except Exception as e:
+                with self.msglock:
+                    self.messages.pop(request_id, None)
+                raise RequestNotSentError(str(e))
 
         return request_id
 
+    def _future(self, request_id):
+        with self.msglock:
+            if request_id not in self.messages:
+                errmsg = ("{} not in messages. "
+                          "cur = {}".format(request_id,
+                                            self._cur_request_id))
+                raise UnknownRequestError(errmsg)
+            return self.messages[request_id]
+
     def do_receive(self, request_id):
         """Checks for message matching request_id.
 
@@ -74,15 +133,25 @@ class JujuWS(WebSocketClient):
         if self.terminated:
             raise ConnectionClosedError
 
+        future = self._future(request_id)
+        if not future.done():
+            return None
+
         with self.msglock:
-            if request_id not in self.messages:
-                errmsg = ("{} not in messages. "
-                          "cur = {}".format(request_id,
-                                            self._cur_request_id))
-                raise UnknownRequestError(errmsg)
+            del self.messages[request_id]
+        return future.result()
 
-            message = self.messages[request_id]
-            if message is not None:
-                del self.messages[request_id]
+    def wait_for(self, request_id, timeout=None):
+        """Blocks until the reply for request_id arrives.
 
-        return message
+        Raises RequestTimeout after 'timeout' seconds, or
+        ConnectionClosedError if the socket goes away first.
+        """
+        future = self._future(request_id)
+        try:
+            return future.result(timeout)
+        except TimeoutError:
+            raise RequestTimeout(request_id)
+        finally:
+            with self.msglock:
+                self.messages.pop(request_id, None)
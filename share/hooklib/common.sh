@@ -23,6 +23,59 @@ info() {
     logger -t "$name" "[INFO] $@"
 }
 
+# Prints model status as json
+#
+# Reads the snapshot conjure-up keeps in $CONJURE_STATUS_FILE while it
+# runs, falling back to juju status when there is none.
+jujuStatus()
+{
+    if [ -n "$CONJURE_STATUS_FILE" ] && [ -f "$CONJURE_STATUS_FILE" ]; then
+        cat "$CONJURE_STATUS_FILE"
+    else
+        juju status --format json
+    fi
+}
+
+# Blocks until a jq filter on the model status yields a value
+#
+# Arguments:
+# $1: jq filter, ie. '.services["mysql"]["units"]["mysql/0"]["public-address"]'
+# $2: expected value, if omitted any value but null/empty will do
+# $3: timeout in seconds, defaults to waiting forever
+#
+# Returns:
+# 0 once the condition holds, 1 on timeout
+waitUntil()
+{
+    filter=$1
+    expected=$2
+    timeout=${3:-0}
+    start=$(date +%s)
+    while :; do
+        value=$(jujuStatus | jq -r "$filter")
+        if [ -n "$expected" ]; then
+            [ "$value" = "$expected" ] && return 0
+        elif [ -n "$value" ] && [ "$value" != null ]; then
+            return 0
+        fi
+        if [ "$timeout" -gt 0 ] && \
+               [ $(($(date +%s) - start)) -ge "$timeout" ]; then
+            return 1
+        fi
+        if [ -n "$CONJURE_STATUS_FILE" ] && [ -f "$CONJURE_STATUS_FILE" ]; then
+            # the snapshot is renamed into place on every model change
+            if command -v inotifywait >/dev/null; then
+                inotifywait -qq -t 5 -e moved_to -e close_write \
+                            "$(dirname "$CONJURE_STATUS_FILE")" || true
+            else
+                sleep 0.5
+            fi
+        else
+            sleep 5
+        fi
+    done
+}
+
 # Gets current juju state for machine
 #
 # Arguments:
@@ -32,7 +85,7 @@ info() {
 # machine status
 agentState()
 {
-    juju status --format json | jq ".machines[\"$1\"][\"juju-status\"][\"current\"]"
+    jujuStatus | jq ".machines[\"$1\"][\"juju-status\"][\"current\"]"
 }
 
 # Gets current workload state for service
@@ -45,7 +98,7 @@ agentState()
 # unit status
 agentStateUnit()
 {
-    juju status --format json | jq ".services[\"$1\"][\"units\"][\"$1/$2\"][\"workload-status\"][\"current\"]"
+    jujuStatus | jq ".services[\"$1\"][\"units\"][\"$1/$2\"][\"workload-status\"][\"current\"]"
 }
 
 # Exports the variables required for communicating with your cloud.
@@ -75,7 +128,7 @@ configOpenrc()
 # IP Address of unit
 unitAddress()
 {
-    juju status --format json | jq -r ".services[\"$1\"][\"units\"][\"$1/$2\"][\"public-address\"]"
+    jujuStatus | jq -r ".services[\"$1\"][\"units\"][\"$1/$2\"][\"public-address\"]"
 }
 
 # Get status of unit
@@ -88,7 +141,7 @@ unitAddress()
 # String of status
 unitStatus()
 {
-    juju status --format json | jq -r ".services[\"$1\"][\"units\"][\"$1/$2\"][\"workload-status\"][\"current\"]"
+    jujuStatus | jq -r ".services[\"$1\"][\"units\"][\"$1/$2\"][\"workload-status\"][\"current\"]"
 }
 
 # Get machine for unit, ie 0/lxc/1
@@ -101,7 +154,7 @@ unitStatus()
 # machine identifier
 unitMachine()
 {
-    juju status --format json | jq -r ".services[\"$1\"][\"units\"][\"$1/$2\"][\"machine\"]"
+    jujuStatus | jq -r ".services[\"$1\"][\"units\"][\"$1/$2\"][\"machine\"]"
 }
 
 # Waits for machine to start
@@ -111,9 +164,7 @@ unitMachine()
 waitForMachine()
 {
     for machine; do
-        while [ "$(agentState $machine)" != started ]; do
-            sleep 5
-        done
+        waitUntil ".machines[\"$machine\"][\"juju-status\"][\"current\"]" started
     done
 }
 
@@ -125,9 +176,7 @@ waitForService()
 {
 
     for service; do
-        while [ "$(agentStateUnit "$service" 0)" != active ]; do
-            sleep 5
-        done
+        waitUntil ".services[\"$service\"][\"units\"][\"$service/0\"][\"workload-status\"][\"current\"]" active
     done
 }
 
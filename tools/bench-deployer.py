@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+#
+# bench-deployer - compares the dependency ordered BundleDeployer with
+#                  running the same api steps one after another, the way
+#                  `juju deploy` works through a bundle, against a local
+#                  fake controller.
+#
+# Usage:
+#   tools/bench-deployer.py [-s SERVICES] [-u UNITS] [-l LATENCY_MS]
+
+import argparse
+import itertools
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from macumba.fixtures.controller import FakeController  # noqa
+from macumba.v2 import JujuClient  # noqa
+from conjure.deployer import BundleDeployer  # noqa
+
+
+def make_bundle(services, units):
+    machines = {}
+    svcs = {}
+    mids = itertools.count(1)
+    for n in range(services):
+        to = []
+        for _ in range(units):
+            mid = next(mids)
+            machines[mid] = {'constraints': 'mem=2G tags=bench'}
+            to.append(str(mid) if n % 2 else "lxd:{}".format(mid))
+        svcs['svc{}'.format(n)] = {'charm': 'cs:xenial/charm{}'.format(n),
+                                   'num_units': units, 'to': to,
+                                   'options': {'n': n}}
+    relations = [['svc{}:db'.format(n), 'svc{}:db'.format(n + 1)]
+                 for n in range(services - 1)]
+    return {'series': 'xenial', 'machines': machines, 'services': svcs,
+            'relations': relations}
+
+
+def register(ctrl):
+    ctrl.register('Client', 'ResolveCharms', lambda p: {
+        'URLs': [{'URL': c + '-1'} for c in p['References']]})
+    ctrl.register('Client', 'AddMachines', lambda p: {
+        'Machines': [{'Machine': str(i)}
+                     for i in range(len(p['MachineParams']))]})
+
+
+def serial(deployer):
+    """ Runs the steps one at a time in dependency order """
+    deployer.started = time.time()
+    done = set()
+    while len(done) < len(deployer.steps):
+        for step in sorted(deployer.steps.values(), key=lambda s: s.name):
+            if step.name not in done and step.deps <= done:
+                deployer._run_step(step)
+                done.add(step.name)
+    return deployer.timings()
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='bench-deployer')
+    parser.add_argument('-s', '--services', type=int, default=30)
+    parser.add_argument('-u', '--units', type=int, default=3)
+    parser.add_argument('-l', '--latency', type=float, default=50,
+                        help='Per request controller latency in ms')
+    opts = parser.parse_args()
+
+    ctrl = FakeController(latency=opts.latency / 1000.0,
+                          concurrent=True).start()
+    register(ctrl)
+    client = JujuClient(ctrl.url, 'secret')
+    client.login()
+    bundle = make_bundle(opts.services, opts.units)
+
+    for name, run in [('serial', serial),
+                      ('dag', lambda d: d.run())]:
+        before = ctrl.requests
+        deployer = BundleDeployer(client, bundle)
+        timings = run(deployer)
+        print("{:>6}: {} steps, {} requests, total {:.2f}s, first deploy "
+              "call {:.2f}s".format(name, len(deployer.steps),
+                                    ctrl.requests - before, timings['total'],
+                                    timings['first_deploy_call']))
+    client.close()
+    ctrl.stop()
+
+
+if __name__ == "__main__":
+    main()
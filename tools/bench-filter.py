@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+#
+# bench-filter - times filtering generated MAAS inventories by
+#                constraints.
+#
+# Compares evaluating satisfies() per machine, as MachinesList.update did
+# on every refresh, with compiling the constraints once and selecting
+# from a NodeIndex, and the per node constraint string filter MaasState
+# used with MaasState._filter_nodes on an indexed inventory.
+#
+# Usage:
+#   tools/bench-filter.py [-n 500,5000,20000] [-r ROUNDS]
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from bundleplacer.maas import MaasMachine, MaasState, satisfies  # noqa
+from bundleplacer.nodeindex import Constraints, NodeIndex  # noqa
+from bundleplacer.utils import human_to_mb  # noqa
+
+CONSTRAINTS = {'mem': '8G', 'cpu_cores': 4, 'root-disk': '100G',
+               'arch': 'amd64/generic'}
+CONSTRAINT_STRING = 'arch=amd64 tags=ssd,fast'
+
+
+def make_nodes(count, rnd):
+    return [{'hostname': 'node-{}.maas'.format(n),
+             'architecture': rnd.choice(['amd64/generic', 'amd64/generic',
+                                         'arm64/generic']),
+             'memory': rnd.choice([4096, 8192, 16384, 65536]),
+             'cpu_count': rnd.choice([2, 4, 8, 24]),
+             'storage': rnd.choice([51200, 102400, 512000]),
+             'tag_names': rnd.sample(['ssd', 'fast', 'gpu', 'virtual'],
+                                     rnd.randrange(4)),
+             'zone': {'name': 'zone-{}'.format(n % 3)},
+             'status': 4} for n in range(count)]
+
+
+def satisfies_per_machine(machines, constraints):
+    """ satisfies() as it parsed constraint values for every machine """
+    kmap = dict(mem='memory', arch='architecture', storage='storage',
+                cpu_cores='cpu_count')
+    kmap['root-disk'] = 'storage'
+    matching = []
+    for machine in machines:
+        failed = []
+        for k, v in constraints.items():
+            mval = machine.machine[kmap[k]]
+            if k == 'arch':
+                if mval != '*' and mval != v:
+                    failed.append(k)
+                continue
+            if mval == '*':
+                continue
+            if not str(v).isdecimal():
+                v = human_to_mb(v)
+            if mval < v:
+                failed.append(k)
+        if not failed:
+            matching.append(machine)
+    return matching
+
+
+def filter_per_node(nodes, constraints):
+    """ MaasState._filter_nodes as it split the string per call and
+    built tag sets per node """
+    cd = dict(x.split('=') for x in constraints.split(' '))
+    arch = cd.get('arch', None)
+    tagstr = cd.get('tags', None)
+    matching = []
+    for n in nodes:
+        if arch and n['architecture'].split('/')[0] != arch:
+            continue
+        if tagstr and not set(tagstr.split(',')).issubset(
+                set(n['tag_names'])):
+            continue
+        matching.append(n)
+    return matching
+
+
+def timed(fn, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        result = fn()
+    return (time.perf_counter() - start) / rounds, result
+
+
+class Client:
+    server_hostname = 'bench.maas'
+
+    def __init__(self, nodes):
+        self.nodes = nodes
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='bench-filter')
+    parser.add_argument('-n', '--nodes', default='500,5000,20000',
+                        help='Comma separated inventory sizes')
+    parser.add_argument('-r', '--rounds', type=int, default=5)
+    opts = parser.parse_args()
+
+    compiled = Constraints.from_dict(CONSTRAINTS)
+    print("{:>7} {:>24} {:>10} {:>9}".format(
+        'nodes', 'filter', 'time', 'matching'))
+    for count in [int(n) for n in opts.nodes.split(',')]:
+        nodes = make_nodes(count, random.Random(count))
+        machines = [MaasMachine(-1, n) for n in nodes]
+        state = MaasState(Client(nodes))
+        rows = []
+        rows.append(('satisfies() per machine',) + timed(
+            lambda: satisfies_per_machine(machines, CONSTRAINTS),
+            opts.rounds))
+        rows.append(('satisfies() compiled',) + timed(
+            lambda: [m for m in machines if satisfies(m, compiled)[0]],
+            opts.rounds))
+        rows.append(('NodeIndex build',) + timed(
+            lambda: NodeIndex(nodes), opts.rounds))
+        index = NodeIndex(nodes)
+        rows.append(('NodeIndex.select',) + timed(
+            lambda: index.select(compiled), opts.rounds))
+        rows.append(('string filter per node',) + timed(
+            lambda: filter_per_node(nodes, CONSTRAINT_STRING),
+            opts.rounds))
+        state._filter_nodes(nodes, CONSTRAINT_STRING)
+        rows.append(('MaasState._filter_nodes',) + timed(
+            lambda: state._filter_nodes(nodes, CONSTRAINT_STRING),
+            opts.rounds))
+        for name, elapsed, result in rows:
+            print("{:>7} {:>24} {:>8.2f}ms {:>9}".format(
+                count, name, elapsed * 1000,
+                len(result) if isinstance(result, list) else '-'))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+#
+# bench-macumba-async - compares the threaded JujuClient with the asyncio
+#                       AsyncJujuClient against a local fake controller.
+#
+# Reports calls per second and the number of threads each client needs
+# while serving the same concurrent workload.
+#
+# Usage:
+#   tools/bench-macumba-async.py [-n CALLS] [-c CONCURRENCY]
+
+import argparse
+import asyncio
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from macumba.fixtures.controller import FakeController  # noqa
+from macumba.v2 import JujuClient, AsyncJujuClient  # noqa
+
+
+def bench_threaded(url, calls, concurrency):
+    base_threads = threading.active_count()
+    client = JujuClient(url, 'secret')
+    client.login()
+    peak = [0]
+
+    def one_call(_):
+        client.Client(request="FullStatus")
+        peak[0] = max(peak[0], threading.active_count())
+
+    start = time.time()
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(one_call, range(calls)))
+    elapsed = time.time() - start
+    client.close()
+    return elapsed, max(0, peak[0] - base_threads)
+
+
+def bench_async(url, calls, concurrency):
+    base_threads = threading.active_count()
+    loop = asyncio.get_event_loop()
+    peak = [0]
+
+    async def run():
+        client = AsyncJujuClient(url, 'secret')
+        await client.login()
+        sem = asyncio.Semaphore(concurrency)
+
+        async def one_call():
+            async with sem:
+                await client.Client(request="FullStatus")
+                peak[0] = max(peak[0], threading.active_count())
+
+        start = time.time()
+        await asyncio.gather(*[one_call() for _ in range(calls)])
+        elapsed = time.time() - start
+        await client.close()
+        return elapsed
+
+    elapsed = loop.run_until_complete(run())
+    return elapsed, max(0, peak[0] - base_threads)
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='bench-macumba-async')
+    parser.add_argument('-n', '--calls', type=int, default=2000)
+    parser.add_argument('-c', '--concurrency', type=int, default=16)
+    opts = parser.parse_args()
+
+    ctrl = FakeController().start()
+    ctrl.register('Client', 'FullStatus',
+                  lambda params: {'Services': {}, 'Machines': {}})
+
+    for name, bench in [('threaded', bench_threaded),
+                        ('asyncio', bench_async)]:
+        elapsed, threads = bench(ctrl.url, opts.calls, opts.concurrency)
+        print("{:>9}: {} calls in {:.2f}s, {:.0f} calls/s, "
+              "{} extra threads".format(name, opts.calls, elapsed,
+                                        opts.calls / elapsed, threads))
+    ctrl.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+#
+# bench-macumba - measures macumba API round trip latency and throughput
+#                 against a local fake controller.
+#
+# Usage:
+#   tools/bench-macumba.py [-n CALLS] [-t THREADS] [--poll]
+#
+# --poll reproduces the old receive loop (do_receive + 100ms sleep) for
+# comparison with the event driven reply dispatch.
+
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from macumba.fixtures.controller import FakeController  # noqa
+from macumba.v2 import JujuClient  # noqa
+
+
+def polling_call(client, params):
+    """ Pre event-dispatch behaviour of Base.call/receive """
+    with client.connlock:
+        req_id = client.conn.do_send(params)
+    res = None
+    while res is None:
+        with client.connlock:
+            res = client.conn.do_receive(req_id)
+        if res is None:
+            time.sleep(0.1)
+    return res['Response']
+
+
+def run(opts):
+    ctrl = FakeController().start()
+    ctrl.register('Client', 'FullStatus',
+                  lambda params: {'Services': {}, 'Machines': {}})
+    client = JujuClient(ctrl.url, 'secret')
+    client.login()
+
+    def one_call():
+        start = time.time()
+        if opts.poll:
+            polling_call(client, {'Type': 'Client', 'Version': 1,
+                                  'Request': 'FullStatus', 'Params': {}})
+        else:
+            client.Client(request="FullStatus")
+        return time.time() - start
+
+    latencies = [one_call() for _ in range(opts.calls)]
+    print("sequential: {} calls, mean {:.2f}ms, p50 {:.2f}ms, "
+          "max {:.2f}ms".format(len(latencies),
+                                statistics.mean(latencies) * 1000,
+                                statistics.median(latencies) * 1000,
+                                max(latencies) * 1000))
+
+    start = time.time()
+    with ThreadPoolExecutor(opts.threads) as pool:
+        list(pool.map(lambda _: one_call(), range(opts.calls)))
+    elapsed = time.time() - start
+    print("concurrent: {} calls on {} threads in {:.2f}s, "
+          "{:.0f} calls/s".format(opts.calls, opts.threads, elapsed,
+                                  opts.calls / elapsed))
+    print("threads alive: {}".format(threading.active_count()))
+
+    client.close()
+    ctrl.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='bench-macumba')
+    parser.add_argument('-n', '--calls', type=int, default=200)
+    parser.add_argument('-t', '--threads', type=int, default=8)
+    parser.add_argument('--poll', action='store_true',
+                        help='Use the legacy polling receive loop')
+    run(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+#
+# bench-placement - measures how responsive the bundle editor is with many
+#                   machines and services.
+#
+# Builds a bundle of services and a saved placement spreading their units
+# over placeholder machines, then times what the editor does: loading the
+# placement, the queries the service and machine columns make per update,
+# assigning and unassigning a unit (one keypress each), a cancellable
+# edit like a placement dialog makes and a full PlacementView update in
+# the placement editor.
+#
+# Usage:
+#   tools/bench-placement.py [-m MACHINES] [-s SERVICES] [-u UNITS]
+#                            [-r ROUNDS] [--no-view]
+
+import argparse
+import io
+import os
+import sys
+import tempfile
+import time
+
+import yaml
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from bundleplacer.assignmenttype import AssignmentType  # noqa
+from bundleplacer.config import Config  # noqa
+from bundleplacer.controller import PlacementController  # noqa
+
+ATYPES = [AssignmentType.LXD, AssignmentType.KVM, AssignmentType.BareMetal]
+
+
+def make_bundle(path, services, units):
+    bundle = {'series': 'xenial', 'services': {}, 'relations': []}
+    for n in range(services):
+        bundle['services']['svc{}'.format(n)] = {
+            'charm': 'cs:xenial/svc{}'.format(n), 'num_units': units}
+    with open(path, 'w') as fp:
+        yaml.safe_dump(bundle, fp)
+
+
+def make_placement(machines, services, units):
+    """ A saved placement as written by PlacementController.save """
+    placement = {}
+    for n in range(machines):
+        placement['machine-{}'.format(n)] = {
+            'assignments': {},
+            'constraints': {'arch': 'amd64', 'cpu_count': 4,
+                            'cpu_cores': 4, 'mem': 8192, 'memory': 8192,
+                            'storage': 100}}
+    for n in range(services):
+        for u in range(units):
+            iid = 'machine-{}'.format((n * units + u) % machines)
+            atype = ATYPES[(n + u) % len(ATYPES)].name
+            placement[iid]['assignments'].setdefault(atype, []).append(
+                'svc{}'.format(n))
+    return yaml.dump(placement)
+
+
+def timed(fn, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        fn()
+    return (time.perf_counter() - start) / rounds
+
+
+def columns_update(pc):
+    """ The controller queries behind one PlacementView.update """
+    machines = pc.machines()
+    for s in pc.services():
+        pc.get_service_state(s)
+        pc.get_assignments(s)
+        pc.get_deployments(s)
+        pc.is_assigned(s)
+    for m in machines:
+        pc.assignments_for_machine(m)
+    pc.unassigned_undeployed_services()
+    pc.can_deploy()
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='bench-placement')
+    parser.add_argument('-m', '--machines', type=int, default=1000)
+    parser.add_argument('-s', '--services', type=int, default=200)
+    parser.add_argument('-u', '--units', type=int, default=3,
+                        help='Units placed per service')
+    parser.add_argument('-r', '--rounds', type=int, default=5)
+    parser.add_argument('--no-view', action='store_false', dest='view',
+                        help='Skip timing the urwid PlacementView')
+    opts = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench-placement-')
+    os.environ['CONJURE_CHARMSTORE'] = workdir
+    bundle = os.path.join(workdir, 'bundle.yaml')
+    make_bundle(bundle, opts.services, opts.units)
+    saved = make_placement(opts.machines, opts.services, opts.units)
+    config = Config('bench-placement', {'bundle_filename': bundle,
+                                        'metadata_filename': None,
+                                        'provider_type': 'maas'})
+
+    results = []
+    start = time.perf_counter()
+    pc = PlacementController(config=config)
+    pc.load(io.StringIO(saved))
+    results.append(('load', time.perf_counter() - start))
+
+    services = pc.services()
+    machines = pc.machines(include_placeholders=False)
+    target = machines[-1]
+
+    results.append(('services()', timed(pc.services, opts.rounds)))
+    results.append(('reset_assigned_deployed',
+                    timed(pc.reset_assigned_deployed, opts.rounds)))
+    results.append(('is_assigned_to (all pairs / 100)', timed(
+        lambda: [pc.is_assigned_to(s, m)
+                 for s in services for m in machines[::100]],
+        opts.rounds)))
+    results.append(('columns update',
+                    timed(lambda: columns_update(pc), opts.rounds)))
+
+    def keypress():
+        pc.assign(target, services[0], AssignmentType.LXD)
+        pc.remove_one_assignment(target, services[0])
+    results.append(('assign + unassign', timed(keypress, opts.rounds)))
+
+    def dialog():
+        temp = pc.get_temp_copy()
+        temp.assign(target, services[0], AssignmentType.KVM)
+        pc.update_from_controller(temp)
+        pc.remove_one_assignment(target, services[0])
+    results.append(('get_temp_copy + commit', timed(dialog, opts.rounds)))
+
+    def cancelled():
+        pc.begin()
+        pc.clear_assignments(target)
+        pc.rollback()
+    results.append(('begin + clear + rollback',
+                    timed(cancelled, opts.rounds)))
+    results.append(('save', timed(lambda: pc.save(io.StringIO()),
+                                  opts.rounds)))
+
+    if opts.view:
+        from bundleplacer.placerview import PlacerView
+        from ubuntui.ev import EventLoop
+
+        class Loop:
+            def set_alarm_in(self, interval, cb):
+                return None
+        EventLoop.loop = Loop()
+        view = PlacerView(pc, config, lambda: None)
+        view.pv.edit_placement()
+        results.append(('PlacementView.update',
+                        timed(view.pv.update, opts.rounds)))
+
+    print("{} machines, {} services, {} units each".format(
+        opts.machines, opts.services, opts.units))
+    for name, elapsed in results:
+        print("  {:<34} {:>10.2f}ms".format(name, elapsed * 1000))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+#
+# bench-solver - compares the auto-placement strategies on generated MAAS
+#                inventories.
+#
+# Generates machines of a few hardware sizes spread over zones and a set
+# of isolated services with constraints, dependencies and conflicts, then
+# solves the placement with every strategy in bundleplacer.solver and
+# with the linear satisfies() scan gen_defaults used before. Reports the
+# solve time, units placed, services left unplaced, the memory left idle
+# per unit on the machines used and how many zones the services with
+# several units were spread over.
+#
+# Usage:
+#   tools/bench-solver.py [-n 500,2000,5000] [-s SERVICES] [-z ZONES]
+#                         [--seed SEED]
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from bundleplacer.maas import MaasMachine, satisfies  # noqa
+from bundleplacer.service import Service  # noqa
+from bundleplacer.solver import (Demand, Node, STRATEGIES,  # noqa
+                                 get_solver)
+
+# (memory MB, cores, storage MB, share of the inventory)
+SIZES = [(4096, 2, 102400, 0.4), (16384, 8, 512000, 0.35),
+         (65536, 24, 2048000, 0.2), (262144, 48, 4096000, 0.05)]
+
+
+def pick_size(rnd):
+    r = rnd.random()
+    for size in SIZES:
+        r -= size[3]
+        if r < 0:
+            break
+    return size
+
+
+def make_nodes(count, zones, rnd):
+    nodes = []
+    for n in range(count):
+        mem, cores, storage, _ = pick_size(rnd)
+        nodes.append({
+            'hostname': 'node-{}.maas'.format(n),
+            'system_id': 'node-{}'.format(n),
+            'resource_uri': '/MAAS/api/1.0/nodes/node-{}/'.format(n),
+            'architecture': 'arm64/generic' if n % 20 == 19
+            else 'amd64/generic',
+            'memory': mem, 'cpu_count': cores, 'storage': storage,
+            'zone': {'name': 'zone-{}'.format(n % zones)},
+            'status': 4, 'tag_names': []})
+    return nodes
+
+
+def make_services(count, rnd):
+    services = []
+    for n in range(count):
+        mem, cores, storage, _ = rnd.choice(SIZES)
+        constraints = {'mem': '{}M'.format(mem // rnd.choice([1, 2, 4])),
+                       'cpu_cores': max(1, cores // rnd.choice([1, 2]))}
+        if n % 15 == 0:
+            constraints['arch'] = 'arm64'
+        depends = ['svc{}'.format(n - 1)] if n % 10 == 9 else []
+        conflicts = ['svc{}'.format(n - 1)] if n % 25 == 24 else []
+        units = rnd.choice([1, 1, 3, 3, 5])
+        services.append(Service(
+            service_name='svc{}'.format(n),
+            charm_source='cs:xenial/svc{}-1'.format(n),
+            summary_future=None, constraints=constraints, depends=depends,
+            conflicts=conflicts, allowed_assignment_types=[],
+            num_units=units, options={}, allow_multi_units=n % 7 != 0,
+            subordinate=False, required=True, relations=[]))
+    return services
+
+
+def legacy(machines, services):
+    """ The first fit scan gen_defaults did before the solvers """
+    machines = list(machines)
+    placed = []
+
+    def satisfying_machine(constraints):
+        for machine in machines:
+            if satisfies(machine, constraints)[0]:
+                machines.remove(machine)
+                return machine
+        return None
+
+    for service in services:
+        for n in range(service.required_num_units()):
+            m = satisfying_machine(service.constraints)
+            if m:
+                placed.append((m, service))
+    return placed
+
+
+def report(name, elapsed, units, services):
+    idle = 0
+    zones = {}
+    for machine, service in units:
+        node = Node(0, machine)
+        idle += node.mem - Demand(service.constraints).mem
+        zones.setdefault(service, set()).add(node.zone)
+    spread = [len(z) for s, z in zones.items()
+              if s.required_num_units() > 1]
+    unplaced = len(services) - len(zones)
+    print("  {:<22} {:>9.1f}ms {:>7} {:>9} {:>10.1f}GB {:>7.2f}".format(
+        name, elapsed * 1000, len(units), unplaced,
+        idle / 1024.0 / max(len(units), 1),
+        sum(spread) / max(len(spread), 1)))
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='bench-solver')
+    parser.add_argument('-n', '--nodes', default='500,2000,5000',
+                        help='Comma separated inventory sizes')
+    parser.add_argument('-s', '--services', type=int, default=200)
+    parser.add_argument('-z', '--zones', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=1)
+    opts = parser.parse_args()
+
+    for count in [int(n) for n in opts.nodes.split(',')]:
+        rnd = random.Random(opts.seed)
+        machines = [MaasMachine(-1, n)
+                    for n in make_nodes(count, opts.zones, rnd)]
+        services = make_services(opts.services, rnd)
+        print("{} machines in {} zones, {} services, {} units".format(
+            count, opts.zones, len(services),
+            sum(s.required_num_units() for s in services)))
+        print("  {:<22} {:>11} {:>7} {:>9} {:>12} {:>7}".format(
+            'strategy', 'solve', 'units', 'unplaced', 'idle/unit',
+            'zones'))
+
+        start = time.perf_counter()
+        units = legacy(machines, services)
+        report('satisfies() scan', time.perf_counter() - start, units,
+               services)
+        for name in STRATEGIES:
+            start = time.perf_counter()
+            solution = get_solver(name, machines).solve(services)
+            report(name, time.perf_counter() - start, solution.units,
+                   services)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+#
+# bench-startup - times the startup path of conjure-up against a fake juju
+#                 CLI and a fake controller, counting the processes each
+#                 flow spawns.
+#
+# Flows:
+#   import          importing conjure.app
+#   main            conjure.app.main until the welcome screen is drawn
+#   jujucontroller  JujuControllerController.render, listing models
+#   deploy          DeployController.render, up to the bundle editor
+#
+# The first round of a flow starts with empty caches, later rounds reuse
+# them. With --check the tool exits non-zero when a flow spawns more
+# processes than BUDGET allows, so startup regressions fail loudly.
+#
+# Usage:
+#   tools/bench-startup.py [-c CONTROLLERS] [-l LATENCY_MS] [-r ROUNDS]
+#                          [--no-stores] [--check]
+
+import argparse
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import urwid
+import yaml
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from conjure.fixtures.fakejuju import FakeJuju  # noqa
+from macumba.fixtures.controller import FakeController  # noqa
+from macumba.v2 import JujuClient  # noqa
+
+# most processes a cold run of a flow may spawn, with and without the
+# juju client stores, as (fixed, per controller)
+BUDGET = {
+    'stores': {'import': (0, 0), 'main': (1, 0),
+               'jujucontroller': (0, 1), 'deploy': (1, 0)},
+    'cli': {'import': (0, 0), 'main': (2, 0),
+            'jujucontroller': (1, 2), 'deploy': (2, 0)},
+}
+
+
+class CountingPopen(subprocess.Popen):
+    """ Counts every process started through subprocess or asyncio """
+    spawned = 0
+
+    def __init__(self, *args, **kwargs):
+        CountingPopen.spawned += 1
+        super().__init__(*args, **kwargs)
+
+
+class HeadlessScreen(urwid.BaseScreen):
+    """ Renders canvases like a terminal would, without one """
+
+    def __init__(self, cols=160, rows=50):
+        super().__init__()
+        self.size = (cols, rows)
+
+    def set_terminal_properties(self, *args, **kwargs):
+        pass
+
+    def reset_default_terminal_palette(self, *args):
+        pass
+
+    def get_cols_rows(self):
+        return self.size
+
+    def hook_event_loop(self, event_loop, callback):
+        pass
+
+    def unhook_event_loop(self, event_loop):
+        pass
+
+    def draw_screen(self, size, canvas):
+        for _ in canvas.content():
+            pass
+
+
+def make_spell(path, services):
+    """ Writes a spell with a local bundle of services to path """
+    os.makedirs(path)
+    bundle = {'series': 'xenial', 'services': {}, 'relations': []}
+    for n in range(services):
+        bundle['services']['svc{}'.format(n)] = {
+            'charm': 'cs:xenial/svc{}'.format(n), 'num_units': 1}
+        if n:
+            bundle['relations'].append(['svc{}:db'.format(n - 1),
+                                        'svc{}:db'.format(n)])
+    with open(os.path.join(path, 'bundle.yaml'), 'w') as fp:
+        yaml.safe_dump(bundle, fp)
+    config = {'name': 'bench', 'summary': 'Startup benchmark',
+              'excerpt': 'A spell for bench-startup',
+              'bundles': [{'key': 'bench', 'name': 'bench',
+                           'summary': 'Bench bundle',
+                           'location': os.path.join(path, 'bundle.yaml')}]}
+    with open(os.path.join(path, 'config.json'), 'w') as fp:
+        json.dump(config, fp)
+    with open(os.path.join(path, 'metadata.json'), 'w') as fp:
+        json.dump({}, fp)
+    return config['bundles'][0]
+
+
+def clear_caches():
+    from conjure import juju
+    juju.query_cache.invalidate()
+    with juju._config_cache_lock:
+        juju._config_cache.clear()
+    juju.connections.close_all()
+    # the registry refuses new connections once closed, reopen it
+    juju.connections._closed = False
+    juju.Juju.is_authenticated = False
+
+
+def render_models(controller):
+    """ JujuControllerController.render until the model list is shown
+    """
+    shown = threading.Event()
+    show = controller._render_models
+
+    def _render_models(models):
+        show(models)
+        shown.set()
+    controller._render_models = _render_models
+    try:
+        controller.render()
+        shown.wait()
+    finally:
+        del controller._render_models
+
+
+def measure(fake, fn):
+    fake.reset()
+    before = CountingPopen.spawned
+    start = time.time()
+    fn()
+    elapsed = time.time() - start
+    return elapsed, CountingPopen.spawned - before, fake.spawns()
+
+
+def run_main(spell):
+    """ conjure.app.main until the welcome screen has been drawn
+
+    Returns:
+    the Application
+    """
+    from conjure import app as conjure_app
+    from ubuntui.ev import EventLoop
+
+    started = {}
+    _start = conjure_app.Application._start
+
+    def first_render(self, *args):
+        started['app'] = self
+        _start(self, *args)
+        EventLoop.set_alarm_in(0, lambda *args: EventLoop.exit(0))
+
+    conjure_app.Application._start = first_render
+    argv = sys.argv
+    sys.argv = ['conjure-up', spell]
+    try:
+        conjure_app.main()
+    finally:
+        sys.argv = argv
+        conjure_app.Application._start = _start
+    return started['app']
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='bench-startup')
+    parser.add_argument('-c', '--controllers', type=int, default=3,
+                        help='Number of controllers known to juju')
+    parser.add_argument('-m', '--models', type=int, default=2,
+                        help='Models per controller')
+    parser.add_argument('-s', '--services', type=int, default=10,
+                        help='Services in the spell bundle')
+    parser.add_argument('-l', '--latency', type=float, default=50,
+                        help='Time every juju command takes in ms')
+    parser.add_argument('-r', '--rounds', type=int, default=3,
+                        help='Rounds of each render flow, the first cold')
+    parser.add_argument('--no-stores', action='store_false', dest='stores',
+                        help='Leave out the controller, model, credential '
+                        'and cloud stores, forcing juju list-* fallbacks')
+    parser.add_argument('--check', action='store_true',
+                        help='Fail when a flow exceeds its spawn budget')
+    opts = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench-startup-')
+    os.environ['XDG_CACHE_HOME'] = os.path.join(workdir, 'cache')
+    # an empty mirror, nothing is fetched from the network
+    os.environ['CONJURE_CHARMSTORE'] = os.path.join(workdir, 'charmstore')
+    os.makedirs(os.environ['CONJURE_CHARMSTORE'])
+    bundle = make_spell(os.path.join(workdir, 'spell'), opts.services)
+
+    subprocess.Popen = CountingPopen
+    # containers often have no /dev/log for the syslog handler
+    logging.raiseExceptions = False
+    # the screen is never attached to a terminal
+    urwid.raw_display.Screen = HeadlessScreen
+    if os.geteuid() == 0:
+        # main() refuses to run as root, a container is fine for timings
+        os.geteuid = lambda: 1000
+
+    fake = FakeJuju(controllers=['bench{}'.format(n)
+                                 for n in range(opts.controllers)],
+                    models=['model{}'.format(n)
+                            for n in range(opts.models)],
+                    latency=opts.latency / 1000.0,
+                    # logging in has no cli fallback
+                    stores=opts.stores or ['accounts',
+                                           'current-controller']).start()
+    ctrl = FakeController().start()
+    ctrl.register('Client', 'ModelInfo', lambda params: {
+        'Name': params.get('Name'), 'ProviderType': 'lxd',
+        'DefaultSeries': 'xenial'})
+
+    results = []
+    try:
+        elapsed, spawned, juju = measure(
+            fake, lambda: __import__('conjure.app'))
+        results.append(('import', 'cold', elapsed, spawned, juju))
+
+        from conjure import juju as conjure_juju
+        from conjure.models.bundle import BundleModel
+
+        def connect(controller, uuid):
+            client = JujuClient(ctrl.url, 'secret')
+            client.login()
+            return client
+        conjure_juju.connections._connect = connect
+
+        app = []
+        elapsed, spawned, juju = measure(
+            fake, lambda: app.append(run_main(
+                os.path.join(workdir, 'spell'))))
+        results.append(('main', 'cold', elapsed, spawned, juju))
+        app = app[0].app
+
+        BundleModel.bundle = bundle
+        flows = [
+            ('jujucontroller',
+             lambda: render_models(app.controllers['jujucontroller'])),
+            ('deploy',
+             lambda: app.controllers['deploy'].render('model0')),
+        ]
+        for name, fn in flows:
+            for n in range(opts.rounds):
+                if n == 0:
+                    clear_caches()
+                elapsed, spawned, juju = measure(fake, fn)
+                results.append((name, 'cold' if n == 0 else 'warm',
+                                elapsed, spawned, juju))
+    finally:
+        ctrl.stop()
+        fake.stop()
+
+    print("{:>15} {:>5} {:>9} {:>7}  juju commands".format(
+        'flow', 'run', 'time', 'spawns'))
+    for name, run, elapsed, spawned, juju in results:
+        print("{:>15} {:>5} {:>7.1f}ms {:>7}  {}".format(
+            name, run, elapsed * 1000, spawned,
+            ", ".join("{} {}".format(c, n)
+                      for c, n in sorted(juju.items())) or '-'))
+
+    budget = {}
+    for name, (fixed, per) in BUDGET[
+            'stores' if opts.stores else 'cli'].items():
+        budget[name] = fixed + per * opts.controllers
+    over = [(name, spawned) for name, run, _, spawned, _ in results
+            if run == 'cold' and spawned > budget[name]]
+    for name, spawned in over:
+        print("{}: {} spawns, budget is {}".format(
+            name, spawned, budget[name]))
+    if opts.check and over:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+#
+# bench-status - measures what following a deployment costs conjure as
+#                models grow, against a local fake controller running a
+#                simulated model.
+#
+# For each unit count it times FullStatus through the threaded client,
+# then streams the model through a StatusWatcher into the status screen
+# (FinishController._status_changed: snapshot, timeline, ServicesView and
+# a redraw on a headless screen) until every unit is active, reporting
+# CPU time, requests, callback latency and memory.
+#
+# Usage:
+#   tools/bench-status.py [-n 10,100,500,1000,2000] [-a UNITS_PER_APP]
+#                         [-s SPREAD] [-l LATENCY_MS]
+
+import argparse
+import asyncio
+import logging
+import os
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+import urwid
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from macumba.fixtures.controller import (FakeController,  # noqa
+                                         SimulatedModel)
+from macumba.v2 import AsyncJujuClient, JujuClient  # noqa
+from ubuntui.ev import EventLoop  # noqa
+from conjure.api.snapshot import StatusSnapshot  # noqa
+from conjure.api.watcher import StatusWatcher  # noqa
+from conjure.controllers.finish import FinishController  # noqa
+from conjure.timeline import TimelineRecorder  # noqa
+from conjure.ui.views.services import ServicesView  # noqa
+
+
+class HeadlessScreen(urwid.BaseScreen):
+    """ Renders canvases like a terminal would, without one """
+
+    def __init__(self, cols=160, rows=50):
+        super().__init__()
+        self.size = (cols, rows)
+
+    def get_cols_rows(self):
+        return self.size
+
+    def draw_screen(self, size, canvas):
+        for _ in canvas.content():
+            pass
+
+
+class BenchWatcher(StatusWatcher):
+    """ StatusWatcher connecting to the fake controller """
+
+    def __init__(self, url, on_change):
+        super().__init__(on_change)
+        self.url = url
+
+    async def _connect(self):
+        self.client = AsyncJujuClient(self.url, 'secret')
+        await self.client.login()
+        res = await self.client.Client(request="WatchAll")
+        return res['AllWatcherId']
+
+
+def bench_full_status(url, rounds):
+    client = JujuClient(url, 'secret')
+    client.login()
+    times = []
+    for _ in range(rounds):
+        start = time.time()
+        client.Client(request="FullStatus")
+        times.append(time.time() - start)
+    client.close()
+    return sum(times) / len(times)
+
+
+def bench_watch(ctrl, model, loop, workdir, timeout):
+    app = SimpleNamespace(
+        log=logging.getLogger('bench'),
+        ui=SimpleNamespace(set_footer=lambda msg: None,
+                           show_exception_message=lambda e: None))
+    controller = FinishController(app)
+    controller.view = ServicesView(app)
+    controller.snapshot = StatusSnapshot(os.path.join(workdir,
+                                                      'status.json'))
+    controller.timeline = TimelineRecorder(os.path.join(workdir,
+                                                        'timeline.log'))
+    # only used for draw_screen, never run
+    EventLoop.loop = urwid.MainLoop(controller.view, screen=HeadlessScreen())
+
+    callbacks = []
+
+    def on_change(status, changed):
+        start = time.time()
+        controller._status_changed(status, changed)
+        callbacks.append(time.time() - start)
+
+    watcher = BenchWatcher(ctrl.url, on_change)
+    total = len(model.units)
+
+    async def run():
+        watcher.start()
+        model.start()
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            units = watcher.status.units
+            if len(units) == total and all(
+                    u['WorkloadStatus']['Status'] == 'active'
+                    for u in units.values()):
+                return True
+            await asyncio.sleep(0.05)
+        return False
+
+    before = dict(ctrl.counts)
+    tracemalloc.start()
+    cpu, wall = time.process_time(), time.time()
+    settled = loop.run_until_complete(run())
+    cpu, wall = time.process_time() - cpu, time.time() - wall
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    watcher.stop()
+    model.stop()
+    loop.run_until_complete(asyncio.sleep(0.1))
+    controller.snapshot.close()
+    controller.timeline.close()
+    requests = sum(ctrl.counts.values()) - sum(before.values())
+    return {'settled': settled, 'cpu': cpu, 'wall': wall,
+            'requests': requests, 'callbacks': len(callbacks),
+            'cb_avg': sum(callbacks) / max(len(callbacks), 1),
+            'cb_max': max(callbacks or [0]), 'peak': peak}
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='bench-status')
+    parser.add_argument('-n', '--units', default='10,100,500,1000,2000',
+                        help='Comma separated unit counts')
+    parser.add_argument('-a', '--per-app', type=int, default=10,
+                        help='Units per application')
+    parser.add_argument('-s', '--spread', type=float, default=5,
+                        help='Seconds over which units start')
+    parser.add_argument('-l', '--latency', type=float, default=0,
+                        help='Per request controller latency in ms')
+    parser.add_argument('-r', '--rounds', type=int, default=5,
+                        help='FullStatus calls to average')
+    parser.add_argument('-t', '--timeout', type=float, default=120)
+    opts = parser.parse_args()
+    logging.basicConfig(level=logging.ERROR)
+
+    loop = asyncio.get_event_loop()
+    print("{:>6} {:>10} {:>8} {:>8} {:>9} {:>9} {:>10} {:>10} {:>9}".format(
+        'units', 'fullstatus', 'wall', 'cpu', 'requests', 'callbacks',
+        'cb avg', 'cb max', 'peak mem'))
+    for units in [int(n) for n in opts.units.split(',')]:
+        per_app = min(opts.per_app, units)
+        ctrl = FakeController(latency=opts.latency / 1000.0,
+                              concurrent=True).start()
+        model = SimulatedModel(applications=units // per_app,
+                               units=per_app, spread=opts.spread)
+        model.install(ctrl)
+        full_status = bench_full_status(ctrl.url, opts.rounds)
+        with tempfile.TemporaryDirectory() as workdir:
+            res = bench_watch(ctrl, model, loop, workdir, opts.timeout)
+        ctrl.stop()
+        print("{:>6} {:>8.1f}ms {:>7.2f}s {:>7.2f}s {:>9} {:>9} "
+              "{:>8.2f}ms {:>8.2f}ms {:>7.1f}MB{}".format(
+                  len(model.units), full_status * 1000, res['wall'],
+                  res['cpu'], res['requests'], res['callbacks'],
+                  res['cb_avg'] * 1000, res['cb_max'] * 1000,
+                  res['peak'] / 1024.0 / 1024.0,
+                  '' if res['settled'] else ' (timed out)'))
+    print("max rss {:.1f}MB".format(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+#
+# snapshot-charmstore - builds and serves a local charm store mirror
+#
+# snapshot copies the bundle archives of a spell, the metadata of every
+# charm they (and recommendedCharms) reference into a mirror tree usable
+# with CONJURE_CHARMSTORE=/path/to/mirror. serve exposes that tree with
+# the charm store v4 url layout for tools that need http. bench compares
+# the mirror against a remote charm store.
+#
+# Usage:
+#   tools/snapshot-charmstore.py snapshot /usr/share/openstack -o MIRROR
+#   tools/snapshot-charmstore.py serve MIRROR [-p PORT]
+#   tools/snapshot-charmstore.py bench MIRROR /usr/share/openstack
+
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import yaml
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from bundleplacer.charmstore_api import CharmStoreID  # noqa
+from bundleplacer.charmstore_backend import (DEFAULT_URL,  # noqa
+                                             LocalCharmStore,
+                                             RemoteCharmStore,
+                                             entity_path)
+from bundleplacer.charmstore_cache import MetadataCache  # noqa
+from bundleplacer.consts import DEFAULT_SERIES  # noqa
+
+
+def spell_bundles(spell_dir):
+    """ Returns [(bundle id, recommended charms)] of a spell
+    """
+    with open(os.path.join(spell_dir, 'config.json')) as fp:
+        config = json.load(fp)
+    return [(b.get('location', None) or b['key'],
+             b.get('recommendedCharms', []))
+            for b in config['bundles']]
+
+
+def bundle_charm_ids(bundle_text, series):
+    bundle = yaml.safe_load(bundle_text)
+    series = bundle.get('series', series)
+    services = bundle.get('services', bundle.get('applications', {}))
+    ids = []
+    for svc in services.values():
+        csid = CharmStoreID(svc['charm'])
+        if csid.series == DEFAULT_SERIES and '/' not in svc['charm']:
+            csid.series = series
+        ids.append(csid.as_str_without_rev())
+    return ids
+
+
+def write_json(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as fp:
+        json.dump(data, fp, sort_keys=True, indent=2)
+
+
+def snapshot(opts):
+    remote = RemoteCharmStore(opts.source, MetadataCache(
+        path=tempfile.mkdtemp(),
+        base_url=opts.source.rstrip('/') +
+        '/meta/any?include=charm-metadata'))
+    bundle_meta = RemoteCharmStore(opts.source, MetadataCache(
+        path=tempfile.mkdtemp(),
+        base_url=opts.source.rstrip('/') +
+        '/meta/any?include=bundle-metadata'))
+    charm_ids = set()
+    for bundle, recommended in spell_bundles(opts.spell_dir):
+        text = remote.bundle_yaml(bundle)
+        path = os.path.join(opts.output, entity_path(bundle), 'archive',
+                            'bundle.yaml')
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as fp:
+            fp.write(text)
+        for entity in bundle_meta.meta_any(['cs:' + bundle]).values():
+            write_json(os.path.join(opts.output, entity_path(bundle),
+                                    'meta.json'), entity)
+        charm_ids.update(bundle_charm_ids(text, opts.series))
+        charm_ids.update(CharmStoreID(n).as_str_without_rev()
+                         for n in recommended)
+        print("bundle {}".format(bundle))
+
+    metas = remote.meta_any(sorted(charm_ids))
+    for charm_id, entity in metas.items():
+        for name in {charm_id, entity.get('Id', charm_id)}:
+            write_json(os.path.join(opts.output, entity_path(name),
+                                    'meta.json'), entity)
+    missing = charm_ids - set(metas)
+    print("{} charms, {} missing {}".format(len(metas), len(missing),
+                                            sorted(missing)))
+
+
+class MirrorHandler(BaseHTTPRequestHandler):
+    store = None
+
+    def _reply(self, code, body, content_type='application/json'):
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        query = parse_qs(parts.query)
+        path = parts.path
+        if path.startswith('/v4/'):
+            path = path[4:]
+        path = path.strip('/')
+        if path == 'meta/any':
+            return self._reply(200, json.dumps(
+                self.store.meta_any(query.get('id', []))))
+        if path == 'search':
+            bundles, charms = self.store.search(
+                query.get('text', [''])[0],
+                query.get('series', [DEFAULT_SERIES])[0],
+                int(query.get('limit', ['20'])[0]))
+            results = bundles if query.get('type') == ['bundle'] else charms
+            return self._reply(200, json.dumps({'Results': results}))
+        if '/archive/' in path:
+            entity, name = path.split('/archive/', 1)
+            try:
+                with open(self.store.archive_file(entity, name), 'rb') as fp:
+                    return self._reply(200, fp.read(),
+                                       'application/octet-stream')
+            except Exception:
+                pass
+        self._reply(404, json.dumps({'Message': 'not found: ' + path}))
+
+
+def serve(opts):
+    MirrorHandler.store = LocalCharmStore(opts.mirror)
+    server = HTTPServer((opts.host, opts.port), MirrorHandler)
+    print("serving {} on http://{}:{}/v4".format(opts.mirror, opts.host,
+                                                 server.server_port))
+    server.serve_forever()
+
+
+def bench(opts):
+    bundles = spell_bundles(opts.spell_dir)
+    local = LocalCharmStore(opts.mirror)
+    remote = RemoteCharmStore(opts.source, MetadataCache(
+        path=tempfile.mkdtemp(), max_age=0,
+        base_url=opts.source.rstrip('/') +
+        '/meta/any?include=charm-metadata'))
+    for name, backend in [('local', local), ('remote', remote)]:
+        times = []
+        for _ in range(opts.rounds):
+            start = time.time()
+            for bundle, recommended in bundles:
+                text = backend.bundle_yaml(bundle)
+                backend.meta_any(bundle_charm_ids(text, opts.series) +
+                                 [CharmStoreID(n).as_str_without_rev()
+                                  for n in recommended])
+            times.append(time.time() - start)
+        print("{:>6}: best {:.1f}ms, worst {:.1f}ms over {} rounds".format(
+            name, min(times) * 1000, max(times) * 1000, opts.rounds))
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='snapshot-charmstore')
+    parser.add_argument('--source', default=DEFAULT_URL,
+                        help='Charm store to snapshot/compare against')
+    parser.add_argument('--series', default=DEFAULT_SERIES)
+    sub = parser.add_subparsers(dest='command')
+
+    p = sub.add_parser('snapshot', help='Mirror what a spell needs')
+    p.add_argument('spell_dir', help='Spell directory with config.json')
+    p.add_argument('-o', '--output', required=True, help='Mirror directory')
+    p.set_defaults(func=snapshot)
+
+    p = sub.add_parser('serve', help='Serve a mirror over http')
+    p.add_argument('mirror')
+    p.add_argument('--host', default='127.0.0.1')
+    p.add_argument('-p', '--port', type=int, default=8080)
+    p.set_defaults(func=serve)
+
+    p = sub.add_parser('bench', help='Compare a mirror with --source')
+    p.add_argument('mirror')
+    p.add_argument('spell_dir')
+    p.add_argument('-r', '--rounds', type=int, default=5)
+    p.set_defaults(func=bench)
+
+    opts = parser.parse_args()
+    if not hasattr(opts, 'func'):
+        parser.error("missing command")
+    opts.func(opts)
+
+
+if __name__ == "__main__":
+    main()
@@ -17,6 +17,8 @@ class EventLoop:
     """ Abstracts out event loop
     """
     loop = None
+    # asyncio loop the urwid loop runs on, see call_soon
+    aio_loop = None
     alarms = {}
 
     @classmethod
@@ -31,6 +33,7 @@ class EventLoop:
         extra_opts['screen'].reset_default_terminal_palette()
         extra_opts.update(**kwargs)
         evl = asyncio.get_event_loop()
+        cls.aio_loop = evl
         cls.loop = urwid.MainLoop(ui, palette,
                                   event_loop=urwid.AsyncioEventLoop(loop=evl),
                                   pop_ups=True,
@@ -55,6 +58,17 @@ class EventLoop:
         cls.add_alarm(handle, str(uuid.uuid1()))
         return handle
 
+    @classmethod
+    def call_soon(cls, cb):
+        """ Runs cb as a zero delay alarm on the event loop
+
+        Safe to call from any thread, eg. future done callbacks that
+        run on scheduler workers.
+        """
+        if cls.aio_loop is None:
+            return cls.set_alarm_in(0, cb)
+        cls.aio_loop.call_soon_threadsafe(cls.set_alarm_in, 0, cb)
+
     @classmethod
     def add_alarm(cls, handle, name):
         if name in cls.alarms:
@@ -0,0 +1,378 @@
+""" Scheduler
+Runs blocking work (api calls, cli tools, processing scripts) off the UI
+thread. Shared by conjure.async and bundleplacer.async so both packages
+queue onto the same workers and honour the same ShutdownEvent.
+
+Work is spread over named lanes, each with its own worker threads and a
+bounded priority queue, so a long running bootstrap or deploy does not
+hold up interactive queries or telemetry:
+
+    interactive  - short api/cli queries the UI is waiting on (default)
+    long-running - bootstrap, deploy, pre/post processing scripts
+    telemetry    - fire and forget reporting like pollinate
+    fetch        - parallel network requests fanned out by other work
+    deploy       - independent api steps of a bundle deploy
+"""
+
+import logging
+from concurrent.futures import Future
+from functools import partial
+from itertools import count
+from queue import PriorityQueue, Full, Empty
+from threading import Event, Lock, Thread, current_thread
+import time
+log = logging.getLogger("async")
+
+
+class ThreadCancelledException(Exception):
+    """Exception meaning intentional cancellation"""
+
+
+class LaneFullException(Exception):
+    """Work was rejected because the lane queue is at its maximum depth"""
+
+
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 10
+PRIORITY_LOW = 20
+
+DEFAULT_LANE = 'interactive'
+
+# name -> (workers, max queue depth)
+LANES = {
+    'interactive': (2, 32),
+    'long-running': (2, 8),
+    'telemetry': (1, 16),
+    'fetch': (4, 64),
+    'deploy': (8, 256),
+}
+
+ShutdownEvent = Event()
+
+
+def describe(func):
+    """ Human readable name of a callable for task dumps
+    """
+    if isinstance(func, partial):
+        return describe(func.func)
+    name = getattr(func, '__qualname__', None) or repr(func)
+    module = getattr(func, '__module__', None)
+    return "{}.{}".format(module, name) if module else name
+
+
+class _WorkItem:
+    def __init__(self, func, future):
+        self.func = func
+        self.future = future
+        self.queued = time.time()
+        self.started = None
+
+
+class Lane:
+    """ A set of worker threads consuming a bounded priority queue
+
+    Arguments:
+    name: lane name, used for thread names and metrics
+    workers: number of worker threads
+    max_queue: maximum number of pending items, 0 for unbounded
+    """
+
+    def __init__(self, name, workers=1, max_queue=0):
+        self.name = name
+        self.workers = workers
+        self.max_queue = max_queue
+        self.queue = PriorityQueue(max_queue)
+        self._seq = count()
+        self._lock = Lock()
+        self._threads = []
+        self._running = {}
+        self._metrics = {'submitted': 0, 'completed': 0, 'failed': 0,
+                         'cancelled': 0, 'rejected': 0,
+                         'wait_total': 0.0, 'wait_max': 0.0,
+                         'run_total': 0.0, 'run_max': 0.0}
+
+    def _start_workers(self):
+        while len(self._threads) < self.workers:
+            t = Thread(target=self._worker,
+                       name="{}-{}".format(self.name, len(self._threads)),
+                       daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def _record(self, **kwargs):
+        with self._lock:
+            for k, v in kwargs.items():
+                if k.endswith('_max'):
+                    self._metrics[k] = max(self._metrics[k], v)
+                else:
+                    self._metrics[k] += v
+
+    def submit(self, func, priority=PRIORITY_NORMAL):
+        """ Queues func, returns a concurrent.futures.Future
+
+        Raises LaneFullException if the queue is at max_queue.
+        """
+        future = Future()
+        item = _WorkItem(func, future)
+        try:
+            self.queue.put_nowait((priority, next(self._seq), item))
+        except Full:
+            self._record(rejected=1)
+            raise LaneFullException(
+                "{} lane is full ({} pending)".format(self.name,
+                                                      self.max_queue))
+        self._record(submitted=1)
+        self._start_workers()
+        return future
+
+    def _worker(self):
+        while True:
+            _, _, item = self.queue.get()
+            if item is None:
+                return
+            if not item.future.set_running_or_notify_cancel():
+                self._record(cancelled=1)
+                continue
+            start = item.started = time.time()
+            wait = start - item.queued
+            me = current_thread().name
+            self._running[me] = item
+            try:
+                result = item.func()
+            except BaseException as e:
+                item.future.set_exception(e)
+                failed = 1
+            else:
+                item.future.set_result(result)
+                failed = 0
+            finally:
+                self._running.pop(me, None)
+            run = time.time() - start
+            self._record(completed=1 - failed, failed=failed,
+                         wait_total=wait, wait_max=wait,
+                         run_total=run, run_max=run)
+
+    def cancel_pending(self):
+        """ Cancels everything still waiting in the queue
+        """
+        while True:
+            try:
+                _, _, item = self.queue.get_nowait()
+            except Empty:
+                break
+            if item is not None and item.future.cancel():
+                self._record(cancelled=1)
+
+    def shutdown(self):
+        self.cancel_pending()
+        for _ in self._threads:
+            # sentinels sort after any real work
+            try:
+                self.queue.put_nowait((PRIORITY_LOW + 1, next(self._seq),
+                                       None))
+            except Full:
+                break
+
+    def tasks(self):
+        """ Returns (state, description, age) of queued and running work
+        """
+        now = time.time()
+        with self.queue.mutex:
+            queued = [entry[2] for entry in sorted(self.queue.queue)
+                      if entry[2] is not None]
+        tasks = [('running', describe(item.func), now - item.started)
+                 for item in list(self._running.values())]
+        tasks.extend(('queued', describe(item.func), now - item.queued)
+                     for item in queued)
+        return tasks
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._metrics)
+        done = stats['completed'] + stats['failed']
+        stats['pending'] = self.queue.qsize()
+        stats['wait_avg'] = stats['wait_total'] / done if done else 0.0
+        stats['run_avg'] = stats['run_total'] / done if done else 0.0
+        return stats
+
+
+_lanes = {}
+_lanes_lock = Lock()
+
+
+def configure_lane(name, workers=1, max_queue=0):
+    """ Sets the worker count and queue depth of a lane
+
+    Only affects lanes that have not been used yet.
+    """
+    LANES[name] = (workers, max_queue)
+
+
+def get_lane(name):
+    with _lanes_lock:
+        if name not in _lanes:
+            if name not in LANES:
+                raise KeyError("Unknown lane: {}".format(name))
+            workers, max_queue = LANES[name]
+            _lanes[name] = Lane(name, workers, max_queue)
+        return _lanes[name]
+
+
+def submit(func, exc_callback, queue_name=DEFAULT_LANE,
+           priority=PRIORITY_NORMAL):
+    """ Runs func on a worker of the named lane
+
+    Arguments:
+    func: callable taking no arguments
+    exc_callback: called with the exception if func raises or the lane
+                  rejects the work
+    queue_name: lane to run on
+    priority: lower runs first among pending items of the lane
+
+    Returns:
+    Future, or None if shutting down
+    """
+    def cb(cb_f):
+        if cb_f.cancelled():
+            return
+        e = cb_f.exception()
+        if e:
+            exc_callback(e)
+    if ShutdownEvent.is_set():
+        log.debug("ignoring async.submit due to impending shutdown.")
+        return
+    try:
+        f = get_lane(queue_name).submit(func, priority)
+    except LaneFullException as e:
+        log.warning(e)
+        f = Future()
+        f.set_exception(e)
+    f.add_done_callback(cb)
+    return f
+
+
+_dependents = {}
+_dependents_lock = Lock()
+
+
+def completed(result):
+    """ Returns an already resolved Future, for answers that are known
+    without running anything (eg. cache hits)
+    """
+    f = Future()
+    f.set_result(result)
+    return f
+
+
+def then(future, func, exc_callback, queue_name=None,
+         priority=PRIORITY_NORMAL):
+    """ Runs func(result) once future has resolved
+
+    Nothing waits on the parent: func is scheduled from the parent's
+    done callback. With queue_name=None func runs inline in that
+    callback, which suits cheap transforms of the result; otherwise it is
+    submitted to the named lane.
+
+    If the parent fails the returned future fails with the same
+    exception, exc_callback is called with it and func is not run. If the
+    parent is cancelled so is the returned future.
+
+    Returns:
+    Future resolving to func's return value
+    """
+    out = Future()
+    key = id(out)
+    with _dependents_lock:
+        _dependents[key] = (describe(func), time.time())
+
+    def _forget(_):
+        with _dependents_lock:
+            _dependents.pop(key, None)
+    out.add_done_callback(_forget)
+
+    def _copy(src):
+        if src.cancelled():
+            out.cancel()
+        elif src.exception() is not None:
+            out.set_exception(src.exception())
+        else:
+            out.set_result(src.result())
+
+    def _parent_done(parent):
+        if parent.cancelled():
+            return _copy(parent)
+        if parent.exception() is not None:
+            _copy(parent)
+            exc_callback(parent.exception())
+            return
+        if queue_name is None:
+            try:
+                out.set_result(func(parent.result()))
+            except Exception as e:
+                out.set_exception(e)
+                exc_callback(e)
+            return
+        child = submit(partial(func, parent.result()), exc_callback,
+                       queue_name, priority)
+        if child is None:
+            # shutting down
+            out.cancel()
+        else:
+            child.add_done_callback(_copy)
+
+    future.add_done_callback(_parent_done)
+    return out
+
+
+def dump_tasks():
+    """ Returns a text dump of queued, running and dependent work with
+    their ages, for debugging stalls
+    """
+    lines = []
+    with _lanes_lock:
+        lanes = sorted(_lanes.items())
+    for name, lane in lanes:
+        tasks = lane.tasks()
+        lines.append("lane {}: {} running, {} queued".format(
+            name,
+            len([t for t in tasks if t[0] == 'running']),
+            len([t for t in tasks if t[0] == 'queued'])))
+        for state, desc, age in tasks:
+            lines.append("  {:<8} {:>8.1f}s {}".format(state, age, desc))
+    now = time.time()
+    with _dependents_lock:
+        dependents = list(_dependents.values())
+    if dependents:
+        lines.append("dependent: {} waiting".format(len(dependents)))
+        for desc, created in dependents:
+            lines.append("  {:<8} {:>8.1f}s {}".format(
+                'waiting', now - created, desc))
+    return "\n".join(lines)
+
+
+def stats():
+    """ Returns per lane metrics of the lanes used so far
+    """
+    with _lanes_lock:
+        lanes = dict(_lanes)
+    return {name: lane.stats() for name, lane in lanes.items()}
+
+
+def shutdown():
+    ShutdownEvent.set()
+    with _lanes_lock:
+        lanes = list(_lanes.values())
+    for lane in lanes:
+        lane.shutdown()
+
+
+def sleep_until(s):
+    """returns after 's' seconds.
+    If the ShutdownEvent is raised before the wait is over,
+    raises a ThreadCancelledException.
+    """
+    start = time.time()
+    while not ShutdownEvent.wait(timeout=.1):
+        if time.time() - start >= s:
+            return True
+    raise ThreadCancelledException("Thread cancelled while sleeping")
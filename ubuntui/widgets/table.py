@@ -1,13 +1,14 @@
 from __future__ import unicode_literals
 
-from urwid import (Columns, ListBox)
+from urwid import (Columns, ListBox, SimpleFocusListWalker)
 from ubuntui.widgets.hr import HR
 
 
 class Table:
     def __init__(self):
-        self._rows = []
+        self._rows = SimpleFocusListWalker([])
         self._row_id = []
+        self._row_widgets = {}
         self._is_header_set = False
 
     def addHeadings(self, headings):
@@ -39,7 +40,20 @@ class Table:
             use_divider = True
             if force:
                 use_divider = False
-            self.addRow(Columns(columns), use_divider)
+            self._row_widgets.setdefault(row_id, []).extend(
+                self.addRow(Columns(columns), use_divider))
+
+    def removeRow(self, row_id):
+        """ Removes every widget added under row_id
+
+        Arguments:
+        row_id: id the row was added with
+        """
+        if row_id not in self._row_id:
+            return
+        self._row_id.remove(row_id)
+        for w in self._row_widgets.pop(row_id, []):
+            self._rows.remove(w)
 
     def addRow(self, item, use_divider=True):
         """ Appends widget to Pile
@@ -47,10 +61,14 @@ class Table:
         Arguments:
         item: Widget to add to listbox
         use_divider: use divider for row item
+
+        Returns:
+        list of widgets appended
         """
-        if use_divider:
-            self._rows.append(HR(0, 0))
-        self._rows.append(item)
+        added = [HR(0, 0)] if use_divider else []
+        added.append(item)
+        self._rows.extend(added)
+        return added
 
     def render(self):
         return ListBox(self._rows)